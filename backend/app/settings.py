@@ -1,6 +1,6 @@
 import os
 from datetime import timedelta
-from decouple import config
+from decouple import Csv, config
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -68,6 +68,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'app.wsgi.application'
+ASGI_APPLICATION = 'app.asgi.application'
 
 
 # Database
@@ -89,6 +90,118 @@ ORACLE_HOST = config('ORACLE_HOST', default='10.1.1.90')
 ORACLE_PORT = config('ORACLE_PORT', default='1521')
 ORACLE_SERVICE_NAME = config('ORACLE_SERVICE_NAME', default='orcl')
 
+# ========== POOL DE SESSÕES ORACLE ==========
+ORACLE_POOL_MIN = config('ORACLE_POOL_MIN', default=0, cast=int)  # Pool heterogêneo: sessões abrem com o 1º acquire de cada usuário
+ORACLE_POOL_MAX = config('ORACLE_POOL_MAX', default=8, cast=int)
+ORACLE_POOL_INCREMENT = config('ORACLE_POOL_INCREMENT', default=1, cast=int)
+ORACLE_POOL_STMT_CACHE = config('ORACLE_POOL_STMT_CACHE', default=50, cast=int)  # Statements em cache por sessão
+ORACLE_POOL_WAIT_TIMEOUT = config('ORACLE_POOL_WAIT_TIMEOUT', default=10, cast=int)  # Segundos esperando sessão livre
+ORACLE_POOL_IDLE_TIMEOUT = config('ORACLE_POOL_IDLE_TIMEOUT', default=300, cast=int)  # Sessão ociosa é fechada
+
+# ========== SINCRONIZAÇÃO ORACLE ==========
+ORACLE_SYNC_BATCH_SIZE = config('ORACLE_SYNC_BATCH_SIZE', default=200, cast=int)  # Produtos por MERGE (executemany) e por commit
+ORACLE_SYNC_IMAGE_BATCH_SIZE = config('ORACLE_SYNC_IMAGE_BATCH_SIZE', default=20, cast=int)  # Imagens (BLOB) por executemany
+ORACLE_SYNC_DEBUG_SQL = config('ORACLE_SYNC_DEBUG_SQL', default=False, cast=bool)  # Loga o SQL com valores embutidos
+PRODUCT_BULK_STATUS_MAX = config('PRODUCT_BULK_STATUS_MAX', default=500, cast=int)  # Ids por chamada de bulk-update-status
+
+# ========== OUTBOX DA SINCRONIZAÇÃO ORACLE ==========
+ORACLE_OUTBOX_ENABLED = config('ORACLE_OUTBOX_ENABLED', default=True, cast=bool)  # Aprovação enfileira; drain_oracle_outbox envia
+ORACLE_OUTBOX_BATCH_SIZE = config('ORACLE_OUTBOX_BATCH_SIZE', default=200, cast=int)  # Linhas por lote do drenador
+ORACLE_OUTBOX_MAX_ATTEMPTS = config('ORACLE_OUTBOX_MAX_ATTEMPTS', default=8, cast=int)  # Depois disso a linha fica 'failed'
+ORACLE_OUTBOX_RETRY_BASE_SECONDS = config('ORACLE_OUTBOX_RETRY_BASE_SECONDS', default=30, cast=int)  # Espera da 1ª retentativa (dobra a cada falha)
+ORACLE_OUTBOX_RETRY_MAX_SECONDS = config('ORACLE_OUTBOX_RETRY_MAX_SECONDS', default=3600, cast=int)  # Teto da espera entre tentativas
+ORACLE_OUTBOX_STALE_MINUTES = config('ORACLE_OUTBOX_STALE_MINUTES', default=10, cast=int)  # 'processing' há mais tempo volta para a fila
+ORACLE_OUTBOX_KEEP_DAYS = config('ORACLE_OUTBOX_KEEP_DAYS', default=7, cast=int)  # Linhas sincronizadas removidas depois disso
+
+# ========== POOL DE NAVEGADORES (Playwright) ==========
+BROWSER_POOL_SIZE = config('BROWSER_POOL_SIZE', default=2, cast=int)
+BROWSER_POOL_MAX_PAGES = config('BROWSER_POOL_MAX_PAGES', default=50, cast=int)  # Recicla após N páginas
+BROWSER_POOL_MAX_HEAP_MB = config('BROWSER_POOL_MAX_HEAP_MB', default=512, cast=int)  # Teto de memória (0 = desliga)
+BROWSER_POOL_ACQUIRE_TIMEOUT = config('BROWSER_POOL_ACQUIRE_TIMEOUT', default=60, cast=int)
+
+# ========== PERFIL DE RENDERIZAÇÃO (Playwright, páginas de galeria) ==========
+RENDER_BLOCK_REQUESTS = config('RENDER_BLOCK_REQUESTS', default=True, cast=bool)
+RENDER_BLOCK_RESOURCE_TYPES = config('RENDER_BLOCK_RESOURCE_TYPES', default='image,media,font,stylesheet', cast=Csv())
+RENDER_ALLOWED_HOSTS = config('RENDER_ALLOWED_HOSTS', default='nissei.com', cast=Csv())  # E subdomínios; o resto (analytics, pixels) é abortado
+RENDER_WAIT_UNTIL = config('RENDER_WAIT_UNTIL', default='domcontentloaded')
+RENDER_GOTO_TIMEOUT_MS = config('RENDER_GOTO_TIMEOUT_MS', default=20000, cast=int)
+RENDER_GALLERY_TIMEOUT_MS = config('RENDER_GALLERY_TIMEOUT_MS', default=5000, cast=int)  # Espera única pela galeria
+
+# ========== SELENIUM (AISeleniumNisseiScraper) ==========
+SELENIUM_CAROUSEL_MODE = config('SELENIUM_CAROUSEL_MODE', default='harvest')  # harvest (sem cliques) | click
+SELENIUM_CAROUSEL_HARVEST_TIMEOUT = config('SELENIUM_CAROUSEL_HARVEST_TIMEOUT', default=10, cast=int)  # Espera pelo JS da galeria
+
+# ========== HEALTH CHECK DA IA (test_ai_configuration) ==========
+AI_PROBE_TIMEOUT = config('AI_PROBE_TIMEOUT', default=10, cast=int)
+AI_PROBE_CACHE_SECONDS = config('AI_PROBE_CACHE_SECONDS', default=300, cast=int)  # Resultado OK reaproveitado
+AI_PROBE_FAILURE_CACHE_SECONDS = config('AI_PROBE_FAILURE_CACHE_SECONDS', default=30, cast=int)
+
+# ========== SCRAPING (concorrência e cortesia) ==========
+SCRAPE_DETAIL_WORKERS = config('SCRAPE_DETAIL_WORKERS', default=4, cast=int)  # Produtos processados em paralelo
+SCRAPE_RATE_PER_HOST = config('SCRAPE_RATE_PER_HOST', default=2.0, cast=float)  # Requisições/segundo iniciais por host (ajustado em tempo de execução)
+SCRAPE_RATE_BURST = config('SCRAPE_RATE_BURST', default=4.0, cast=float)  # Rajada máxima por host
+SCRAPE_RATE_MIN = config('SCRAPE_RATE_MIN', default=0.2, cast=float)  # Piso do ritmo após 429/503
+SCRAPE_RATE_MAX = config('SCRAPE_RATE_MAX', default=10.0, cast=float)  # Teto do ritmo com respostas rápidas
+SCRAPE_CONCURRENCY_PER_HOST = config('SCRAPE_CONCURRENCY_PER_HOST', default=4, cast=int)  # Requisições simultâneas iniciais por host
+SCRAPE_CONCURRENCY_MAX = config('SCRAPE_CONCURRENCY_MAX', default=12, cast=int)  # Teto de requisições simultâneas por host
+SCRAPE_LATENCY_TARGET_MS = config('SCRAPE_LATENCY_TARGET_MS', default=1500, cast=int)  # Latência média acima disso reduz o ritmo
+SCRAPE_DEFAULT_TIMEOUT_MS = config('SCRAPE_DEFAULT_TIMEOUT_MS', default=0, cast=int)  # Prazo da busca sem timeout_ms no request (0 = sem prazo)
+SCRAPE_MIN_TIMEOUT_MS = config('SCRAPE_MIN_TIMEOUT_MS', default=2000, cast=int)  # timeout_ms menor que isso é elevado
+SCRAPE_MAX_TIMEOUT_MS = config('SCRAPE_MAX_TIMEOUT_MS', default=600000, cast=int)
+SCRAPE_PERSIST_CHUNK_SIZE = config('SCRAPE_PERSIST_CHUNK_SIZE', default=1, cast=int)  # Produtos salvos por vez conforme a extração entrega (1 = cada produto na hora)
+
+# ========== CIRCUIT BREAKER E ORÇAMENTO DE RETENTATIVAS ==========
+CIRCUIT_BREAKER_ENABLED = config('CIRCUIT_BREAKER_ENABLED', default=True, cast=bool)
+CIRCUIT_FAILURE_THRESHOLD = config('CIRCUIT_FAILURE_THRESHOLD', default=5, cast=int)  # Falhas seguidas que abrem o circuito do host
+CIRCUIT_OPEN_SECONDS = config('CIRCUIT_OPEN_SECONDS', default=30, cast=float)  # Tempo aberto antes do primeiro teste (half-open)
+CIRCUIT_OPEN_MAX_SECONDS = config('CIRCUIT_OPEN_MAX_SECONDS', default=300, cast=float)  # Teto do tempo aberto (dobra a cada teste que falha)
+CIRCUIT_HALF_OPEN_PROBES = config('CIRCUIT_HALF_OPEN_PROBES', default=1, cast=int)  # Requisições de teste simultâneas no half-open
+RETRY_BUDGET_RATIO = config('RETRY_BUDGET_RATIO', default=0.2, cast=float)  # Retentativas permitidas por requisição na janela
+RETRY_BUDGET_MIN_RETRIES = config('RETRY_BUDGET_MIN_RETRIES', default=10, cast=int)  # Retentativas sempre permitidas na janela
+RETRY_BUDGET_WINDOW_SECONDS = config('RETRY_BUDGET_WINDOW_SECONDS', default=10, cast=float)
+
+# ========== MOTOR HTTP/2 (httpx, páginas de produto e imagens) ==========
+FETCH_ENGINE_ENABLED = config('FETCH_ENGINE_ENABLED', default=True, cast=bool)
+FETCH_HTTP2 = config('FETCH_HTTP2', default=True, cast=bool)
+FETCH_MAX_CONNECTIONS = config('FETCH_MAX_CONNECTIONS', default=10, cast=int)  # Total do processo
+FETCH_PER_HOST_CONCURRENCY = config('FETCH_PER_HOST_CONCURRENCY', default=6, cast=int)  # Requisições simultâneas por host
+FETCH_TIMEOUT = config('FETCH_TIMEOUT', default=15, cast=float)
+FETCH_RETRIES = config('FETCH_RETRIES', default=3, cast=int)  # Erros de transporte, 429 e 5xx
+FETCH_BACKOFF_BASE = config('FETCH_BACKOFF_BASE', default=0.5, cast=float)
+FETCH_BACKOFF_MAX = config('FETCH_BACKOFF_MAX', default=8.0, cast=float)
+
+# ========== CACHE HTTP (páginas de busca/produto/imagens) ==========
+HTTP_CACHE_ENABLED = config('HTTP_CACHE_ENABLED', default=True, cast=bool)
+HTTP_CACHE_DIR = config('HTTP_CACHE_DIR', default=str(BASE_DIR / 'cache' / 'http'))
+HTTP_CACHE_MAX_MB = config('HTTP_CACHE_MAX_MB', default=512, cast=int)  # Despejo LRU acima disso
+HTTP_CACHE_TTLS = {  # Segundos sem revalidar, por tipo de URL
+    'search': config('HTTP_CACHE_TTL_SEARCH', default=600, cast=int),
+    'product': config('HTTP_CACHE_TTL_PRODUCT', default=3600, cast=int),
+    'image': config('HTTP_CACHE_TTL_IMAGE', default=604800, cast=int),
+}
+
+# ========== PIPELINE DE IMAGENS ==========
+IMAGE_DOWNLOAD_WORKERS = config('IMAGE_DOWNLOAD_WORKERS', default=6, cast=int)  # Threads de download
+IMAGE_PROCESS_WORKERS = config('IMAGE_PROCESS_WORKERS', default=2, cast=int)  # Processos PIL (resize/JPEG)
+IMAGE_PIPELINE_QUEUE_SIZE = config('IMAGE_PIPELINE_QUEUE_SIZE', default=16, cast=int)  # Fila entre estágios
+IMAGE_STORE_REFETCH_DAYS = config('IMAGE_STORE_REFETCH_DAYS', default=30, cast=int)  # URL conhecida não é baixada de novo
+
+# ========== SCRAPE JOBS (fila no Postgres) ==========
+SCRAPE_JOB_LEASE_SECONDS = config('SCRAPE_JOB_LEASE_SECONDS', default=60, cast=int)  # Job "running" sem heartbeat há mais que isso: dono morreu
+SCRAPE_JOB_MAX_ATTEMPTS = config('SCRAPE_JOB_MAX_ATTEMPTS', default=2, cast=int)
+SCRAPE_WORKERS_ENABLED = config('SCRAPE_WORKERS_ENABLED', default=True, cast=bool)  # run_scrape_workers no ar (docker-compose: scrape-workers)
+SCRAPE_WORKER_PICKUP_SECONDS = config('SCRAPE_WORKER_PICKUP_SECONDS', default=30, cast=int)  # Job na fila há mais que isso: nenhum worker consumindo
+SCRAPE_EVENTS_POLL_INTERVAL = config('SCRAPE_EVENTS_POLL_INTERVAL', default=0.5, cast=float)  # WebSocket/SSE
+SCRAPE_EVENTS_IDLE_TIMEOUT = config('SCRAPE_EVENTS_IDLE_TIMEOUT', default=600, cast=int)  # WebSocket/SSE de job sem eventos: fecha depois disso
+SCRAPE_COALESCE_WAIT_SECONDS = config('SCRAPE_COALESCE_WAIT_SECONDS', default=600, cast=int)  # Busca síncrona idêntica em andamento: quanto esperar pelo resultado
+SCRAPE_COALESCE_POLL_INTERVAL = config('SCRAPE_COALESCE_POLL_INTERVAL', default=0.5, cast=float)
+
+# ========== CACHE DE RESULTADOS DE BUSCA (stale-while-revalidate) ==========
+SEARCH_CACHE_ENABLED = config('SEARCH_CACHE_ENABLED', default=True, cast=bool)
+SEARCH_CACHE_FRESH_SECONDS = config('SEARCH_CACHE_FRESH_SECONDS', default=300, cast=int)  # Resultado servido direto do banco
+SEARCH_CACHE_STALE_SECONDS = config('SEARCH_CACHE_STALE_SECONDS', default=3600, cast=int)  # Depois do fresco: servido e atualizado em background
+SEARCH_CACHE_LOCAL_REFRESHES = config('SEARCH_CACHE_LOCAL_REFRESHES', default=1, cast=int)  # Sem workers: atualizações simultâneas rodando no próprio processo web
+
 # ========== AUTHENTICATION BACKENDS ==========
 AUTHENTICATION_BACKENDS = [
     'authentication.backends.OracleAuthBackend',  # Seu backend customizado
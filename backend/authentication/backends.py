@@ -8,45 +8,12 @@ from django.contrib.auth.models import User
 from django.conf import settings
 from users.models import CustomUser
 from users.utils import encode_simple, decode_simple
+# Importar o conector inicializa o thick mode (uma vez, respeitando SKIP_ORACLE_INIT)
+from products.oracle_connector import acquire_oracle_connection
 
 # Configurar logger
 logger = logging.getLogger(__name__)
 
-# Flag para garantir que thick mode é inicializado apenas uma vez
-_thick_mode_initialized = False
-
-
-def _init_thick_mode():
-    """Inicializa o thick mode do oracledb uma única vez."""
-    global _thick_mode_initialized
-    
-    if not _thick_mode_initialized:
-        try:
-            # Caminho do Oracle Instant Client no Docker
-            lib_dir = "/opt/oracle/instantclient_21_15"
-            
-            logger.info(f"Inicializando Oracle Client em modo THICK: {lib_dir}")
-            print(f"🔧 Inicializando Oracle Client em modo THICK: {lib_dir}")
-            
-            # Inicializa com o caminho explícito
-            oracledb.init_oracle_client(lib_dir=lib_dir)
-            
-            logger.info("✅ Oracle Client inicializado com sucesso em modo THICK!")
-            print("✅ Oracle Client inicializado com sucesso em modo THICK!")
-            
-            _thick_mode_initialized = True
-            
-        except Exception as e:
-            logger.error(f"❌ ERRO ao inicializar Oracle Client: {e}")
-            print(f"❌ ERRO ao inicializar Oracle Client: {e}")
-            # Não lança exceção - deixa tentar em thin mode
-            # (embora não vá funcionar com Oracle antigo)
-
-
-# Inicializa o thick mode quando o módulo é importado
-_init_thick_mode()
-
-
 class OracleAuthBackend(BaseBackend):
     """
     Autentica usuários validando credenciais diretamente no banco Oracle.
@@ -83,15 +50,8 @@ class OracleAuthBackend(BaseBackend):
         print(f"📡 Tentando conectar: {username}@{oracle_host}:{oracle_port}/{oracle_service}")
         
         try:
-            # Tenta conectar no Oracle com as credenciais fornecidas
-            dsn = oracledb.makedsn(oracle_host, oracle_port, service_name=oracle_service)
-            
-            # Se conseguir conectar, credenciais são válidas
-            connection = oracledb.connect(
-                user=username,
-                password=password,
-                dsn=dsn
-            )
+            # Se conseguir pegar uma sessão do pool com as credenciais, elas são válidas
+            connection = acquire_oracle_connection(username, password)
             
             logger.info(f"✅ Conexão Oracle bem-sucedida para usuário: {username}")
             print(f"✅ Conexão Oracle bem-sucedida para usuário: {username}")
@@ -1,38 +1,26 @@
 """
 Helper functions para executar queries no Oracle
 """
-import oracledb
-from django.conf import settings
 import logging
 
+from products.oracle_connector import acquire_oracle_connection
+
 logger = logging.getLogger(__name__)
 
 
 def get_oracle_connection(username, password):
     """
-    Cria uma conexão Oracle usando as credenciais fornecidas.
+    Pega uma sessão do pool Oracle com as credenciais fornecidas.
     
     Args:
         username: Usuário Oracle
         password: Senha Oracle
         
     Returns:
-        Connection object ou None se falhar
+        Connection object (close() devolve ao pool) ou None se falhar
     """
     try:
-        dsn = oracledb.makedsn(
-            settings.ORACLE_HOST,
-            settings.ORACLE_PORT,
-            service_name=settings.ORACLE_SERVICE_NAME
-        )
-        
-        connection = oracledb.connect(
-            user=username,
-            password=password,
-            dsn=dsn
-        )
-        
-        return connection
+        return acquire_oracle_connection(username, password)
         
     except Exception as e:
         logger.error(f"Erro ao conectar no Oracle: {e}")
@@ -225,10 +213,10 @@ def fetch_all_catalog_data(username, password):
         return None
         
     finally:
-        # Sempre fechar a conexão
+        # Sempre devolver a sessão ao pool
         if connection:
             try:
                 connection.close()
-                logger.debug("🔒 Conexão Oracle fechada")
+                logger.debug("🔒 Sessão Oracle devolvida ao pool")
             except Exception as e:
                 logger.error(f"❌ Erro ao fechar conexão: {e}")
\ No newline at end of file
@@ -1,13 +1,13 @@
 from django.contrib import admin
 from configurations.models import Configuration
 from sites.models import Site
-from products.models import Product, ProductImage
+from products.models import OracleSyncOutbox, Product, ProductImage, QueryHit, QueryRun, ScrapeJob, StoredImage
 
 
 class ProductImageInline(admin.TabularInline):
     model = ProductImage
     extra = 0
-    readonly_fields = ['image', 'original_url', 'created_at']
+    readonly_fields = ['image', 'stored_image', 'original_url', 'created_at']
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
@@ -20,4 +20,45 @@ class ProductAdmin(admin.ModelAdmin):
     def has_images(self, obj):
         return bool(obj.main_image or obj.images.exists())
     has_images.boolean = True
-    has_images.short_description = 'Tem Imagens'
\ No newline at end of file
+    has_images.short_description = 'Tem Imagens'
+
+
+@admin.register(ScrapeJob)
+class ScrapeJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'query', 'status', 'requested_by', 'worker', 'attempts', 'created_at', 'finished_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['query']
+    readonly_fields = ['created_at', 'started_at', 'finished_at']
+
+
+class QueryHitInline(admin.TabularInline):
+    model = QueryHit
+    extra = 0
+    raw_id_fields = ['product']
+    readonly_fields = ['rank', 'seen_at']
+
+
+@admin.register(QueryRun)
+class QueryRunAdmin(admin.ModelAdmin):
+    list_display = ['id', 'query', 'site', 'created_at']
+    list_filter = ['site', 'created_at']
+    search_fields = ['query']
+    readonly_fields = ['created_at']
+    inlines = [QueryHitInline]
+
+
+@admin.register(OracleSyncOutbox)
+class OracleSyncOutboxAdmin(admin.ModelAdmin):
+    list_display = ['id', 'product', 'status', 'requested_by', 'attempts', 'next_attempt_at', 'created_at', 'processed_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['product__sku_code', 'product__name']
+    raw_id_fields = ['product']
+    readonly_fields = ['created_at', 'locked_at', 'processed_at']
+
+
+@admin.register(StoredImage)
+class StoredImageAdmin(admin.ModelAdmin):
+    list_display = ['id', 'content_hash', 'ref_count', 'size_bytes', 'created_at', 'last_used_at']
+    list_filter = ['created_at']
+    search_fields = ['content_hash', 'sources__source_url']
+    readonly_fields = ['content_hash', 'file', 'size_bytes', 'ref_count', 'created_at', 'last_used_at']
@@ -0,0 +1,134 @@
+"""
+WebSocket de progresso dos ScrapeJobs (ASGI puro, roteado em app/asgi.py)
+
+Rotas:
+    /ws/scrape-jobs/<id>/?token=<JWT>  eventos de um job (desde o início)
+    /ws/sessions/?token=<JWT>          novos eventos de todos os jobs do usuário
+
+Os workers rodam em outros processos e gravam ScrapeJobEvent no Postgres;
+aqui os eventos novos são lidos periodicamente e empurrados ao cliente.
+O stream de um job fecha no fim do job (1000) ou sem eventos por
+SCRAPE_EVENTS_IDLE_TIMEOUT (4408).
+"""
+import asyncio
+import json
+import re
+import time
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+from products.models import ScrapeJob
+from products.services.progress import EVENT_JOB_STATUS, fetch_job_events, job_stream_should_close, last_event_id, parse_event_id
+
+
+JOB_PATH = re.compile(r'^/ws/scrape-jobs/(?P<job_id>\d+)/?$')
+SESSIONS_PATH = re.compile(r'^/ws/sessions/?$')
+
+FINISHED_STATUSES = {ScrapeJob.STATUS_DONE, ScrapeJob.STATUS_FAILED}
+
+
+def _authenticate(raw_token):
+    """Valida o JWT (mesmo do header Authorization) e retorna o usuário"""
+    if not raw_token:
+        return None
+    try:
+        auth = JWTAuthentication()
+        return auth.get_user(auth.get_validated_token(raw_token))
+    except (InvalidToken, TokenError):
+        return None
+
+
+def _job_belongs_to(job_id, user):
+    job = ScrapeJob.objects.filter(id=job_id).only('requested_by_id', 'status').first()
+    if job is None:
+        return False
+    return job.requested_by_id in (None, user.id) or user.is_staff
+
+
+async def websocket_application(scope, receive, send):
+    """Aplicação ASGI para conexões websocket"""
+    path = scope.get('path', '')
+    job_match = JOB_PATH.match(path)
+
+    if not job_match and not SESSIONS_PATH.match(path):
+        await send({'type': 'websocket.close', 'code': 4404})
+        return
+
+    # Aguardar o handshake
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+
+    query = parse_qs(scope.get('query_string', b'').decode())
+    user = await sync_to_async(_authenticate)(query.get('token', [None])[0])
+    if user is None:
+        await send({'type': 'websocket.close', 'code': 4401})
+        return
+
+    job_id = int(job_match.group('job_id')) if job_match else None
+    if job_id is not None and not await sync_to_async(_job_belongs_to)(job_id, user):
+        await send({'type': 'websocket.close', 'code': 4403})
+        return
+
+    await send({'type': 'websocket.accept'})
+
+    # Job específico: replay desde o início (ou ?after=<id>); sessão: só eventos novos
+    if job_id is not None:
+        after_id = parse_event_id(query.get('after', ['0'])[0])
+    else:
+        after_id = await sync_to_async(last_event_id)()
+
+    disconnected = asyncio.Event()
+
+    async def watch_disconnect():
+        while True:
+            incoming = await receive()
+            if incoming['type'] == 'websocket.disconnect':
+                disconnected.set()
+                return
+
+    watcher = asyncio.create_task(watch_disconnect())
+    poll_interval = getattr(settings, 'SCRAPE_EVENTS_POLL_INTERVAL', 0.5)
+    idle_timeout = getattr(settings, 'SCRAPE_EVENTS_IDLE_TIMEOUT', 600)
+    last_event_at = time.monotonic()
+
+    try:
+        while not disconnected.is_set():
+            events = await sync_to_async(fetch_job_events)(
+                after_id=after_id,
+                job_id=job_id,
+                user=None if job_id is not None else user
+            )
+
+            job_finished = False
+            for event in events:
+                await send({'type': 'websocket.send', 'text': json.dumps(event.as_message())})
+                after_id = event.id
+                if event.event_type == EVENT_JOB_STATUS and event.payload.get('status') in FINISHED_STATUSES:
+                    job_finished = True
+
+            if job_id is not None and job_finished:
+                await send({'type': 'websocket.close', 'code': 1000})
+                return
+
+            if events:
+                last_event_at = time.monotonic()
+            elif job_id is not None:
+                # Job terminado sem o evento final ou worker morto: não fica ouvindo para sempre
+                should_close, reason = await sync_to_async(job_stream_should_close)(
+                    job_id, time.monotonic() - last_event_at, idle_timeout
+                )
+                if should_close:
+                    await send({'type': 'websocket.close', 'code': 1000 if reason == 'finished' else 4408})
+                    return
+
+            try:
+                await asyncio.wait_for(disconnected.wait(), timeout=poll_interval)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        watcher.cancel()
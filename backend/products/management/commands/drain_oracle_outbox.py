@@ -0,0 +1,79 @@
+# products/management/commands/drain_oracle_outbox.py
+
+import os
+import signal
+import socket
+import time
+import traceback
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from products.services.oracle_outbox import (
+    claim_outbox_batch,
+    outbox_stats,
+    process_outbox_batch,
+    purge_outbox,
+    requeue_stale_outbox,
+)
+
+
+class Command(BaseCommand):
+    help = 'Envia ao Oracle os produtos aprovados do outbox (lotes, retentativa exponencial)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help='Linhas por lote (padrão: ORACLE_OUTBOX_BATCH_SIZE)')
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='Segundos entre consultas ao outbox vazio')
+        parser.add_argument('--once', action='store_true', help='Drena as linhas vencidas e sai')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        poll_interval = options['poll_interval']
+        run_once = options['once']
+        worker_name = f"{socket.gethostname()}:{os.getpid()}/oracle"
+
+        stop = {'requested': False}
+
+        def _request_stop(signum, frame):
+            stop['requested'] = True
+
+        signal.signal(signal.SIGTERM, _request_stop)
+        signal.signal(signal.SIGINT, _request_stop)
+
+        print("\n" + "=" * 70)
+        print(f"📤 OUTBOX ORACLE: {worker_name}")
+        print("=" * 70)
+
+        last_maintenance = 0.0
+
+        while not stop['requested']:
+            try:
+                close_old_connections()
+
+                # Linhas órfãs e limpeza no início e a cada minuto
+                if time.monotonic() - last_maintenance >= 60:
+                    requeue_stale_outbox()
+                    purge_outbox()
+                    last_maintenance = time.monotonic()
+
+                entries = claim_outbox_batch(worker_name, batch_size)
+
+                if not entries:
+                    if run_once:
+                        break
+                    time.sleep(poll_interval)
+                    continue
+
+                counts = process_outbox_batch(entries)
+                stats = outbox_stats()
+                print(f"✅ Lote de {len(entries)}: {counts['done']} ok, {counts['retry']} reprogramados, "
+                      f"{counts['failed']} falharam | pendentes: {stats['pending']}, "
+                      f"mais antigo: {stats['oldest_pending_seconds']}s")
+            except Exception as e:
+                # Um lote com problema não derruba o drenador: as linhas ficam
+                # 'processing' e voltam para a fila por requeue_stale_outbox
+                print(f"❌ Erro no drenador do outbox Oracle: {e}")
+                traceback.print_exc()
+                time.sleep(poll_interval)
+
+        print(f"👋 {worker_name} encerrado")
@@ -0,0 +1,23 @@
+# products/management/commands/purge_image_store.py
+
+from django.core.management.base import BaseCommand
+
+from products.services.image_store import purge_unreferenced_images, store_stats
+
+
+class Command(BaseCommand):
+    help = 'Remove do image store as imagens que nenhum produto usa mais'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-hours', type=int, default=24, help='Só remove imagens sem uso há mais de N horas')
+        parser.add_argument('--dry-run', action='store_true', help='Apenas mostra o que seria removido')
+
+    def handle(self, *args, **options):
+        before = store_stats()
+        print(f"🗄️  Image store: {before['images']} imagens, {before['unreferenced']} sem referência, "
+              f"{(before['bytes'] or 0) // 1024}KB")
+
+        result = purge_unreferenced_images(grace_hours=options['grace_hours'], dry_run=options['dry_run'])
+
+        action = 'seriam removidas' if options['dry_run'] else 'removidas'
+        print(f"🧹 {result['removed']} imagens {action} ({result['freed_bytes'] // 1024}KB)")
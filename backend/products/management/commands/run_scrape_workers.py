@@ -0,0 +1,95 @@
+# products/management/commands/run_scrape_workers.py
+
+import multiprocessing
+import os
+import signal
+import socket
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+
+from products.services.scrape_jobs import claim_next_job, execute_job, requeue_stale_jobs
+
+
+def worker_loop(worker_name: str, poll_interval: float, run_once: bool):
+    """Loop de um processo worker: pega jobs da fila do Postgres e executa"""
+    # Conexões herdadas do processo pai não podem ser compartilhadas após o fork
+    connections.close_all()
+
+    stop = {'requested': False}
+
+    def _request_stop(signum, frame):
+        stop['requested'] = True
+
+    signal.signal(signal.SIGTERM, _request_stop)
+    signal.signal(signal.SIGINT, _request_stop)
+
+    print(f"👷 {worker_name} aguardando jobs...")
+
+    last_maintenance = time.monotonic()
+
+    while not stop['requested']:
+        close_old_connections()
+
+        # Jobs de workers que morreram com estes rodando voltam para a fila
+        if time.monotonic() - last_maintenance >= 60:
+            requeue_stale_jobs()
+            last_maintenance = time.monotonic()
+
+        job = claim_next_job(worker_name)
+
+        if job is None:
+            if run_once:
+                break
+            time.sleep(poll_interval)
+            continue
+
+        execute_job(job)
+
+    print(f"👋 {worker_name} encerrado")
+
+
+class Command(BaseCommand):
+    help = 'Inicia processos worker que executam os ScrapeJobs enfileirados (fila no Postgres)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='Número de processos worker')
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='Segundos entre consultas à fila vazia')
+        parser.add_argument('--once', action='store_true', help='Processa a fila atual e sai')
+
+    def handle(self, *args, **options):
+        workers = max(options['workers'], 1)
+        poll_interval = options['poll_interval']
+        run_once = options['once']
+
+        print("\n" + "=" * 70)
+        print(f"🏭 SCRAPE WORKERS: {workers} processos")
+        print("=" * 70)
+
+        requeue_stale_jobs()
+        connections.close_all()
+
+        base_name = f"{socket.gethostname()}:{os.getpid()}"
+        processes = []
+
+        for i in range(workers):
+            process = multiprocessing.Process(
+                target=worker_loop,
+                args=(f"{base_name}/w{i + 1}", poll_interval, run_once),
+                daemon=False,
+            )
+            process.start()
+            processes.append(process)
+
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            print("\n⏹️  Encerrando workers...")
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.join()
+
+        print("✅ Workers finalizados")
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.6 on 2026-10-16 23:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_scrapejobevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredImage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(max_length=64, unique=True)),
+                ('file', models.ImageField(upload_to='products/store/')),
+                ('size_bytes', models.PositiveIntegerField(default=0)),
+                ('ref_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['ref_count', 'last_used_at'], name='products_st_ref_cou_0400cc_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ImageSource',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url_hash', models.CharField(max_length=64, unique=True)),
+                ('source_url', models.TextField()),
+                ('last_fetched_at', models.DateTimeField(auto_now=True)),
+                ('stored_image', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sources', to='products.storedimage')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='main_stored_image',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='main_for_products', to='products.storedimage'),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='stored_image',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='product_images', to='products.storedimage'),
+        ),
+    ]
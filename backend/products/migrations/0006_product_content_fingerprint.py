@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-16 23:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_image_store'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='content_fingerprint',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.6 on 2026-10-17 00:27
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_scrapejob_dedupe_key'),
+        ('sites', '0002_site_configuration'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueryRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('query', models.CharField(max_length=200)),
+                ('raw_query', models.CharField(blank=True, max_length=200)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('site', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='query_runs', to='sites.site')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='QueryHit',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveIntegerField(default=0)),
+                ('seen_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='query_hits', to='products.product')),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hits', to='products.queryrun')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='queryrun',
+            index=models.Index(fields=['query', 'site', 'created_at'], name='products_qu_query_5d7b68_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='queryhit',
+            index=models.Index(fields=['product', 'seen_at'], name='products_qu_product_1497b5_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='queryhit',
+            unique_together={('run', 'product')},
+        ),
+    ]
@@ -0,0 +1,57 @@
+from django.db import migrations
+
+
+BATCH_SIZE = 1000
+
+
+def normalize_query(query):
+    return ' '.join((query or '').lower().split())[:200]
+
+
+def backfill_query_hits(apps, schema_editor):
+    """Um QueryRun por (busca normalizada, site) a partir de Product.search_query"""
+    Product = apps.get_model('products', 'Product')
+    QueryRun = apps.get_model('products', 'QueryRun')
+    QueryHit = apps.get_model('products', 'QueryHit')
+
+    runs = {}
+    ranks = {}
+    hits = []
+
+    products = (
+        Product.objects
+        .exclude(search_query__isnull=True)
+        .exclude(search_query='')
+        .order_by('site_id', 'search_query', 'created_at')
+        .values_list('id', 'site_id', 'search_query', 'updated_at')
+    )
+
+    for product_id, site_id, search_query, updated_at in products.iterator(chunk_size=BATCH_SIZE):
+        key = (normalize_query(search_query), site_id)
+        if not key[0]:
+            continue
+
+        if key not in runs:
+            runs[key] = QueryRun.objects.create(query=key[0], raw_query=search_query[:200], site_id=site_id).id
+            ranks[key] = 0
+
+        ranks[key] += 1
+        hits.append(QueryHit(run_id=runs[key], product_id=product_id, rank=ranks[key], seen_at=updated_at))
+
+        if len(hits) >= BATCH_SIZE:
+            QueryHit.objects.bulk_create(hits, ignore_conflicts=True)
+            hits = []
+
+    if hits:
+        QueryHit.objects.bulk_create(hits, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_query_run_hits'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_query_hits, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,75 @@
+import hashlib
+import json
+import re
+from decimal import Decimal, InvalidOperation
+
+from django.db import migrations
+
+
+BATCH_SIZE = 1000
+
+
+def normalize_text(value):
+    return re.sub(r'\s+', ' ', str(value or '')).strip()
+
+
+def normalize_price(value):
+    if value in (None, ''):
+        return None
+    try:
+        price = Decimal(str(value)).quantize(Decimal('0.01'))
+    except (InvalidOperation, ValueError):
+        return None
+    return price if price else None
+
+
+def content_fingerprint(product):
+    """Mesmo cálculo de compute_content_fingerprint (sem as imagens)"""
+    price = normalize_price(product.price)
+    old_price = normalize_price(product.original_price)
+    normalized = {
+        'name': normalize_text(product.name),
+        'price': str(price) if price is not None else None,
+        'old_price': str(old_price) if old_price is not None else None,
+        'description': normalize_text(product.description),
+        'specifications': {
+            normalize_text(key): normalize_text(value)
+            for key, value in ((product.scraped_data or {}).get('specifications') or {}).items()
+        },
+    }
+    encoded = json.dumps(normalized, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def recompute_content_fingerprints(apps, schema_editor):
+    """Fingerprints antigos incluíam as imagens: recalcula para a próxima busca não ver tudo como alterado"""
+    Product = apps.get_model('products', 'Product')
+
+    products = (
+        Product.objects
+        .exclude(content_fingerprint__isnull=True)
+        .only('id', 'name', 'price', 'original_price', 'description', 'scraped_data', 'content_fingerprint')
+    )
+
+    batch = []
+    for product in products.iterator(chunk_size=BATCH_SIZE):
+        product.content_fingerprint = content_fingerprint(product)
+        batch.append(product)
+
+        if len(batch) >= BATCH_SIZE:
+            Product.objects.bulk_update(batch, ['content_fingerprint'])
+            batch = []
+
+    if batch:
+        Product.objects.bulk_update(batch, ['content_fingerprint'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0010_oracle_sync_outbox'),
+    ]
+
+    operations = [
+        migrations.RunPython(recompute_content_fingerprints, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,9 @@
 import uuid
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.core.files.base import ContentFile
+from django.utils import timezone
 from django.utils.text import slugify
 from sites.models import Site
 
@@ -21,6 +24,9 @@ class Product(models.Model):
     
     # Campo para múltiplas imagens
     main_image = models.ImageField(upload_to='products/images/', null=True, blank=True)
+    main_stored_image = models.ForeignKey(
+        'StoredImage', null=True, blank=True, on_delete=models.PROTECT, related_name='main_for_products'
+    )  # main_image aponta para o arquivo do StoredImage (sem cópia)
     
     availability = models.CharField(max_length=100, blank=True, null=True)
     rating = models.DecimalField(max_digits=3, decimal_places=2, null=True, blank=True)
@@ -30,6 +36,7 @@ class Product(models.Model):
     site = models.ForeignKey(Site, on_delete=models.CASCADE)
     search_query = models.CharField(max_length=200, db_index=True)
     scraped_data = models.JSONField(default=dict, blank=True, null=True)
+    content_fingerprint = models.CharField(max_length=64, blank=True, null=True)  # sha256 do conteúdo normalizado
     status = models.IntegerField(choices=STATUS_CHOICES, default=1)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -66,6 +73,9 @@ class ProductImage(models.Model):
     alt_text = models.CharField(max_length=255, blank=True, null=True)
     order = models.PositiveIntegerField(default=0)
     original_url = models.URLField(blank=True, null=True)  # Para referência
+    stored_image = models.ForeignKey(
+        'StoredImage', null=True, blank=True, on_delete=models.PROTECT, related_name='product_images'
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
@@ -76,3 +86,206 @@ class ProductImage(models.Model):
     
     def __str__(self):
         return f"{self.product.name} - Imagem {self.id}"
+
+
+class StoredImage(models.Model):
+    """
+    Imagem otimizada guardada uma única vez (endereçada pelo hash do conteúdo)
+
+    ProductImage.image e Product.main_image apontam para o mesmo arquivo;
+    ref_count conta essas referências (0 = pode ser removida pelo purge_image_store).
+    """
+    content_hash = models.CharField(max_length=64, unique=True)  # sha256 dos bytes baixados
+    file = models.ImageField(upload_to='products/store/')
+    size_bytes = models.PositiveIntegerField(default=0)
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['ref_count', 'last_used_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.content_hash[:12]} ({self.ref_count} refs)"
+
+
+class ImageSource(models.Model):
+    """URL de origem já baixada -> imagem armazenada (evita baixar de novo)"""
+    url_hash = models.CharField(max_length=64, unique=True)  # sha256 da URL
+    source_url = models.TextField()
+    stored_image = models.ForeignKey(StoredImage, related_name='sources', on_delete=models.CASCADE)
+    last_fetched_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return self.source_url
+
+
+class QueryRun(models.Model):
+    """Uma execução de busca em um site (os produtos encontrados ficam em QueryHit)"""
+    query = models.CharField(max_length=200)  # Normalizada (minúsculas, espaços simples)
+    raw_query = models.CharField(max_length=200, blank=True)
+    site = models.ForeignKey(Site, related_name='query_runs', on_delete=models.CASCADE)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['query', 'site', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.query} ({self.site_id}) - {self.created_at:%Y-%m-%d %H:%M}"
+
+
+class QueryHit(models.Model):
+    """Produto encontrado por uma busca, com a posição na listagem"""
+    run = models.ForeignKey(QueryRun, related_name='hits', on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, related_name='query_hits', on_delete=models.CASCADE)
+    rank = models.PositiveIntegerField(default=0)
+    seen_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        unique_together = ['run', 'product']
+        indexes = [
+            models.Index(fields=['product', 'seen_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.run.query} #{self.rank}: {self.product_id}"
+
+
+class ScrapeJob(models.Model):
+    """Busca detalhada executada em background pelos workers (run_scrape_workers)"""
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Na fila'),
+        (STATUS_RUNNING, 'Executando'),
+        (STATUS_DONE, 'Concluído'),
+        (STATUS_FAILED, 'Falhou'),
+    ]
+    ACTIVE_STATUSES = [STATUS_QUEUED, STATUS_RUNNING]
+    
+    query = models.CharField(max_length=200)
+    parameters = models.JSONField(default=dict, blank=True)
+    # Hash dos parâmetros normalizados: buscas idênticas em andamento viram um único job
+    dedupe_key = models.CharField(max_length=64, blank=True, null=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='scrape_jobs'
+    )
+    result = models.JSONField(null=True, blank=True)  # Resumo + IDs dos produtos salvos
+    error = models.TextField(blank=True, null=True)
+    worker = models.CharField(max_length=100, blank=True, null=True)
+    attempts = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Renovado por quem executa o job; parado há mais de SCRAPE_JOB_LEASE_SECONDS = dono morreu
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+            models.Index(fields=['dedupe_key', 'status']),
+        ]
+        constraints = [
+            # No máximo um job ativo por busca; o banco serializa os concorrentes
+            models.UniqueConstraint(
+                fields=['dedupe_key'],
+                condition=models.Q(status__in=['queued', 'running']),
+                name='unique_active_scrape_job_dedupe_key',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"Job {self.id} - {self.query} ({self.status})"
+
+
+class ScrapeJobEvent(models.Model):
+    """Evento de progresso de um ScrapeJob (transmitido via WebSocket/SSE)"""
+    job = models.ForeignKey(ScrapeJob, related_name='events', on_delete=models.CASCADE)
+    event_type = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['job', 'id']),
+        ]
+    
+    def __str__(self):
+        return f"Job {self.job_id} - {self.event_type}"
+    
+    def as_message(self):
+        """Formato enviado ao frontend"""
+        return {
+            'id': self.id,
+            'job_id': self.job_id,
+            'type': self.event_type,
+            'payload': self.payload,
+            'created_at': self.created_at.isoformat(),
+        }
+
+
+class OracleSyncOutbox(models.Model):
+    """
+    Produto aprovado aguardando sincronização com o Oracle
+
+    Gravado na mesma transação da mudança de status; o command
+    drain_oracle_outbox envia em lote e reprograma as falhas.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_PROCESSING = 'processing'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pendente'),
+        (STATUS_PROCESSING, 'Enviando'),
+        (STATUS_DONE, 'Sincronizado'),
+        (STATUS_FAILED, 'Falhou'),
+    ]
+    
+    product = models.ForeignKey(Product, related_name='oracle_outbox', on_delete=models.CASCADE)
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='oracle_sync_requests'
+    )  # Credenciais Oracle usadas no envio
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, null=True)
+    worker = models.CharField(max_length=100, blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+            models.Index(fields=['status', 'processed_at']),
+        ]
+        constraints = [
+            # Aprovar de novo enquanto o envio está pendente não cria outra linha
+            models.UniqueConstraint(
+                fields=['product'],
+                condition=models.Q(status='pending'),
+                name='unique_pending_oracle_sync_product',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"Oracle sync {self.id} - produto {self.product_id} ({self.status})"
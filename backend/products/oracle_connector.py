@@ -1,6 +1,9 @@
 import oracledb
 from django.conf import settings
 import os
+import threading
+import time
+from contextlib import contextmanager
 
 
 # Inicializa o modo "thick" do oracledb (necessário para Oracle < 12.1)
@@ -40,27 +43,140 @@ def _init_thick_mode():
 _init_thick_mode()
 
 
-def get_oracle_connection(user, password):
-    """
-    Retorna um objeto de conexão oracledb usando as configurações definidas
-    no settings.py para o banco 'oracle_db'.
-    """ 
-    
+def _get_dsn():
     # oracledb usa a DSN (Data Source Name) no formato HOST:PORT/SERVICE_NAME
-    dsn = oracledb.makedsn(
+    return oracledb.makedsn(
         host=settings.ORACLE_HOST,
         port=settings.ORACLE_PORT,
         service_name=settings.ORACLE_SERVICE_NAME  # 'NAME' contém o SERVICE_NAME no seu settings
     )
-    
+
+
+# ========== POOL DE SESSÕES ==========
+# Pool heterogêneo: cada acquire usa as credenciais do próprio usuário
+# (login, catálogo e sincronização rodam com o usuário Oracle que fez login).
+# Sessões devolvidas ficam abertas e são reaproveitadas pelo mesmo usuário,
+# sem novo handshake a cada chamada.
+
+_pool = None
+_pool_lock = threading.Lock()
+
+_stats_lock = threading.Lock()
+_stats = {
+    'acquisitions': 0,
+    'failures': 0,
+    'wait_seconds_total': 0.0,
+    'wait_seconds_max': 0.0,
+}
+
+
+def get_oracle_pool():
+    """Retorna o pool de sessões do processo (criado no primeiro uso)"""
+    global _pool
+
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = oracledb.create_pool(
+                    dsn=_get_dsn(),
+                    homogeneous=False,
+                    min=getattr(settings, 'ORACLE_POOL_MIN', 0),
+                    max=getattr(settings, 'ORACLE_POOL_MAX', 8),
+                    increment=getattr(settings, 'ORACLE_POOL_INCREMENT', 1),
+                    stmtcachesize=getattr(settings, 'ORACLE_POOL_STMT_CACHE', 50),
+                    getmode=oracledb.POOL_GETMODE_TIMEDWAIT,
+                    wait_timeout=getattr(settings, 'ORACLE_POOL_WAIT_TIMEOUT', 10) * 1000,  # ms
+                    timeout=getattr(settings, 'ORACLE_POOL_IDLE_TIMEOUT', 300),  # Sessão ociosa é fechada
+                )
+                print(f"✅ Pool Oracle criado (max={_pool.max}, stmtcache={_pool.stmtcachesize})")
+
+    return _pool
+
+
+def acquire_oracle_connection(user, password):
+    """
+    Pega uma sessão do pool com as credenciais do usuário
+
+    Erros do Oracle (ex.: ORA-01017 senha inválida) são repassados como
+    oracledb.Error. connection.close() devolve a sessão ao pool.
+    """
+    start = time.time()
+
+    try:
+        if oracledb.is_thin_mode():
+            # Sem o Instant Client (SKIP_ORACLE_INIT) não há pool sem credenciais: conexão avulsa
+            connection = oracledb.connect(user=user, password=password, dsn=_get_dsn())
+        else:
+            connection = get_oracle_pool().acquire(user=user, password=password)
+    except oracledb.Error:
+        with _stats_lock:
+            _stats['failures'] += 1
+        raise
+
+    waited = time.time() - start
+    with _stats_lock:
+        _stats['acquisitions'] += 1
+        _stats['wait_seconds_total'] += waited
+        _stats['wait_seconds_max'] = max(_stats['wait_seconds_max'], waited)
+
+    return connection
+
+
+def release_oracle_connection(connection):
+    """Devolve a sessão ao pool (transação aberta é desfeita)"""
+    try:
+        connection.close()
+    except oracledb.Error as e:
+        print(f"⚠️  Falha ao devolver sessão Oracle ao pool: {e}")
+
+
+@contextmanager
+def oracle_connection(user, password):
+    """with oracle_connection(user, password) as conn: ... (sessão sempre devolvida)"""
+    connection = acquire_oracle_connection(user, password)
+    try:
+        yield connection
+    finally:
+        release_oracle_connection(connection)
+
+
+def oracle_pool_stats():
+    """Ocupação do pool e contadores de acquire"""
+    with _stats_lock:
+        stats = dict(_stats)
+
+    acquisitions = stats['acquisitions']
+    stats['wait_seconds_avg'] = round(stats['wait_seconds_total'] / acquisitions, 4) if acquisitions else None
+    stats['wait_seconds_total'] = round(stats['wait_seconds_total'], 3)
+    stats['wait_seconds_max'] = round(stats['wait_seconds_max'], 3)
+    stats['pooled'] = _pool is not None
+
+    if _pool is None:
+        return stats
+
+    try:
+        stats.update({
+            'opened': _pool.opened,
+            'busy': _pool.busy,
+            'min': _pool.min,
+            'max': _pool.max,
+            'stmtcachesize': _pool.stmtcachesize,
+        })
+    except oracledb.Error as e:
+        stats['error'] = str(e)
+
+    return stats
+
+
+def get_oracle_connection(user, password):
+    """
+    Retorna uma conexão oracledb (sessão do pool) usando as configurações
+    definidas no settings.py para o banco 'oracle_db'.
+
+    Fechar a conexão devolve a sessão ao pool.
+    """ 
     try:
-        # Tenta a conexão com o banco Oracle
-        conn = oracledb.connect(
-            user=user,
-            password=password,
-            dsn=dsn
-        )
-        return conn
+        return acquire_oracle_connection(user, password)
     except oracledb.Error as e:
         error_obj, = e.args
         print(f"Erro de Conexão Oracle: {error_obj.code} - {error_obj.message}")
@@ -1,26 +1,265 @@
+"""
+Sincronização de produtos aprovados com o Oracle (ST_ARTICULOS_PROV e
+ST_IMAG_ARTICULOS_PROV)
+
+Trabalha em lotes (ORACLE_SYNC_BATCH_SIZE produtos):
+- produtos: um único MERGE INTO ST_ARTICULOS_PROV enviado com executemany
+  (arrays de bind, uma ida ao banco por lote)
+- imagens dos produtos aceitos: INSERT com executemany, em sublotes de
+  ORACLE_SYNC_IMAGE_BATCH_SIZE (os bytes vão direto no bind do BLOB)
+- batcherrors=True: a linha com erro é registrada e as demais seguem
+- um commit por lote
+
+O SQL com os valores embutidos (debug) só é montado com
+ORACLE_SYNC_DEBUG_SQL=True.
+"""
+
 import os
-import re  # 👈 MOVIDO PARA O TOPO DO ARQUIVO
-import oracledb
-import requests  # Necessário para o BLOB/URL da imagem
+import re
 import traceback
+from typing import Any, Dict, List, Optional, Tuple
+
+import oracledb
+from django.conf import settings
+from django.db.models import Prefetch
 from django.utils import timezone
-from io import BytesIO  # Para lidar com os bytes da imagem
+
 from .oracle_connector import get_oracle_connection  # Importa a nova função de conexão
 from products.models import Product, ProductImage
 
 
-COD_EMPRESA = '1' 
+COD_EMPRESA = '1'
 COD_MONEDA = 'GS.'
 
+SQL_MERGE_ARTICULO = """
+    MERGE INTO ST_ARTICULOS_PROV t
+    USING (SELECT :cod_empresa AS COD_EMPRESA, :cod_articulo AS COD_ARTICULO FROM DUAL) s
+    ON (t.COD_EMPRESA = s.COD_EMPRESA AND t.COD_ARTICULO = s.COD_ARTICULO)
+    WHEN MATCHED THEN UPDATE SET
+        DESCRIPCION = :description,
+        PRECIO_BASE = :price_base,
+        COSTO_PROM_EXT = :original_price,
+        DESC_CORTA = :desc_corta,
+        LINK_WEB = :url,
+        PALABRA_CLAVE = :brand,
+        FEC_PROCESO = :fec_proceso,
+        IND_WEB = 'S',
+        FEC_ULTIMA_COMP = :fec_proceso
+    WHEN NOT MATCHED THEN INSERT (
+        COD_EMPRESA, COD_ARTICULO, DESCRIPCION, PRECIO_BASE, COSTO_PROM_EXT,
+        DESC_CORTA, LINK_WEB, PALABRA_CLAVE, FEC_PROCESO,
+        COD_MONEDA_BASE, ESTADO, IND_WEB, IND_PRODUCTO
+    ) VALUES (
+        s.COD_EMPRESA, s.COD_ARTICULO, :description, :price_base, :original_price,
+        :desc_corta, :url, :brand, :fec_proceso,
+        :cod_moneda, 'A', 'S', 'N'
+    )
+"""
+
+SQL_INSERT_IMAGEN = """
+    INSERT INTO ST_IMAG_ARTICULOS_PROV (
+        COD_EMPRESA, COD_ARTICULO, NRO_ORDEN, IMAGEN, COD_USUARIO
+    ) VALUES (
+        :cod_empresa, :cod_articulo, :nro_orden, :imagen, :cod_usuario
+    )
+"""
+
+_BIND_RE = re.compile(r':(\w+)')
+
+
+def _to_number(value) -> float:
+    """Preço do serializer (string com vírgula, None...) para float"""
+    try:
+        return float(str(value).replace(',', '.') if value else 0)
+    except (ValueError, TypeError):
+        return 0.0
+
+
+def _articulo_params(product_data: Dict[str, Any], sku: str, fec_proceso) -> Dict[str, Any]:
+    return {
+        'cod_empresa': COD_EMPRESA,
+        'cod_articulo': sku,
+        'description': (product_data.get('name') or '')[:100],
+        'price_base': _to_number(product_data.get('price')),
+        'original_price': _to_number(product_data.get('original_price')),
+        'desc_corta': str(product_data.get('description') or '')[:500],
+        'url': str(product_data.get('url') or '')[:150],
+        'brand': str(product_data.get('brand') or '')[:200],
+        'fec_proceso': fec_proceso,
+        'cod_moneda': COD_MONEDA,
+    }
+
+
+def render_debug_sql(sql: str, params: Dict[str, Any]) -> str:
+    """SQL com os valores embutidos, em uma linha (só para log)"""
+    def _literal(match):
+        name = match.group(1)
+        if name not in params:
+            return match.group(0)
+        value = params[name]
+        if value is None:
+            return 'NULL'
+        if isinstance(value, (int, float)):
+            return str(value)
+        if isinstance(value, bytes):
+            return f"<{len(value)} bytes>"
+        return "'" + str(value).replace("'", "''") + "'"
+
+    return ' '.join(_BIND_RE.sub(_literal, sql).split())
+
+
+def _debug_sql_enabled() -> bool:
+    return getattr(settings, 'ORACLE_SYNC_DEBUG_SQL', False)
+
+
+def _oracle_error(error) -> Tuple[Any, str]:
+    """(código, mensagem) de um oracledb.Error ou de um erro de getbatcherrors()"""
+    if isinstance(error, oracledb.Error) and error.args:
+        error = error.args[0]
+    return getattr(error, 'code', 'N/A'), getattr(error, 'message', str(error))
+
+
+def _load_images(product_datas: List[Dict[str, Any]], skus: List[str]) -> Dict[str, List[ProductImage]]:
+    """Imagens (ordenadas) de cada SKU do lote em duas consultas: pelo SKU e pelo id"""
+    images_prefetch = Prefetch('images', queryset=ProductImage.objects.order_by('order', 'created_at'))
+
+    by_sku = {}
+    for product in Product.objects.filter(sku_code__in=skus).prefetch_related(images_prefetch).order_by('id'):
+        by_sku.setdefault(product.sku_code, product)
+
+    missing_ids = [
+        product_data['id'] for product_data, sku in zip(product_datas, skus)
+        if sku not in by_sku and product_data.get('id')
+    ]
+    by_id = Product.objects.prefetch_related(images_prefetch).in_bulk(missing_ids)
+
+    images = {}
+    for product_data, sku in zip(product_datas, skus):
+        product = by_sku.get(sku) or by_id.get(product_data.get('id'))
+        images[sku] = list(product.images.all()) if product is not None else []
+    return images
+
+
+def _image_rows(sku: str, product_images: List[ProductImage], cod_usuario: str):
+    """Linhas do INSERT de imagens lidas do disco (gerador: um sublote por vez na memória)"""
+    for index, product_image in enumerate(product_images, start=1):
+        if not product_image.image:
+            print(f"⚠️  Imagem {index} sem arquivo para SKU {sku}")
+            continue
+
+        try:
+            image_path = product_image.image.path
+            if not os.path.exists(image_path):
+                print(f"⚠️  Arquivo não encontrado: {image_path}")
+                continue
+
+            with open(image_path, 'rb') as img_file:
+                image_bytes = img_file.read()
+        except Exception as img_e:
+            print(f"⚠️  Erro ao ler imagem {index} para SKU {sku}: {img_e}")
+            continue
+
+        yield {
+            'cod_empresa': COD_EMPRESA,
+            'cod_articulo': sku,
+            'nro_orden': index,
+            'imagen': image_bytes,
+            'cod_usuario': cod_usuario,
+        }
+
+
+def _insert_images(cursor, rows_iter, batch_size: int) -> Tuple[int, int]:
+    """INSERT das imagens em sublotes; erro de uma imagem não derruba o produto"""
+    inserted = failed = 0
+    batch = []
+
+    def _flush():
+        nonlocal inserted, failed
+        if not batch:
+            return
+        cursor.setinputsizes(imagen=oracledb.DB_TYPE_BLOB)
+        cursor.executemany(SQL_INSERT_IMAGEN, batch, batcherrors=True)
+        errors = cursor.getbatcherrors()
+        for error in errors:
+            row = batch[error.offset]
+            code, message = _oracle_error(error)
+            print(f"⚠️  Erro ao inserir imagem {row['nro_orden']} para SKU {row['cod_articulo']}: {code} - {message}")
+        failed += len(errors)
+        inserted += len(batch) - len(errors)
+        batch.clear()
+
+    for row in rows_iter:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            _flush()
+    _flush()
+
+    return inserted, failed
+
+
+def _sync_batch(oracle_conn, product_datas: List[Dict[str, Any]], skus: List[str], cod_usuario: str,
+                sync_results: Dict[str, Any]):
+    """Um lote: MERGE dos produtos + imagens dos aceitos, um commit no fim"""
+    fec_proceso = timezone.now().date()
+    rows = [_articulo_params(product_data, sku, fec_proceso) for product_data, sku in zip(product_datas, skus)]
+
+    if _debug_sql_enabled():
+        for row in rows:
+            print(f"\n--- DEBUG MERGE SKU: {row['cod_articulo']} ---")
+            print(render_debug_sql(SQL_MERGE_ARTICULO, row))
+
+    with oracle_conn.cursor() as cursor:
+        cursor.executemany(SQL_MERGE_ARTICULO, rows, batcherrors=True)
+
+        failed_offsets = set()
+        for error in cursor.getbatcherrors():
+            failed_offsets.add(error.offset)
+            sku = rows[error.offset]['cod_articulo']
+            code, message = _oracle_error(error)
+            print(f"❌ Erro DB Oracle REAL para SKU {sku}: {code} - {message}")
+            sync_results['errors'].append(f"Erro DB Oracle SKU {sku}: {code} - {message}")
+            sync_results['skus'][sku] = f"{code} - {message}"
+
+        accepted = [offset for offset in range(len(rows)) if offset not in failed_offsets]
+
+        # Imagens só dos produtos aceitos pelo MERGE
+        images = _load_images([product_datas[offset] for offset in accepted], [skus[offset] for offset in accepted])
+        image_rows = (
+            row
+            for offset in accepted
+            for row in _image_rows(skus[offset], images[skus[offset]], cod_usuario)
+        )
+        inserted, failed = _insert_images(
+            cursor, image_rows, getattr(settings, 'ORACLE_SYNC_IMAGE_BATCH_SIZE', 20)
+        )
+
+    oracle_conn.commit()
+
+    for offset in accepted:
+        sync_results['skus'][skus[offset]] = None
+    sync_results['success_count'] += len(accepted)
+    sync_results['error_count'] += len(failed_offsets)
+    sync_results['images_inserted'] += inserted
+    sync_results['image_errors'] += failed
+    sync_results['batches'] += 1
+    print(f"✅ Lote Oracle: {len(accepted)}/{len(rows)} produtos, {inserted} imagens"
+          f"{f' ({failed} com erro)' if failed else ''}")
+
+
 def sync_products_to_oracle(serialized_products, cod_usuario=None, password=None):
     """
     Sincroniza uma lista de produtos serializados para as tabelas Oracle
     ST_ARTICULOS_PROV e ST_IMAG_ARTICULOS usando oracledb.
-    
+
     Args:
         serialized_products: Lista de produtos serializados
         cod_usuario: Username do usuário Oracle que está fazendo a sincronização
                      (deve ser o username que fez login)
+
+    Returns:
+        {'success_count', 'error_count', 'errors', 'images_inserted',
+         'image_errors', 'batches', 'skus'}
+        skus: {sku: None (sincronizado) | mensagem de erro}
     """
     # Se não informar cod_usuario, usar um padrão
     if not cod_usuario:
@@ -28,276 +267,72 @@ def sync_products_to_oracle(serialized_products, cod_usuario=None, password=None
         print("⚠️  cod_usuario não informado, usando padrão: WEBSYNC")
     else:
         print(f"👤 Sincronizando como usuário: {cod_usuario}")
-    
-    sync_results = {'success_count': 0, 'error_count': 0, 'errors': []}
-    oracle_conn = None
+
+    sync_results = {
+        'success_count': 0,
+        'error_count': 0,
+        'errors': [],
+        'images_inserted': 0,
+        'image_errors': 0,
+        'batches': 0,
+        'skus': {},
+    }
+    oracle_conn: Optional[Any] = None
 
     try:
-        # 1. Estabelece a conexão Oracle
+        # 1. Pega uma sessão do pool Oracle (credenciais do usuário)
         oracle_conn = get_oracle_connection(cod_usuario, password)
-        
+
     except ConnectionError as e:
         sync_results['error_count'] = len(serialized_products)
         sync_results['errors'].append(f"Falha Crítica de Conexão: {e}")
         return sync_results
 
-    # 2. Processa cada produto
+    # 2. Separa os produtos sem SKU
+    product_datas = []
+    skus = []
     for product_data in serialized_products:
         sku = product_data.get('sku_code')
         if not sku:
             sync_results['error_count'] += 1
             sync_results['errors'].append(f"Produto sem sku_code (ID: {product_data.get('id')}), ignorado.")
             continue
-            
-        try:
-            with oracle_conn.cursor() as cursor:
-                
-                # --- Preparação dos dados ---
-                price_base = product_data.get('price')
-                original_price = product_data.get('original_price')
-                
-                # Novos campos do Oracle
-                # cod_proveedor = product_data.get('cod_proveedor')
-                # cod_marca = product_data.get('cod_marca')
-                # cod_rubro = product_data.get('cod_rubro')
-                # cod_grupo = product_data.get('cod_grupo')
-
-                try:
-                    # Converte para float (lidando com vírgula e nulos)
-                    price_base_num = float(str(price_base).replace(',', '.') if price_base else 0)
-                except (ValueError, TypeError):
-                    price_base_num = 0.0
-                
-                try:
-                    original_price_num = float(str(original_price).replace(',', '.') if original_price else 0)
-                except (ValueError, TypeError):
-                    original_price_num = 0.0
-
-                
-                # --- QUERY 1: ST_ARTICULOS_PROV (Produto Principal) ---
-                
-                # 1. Tenta fazer um UPDATE:
-                sql_update = """
-                    UPDATE ST_ARTICULOS_PROV
-                    SET 
-                        DESCRIPCION = :description, 
-                        PRECIO_BASE = :price_base, 
-                        COSTO_PROM_EXT = :original_price,
-                        DESC_CORTA = :desc_corta,
-                        LINK_WEB = :url,
-                        PALABRA_CLAVE = :brand,
-                        FEC_PROCESO = :fec_proceso,
-                        IND_WEB = 'S', 
-                        FEC_ULTIMA_COMP = :fec_proceso 
-                    WHERE COD_EMPRESA = :cod_empresa AND COD_ARTICULO = :cod_articulo
-                """
-                params_update = {
-                    'description': product_data.get('name', '')[:100],
-                    'price_base': price_base_num,
-                    'original_price': original_price_num,
-                    'desc_corta': str(product_data.get('description') or '')[:500],
-                    'url': str(product_data.get('url') or '')[:150],
-                    'brand': str(product_data.get('brand') or '')[:200],
-                    'fec_proceso': timezone.now().date(),
-                    'cod_empresa': COD_EMPRESA,
-                    'cod_articulo': sku
-                }
-
-                # 💡 CÓDIGO DE DEBUG PARA GERAR A QUERY COMPLETA 💡
-                try:
-                    debug_sql_formatted = sql_update
-                    
-                    # Substitui os valores na query
-                    for key, value in params_update.items():
-                        # Formata o valor baseado no tipo
-                        if isinstance(value, str):
-                            # Escapa aspas simples
-                            value_str = f"'{value.replace(chr(39), chr(39)+chr(39))}'"
-                        elif isinstance(value, (int, float)):
-                            value_str = str(value)
-                        elif value is None:
-                            value_str = 'NULL'
-                        else:
-                            # Trata datas/objetos: converte para string e envolve em aspas
-                            value_str = f"'{str(value)}'"
-
-                        # Substitui o placeholder no SQL
-                        debug_sql_formatted = re.sub(r':\b' + re.escape(key) + r'\b', value_str, debug_sql_formatted)
-
-                    # Imprime a query formatada em uma linha (removendo novas linhas e espaços extras)
-                    print(f"\n--- DEBUG UPDATE FORMATADO PARA {sku} ---")
-                    print(re.sub(r'\s+', ' ', debug_sql_formatted).strip())
-                    print("--- FIM DEBUG ---")
-                except Exception as debug_error:
-                    print(f"⚠️ Erro ao gerar debug SQL: {debug_error}")
-                
-                cursor.execute(sql_update, params_update)
-                
-                # 2. Se nenhuma linha foi afetada, faz o INSERT:
-                if cursor.rowcount == 0:
-                    sql_insert = """
-                        INSERT INTO ST_ARTICULOS_PROV (
-                            COD_EMPRESA, COD_ARTICULO, DESCRIPCION, PRECIO_BASE, COSTO_PROM_EXT, 
-                            DESC_CORTA, LINK_WEB, PALABRA_CLAVE, FEC_PROCESO, 
-                            COD_MONEDA_BASE, ESTADO, IND_WEB, IND_PRODUCTO
-                        ) VALUES (
-                            :cod_empresa, :cod_articulo, :description, :price_base, :original_price, 
-                            :desc_corta, :url, :brand, :fec_proceso, 
-                            :cod_moneda, :estado, 'S', 'N'
-                        )
-                    """
-                    params_insert = {
-                        'cod_empresa': COD_EMPRESA,
-                        'cod_articulo': sku,
-                        'description': product_data.get('name', '')[:100],
-                        'price_base': price_base_num,
-                        'original_price': original_price_num,
-                        'desc_corta': str(product_data.get('description') or '')[:500],
-                        'url': str(product_data.get('url') or '')[:150],
-                        'brand': str(product_data.get('brand') or '')[:200],
-                        'fec_proceso': timezone.now().date(),
-                        'cod_moneda': COD_MONEDA,
-                        'estado': 'A'
-                    }
-                    
-                    # 💡 CÓDIGO DE DEBUG PARA INSERT
-                    try:
-                        print(f"--- DEBUG INSERT SKU: {sku} ---")
-                        
-                        # Formata a query para visualização
-                        debug_sql = sql_insert
-                        for key, value in params_insert.items():
-                            if isinstance(value, str):
-                                value_str = f"'{str(value)}'"
-                            elif value is None:
-                                value_str = 'NULL'
-                            else:
-                                value_str = str(value)
-
-                            # Substitui o placeholder no SQL
-                            debug_sql = re.sub(r':\b' + re.escape(key) + r'\b', value_str, debug_sql)
-
-                        # Imprime a query formatada
-                        print(re.sub(r'\s+', ' ', debug_sql).strip())
-                        print(f"--- FIM DEBUG INSERT SKU: {sku} ---")
-                    except Exception as debug_error:
-                        print(f"⚠️ Erro ao gerar debug INSERT: {debug_error}")
-                                        
-                    cursor.execute(sql_insert, params_insert)
-
-                # --- QUERY 2: ST_IMAG_ARTICULOS (Imagens) ---
-                
-                # B. Buscar imagens do produto no Django
-                # Tentar buscar pelo SKU ou pelo ID do produto
-                try:
-                    django_product = Product.objects.filter(sku_code=sku).first()
-                    
-                    if not django_product and 'id' in product_data:
-                        django_product = Product.objects.filter(id=product_data['id']).first()
-                    
-                    if django_product and django_product.images.exists():
-                        # Pegar imagens ordenadas
-                        product_images = django_product.images.all().order_by('order', 'created_at')
-                        
-                        print(f"📸 Encontradas {product_images.count()} imagens para SKU {sku}")
-                        
-                        # C. Inserir as imagens no Oracle (lendo do disco)
-                        for index, product_image in enumerate(product_images, start=1):
-                            try:
-                                # 1. Verificar se o arquivo existe no disco
-                                if not product_image.image:
-                                    print(f"⚠️  Imagem {index} sem arquivo para SKU {sku}")
-                                    continue
-                                
-                                image_path = product_image.image.path
-                                
-                                if not os.path.exists(image_path):
-                                    print(f"⚠️  Arquivo não encontrado: {image_path}")
-                                    continue
-                                
-                                # 2. Ler arquivo da imagem do disco
-                                with open(image_path, 'rb') as img_file:
-                                    image_bytes = img_file.read()
-                                
-                                # 3. Criar variável para o LOB
-                                blob_var = cursor.var(oracledb.BLOB)
-                                
-                                # 4. SQL com RETURNING
-                                sql_insert_image = """
-                                    INSERT INTO ST_IMAG_ARTICULOS_PROV (
-                                        COD_EMPRESA, COD_ARTICULO, NRO_ORDEN, IMAGEN, COD_USUARIO
-                                    ) VALUES (
-                                        :1, :2, :3, EMPTY_BLOB(), :4
-                                    ) RETURNING IMAGEN INTO :5
-                                """
-                                
-                                # 5. Executar INSERT
-                                cursor.execute(sql_insert_image, [
-                                    COD_EMPRESA,
-                                    sku,
-                                    index,
-                                    cod_usuario,
-                                    blob_var
-                                ])
-                                
-                                # 6. Escrever os bytes da imagem no BLOB
-                                blob = blob_var.getvalue()[0]
-                                blob.write(image_bytes)
-                                
-                                print(f"✅ Imagem {index} inserida para SKU {sku} ({len(image_bytes)} bytes)")
-                                
-                            except Exception as img_e:
-                                print(f"⚠️  Erro ao inserir imagem {index} para SKU {sku}: {img_e}")
-                                # Continua para próxima imagem
-                                continue
-                    else:
-                        print(f"ℹ️  Nenhuma imagem encontrada no Django para SKU {sku}")
-                        
-                except Exception as e:
-                    print(f"⚠️  Erro ao buscar imagens no Django para SKU {sku}: {e}")
-                    # Continua sem imagens
-                
-                # Commit das alterações no banco Oracle
-                oracle_conn.commit()
-                sync_results['success_count'] += 1
-
-        except oracledb.Error as db_e:
-            # Erro específico do Oracle
-            oracle_conn.rollback()
-            
-            error_code = 'N/A'
-            error_message = str(db_e)
-            
-            # ➡️ TRATAMENTO DE ERRO ROBUSTO: Tenta extrair código e mensagem de forma segura
-            if db_e.args:
-                error_obj = db_e.args[0]
-                # Verifica se o objeto de erro tem os atributos esperados
-                if hasattr(error_obj, 'code'):
-                    error_code = error_obj.code
-                if hasattr(error_obj, 'message'):
-                    error_message = error_obj.message
-            
-            sync_results['error_count'] += 1
-            
-            # Imprime no log para ver imediatamente o erro do DB
-            print(f"❌ Erro DB Oracle REAL para SKU {sku}: {error_code} - {error_message}")
-            
-            # Registra no resultado
-            sync_results['errors'].append(f"Erro DB Oracle SKU {sku}: {error_code} - {error_message}")
-            
-        except Exception as e:
-            # Outros erros (ex: erro de tipo de dados)
-            oracle_conn.rollback()
-            sync_results['error_count'] += 1
-            
-            # 💡 Imprimir o traceback completo para diagnóstico
-            print(f"\n❌ ERRO GERAL CRÍTICO NO PRODUTO {sku} ❌")
-            traceback.print_exc()
-            
-            sync_results['errors'].append(f"Erro Geral SKU {sku}: {e}")
-
-    # 3. Fecha a conexão após processar todos os produtos
-    if oracle_conn:
+        product_datas.append(product_data)
+        skus.append(sku)
+
+    # 3. Lotes: MERGE + imagens, um commit por lote
+    batch_size = max(getattr(settings, 'ORACLE_SYNC_BATCH_SIZE', 200), 1)
+
+    try:
+        for start in range(0, len(product_datas), batch_size):
+            batch_products = product_datas[start:start + batch_size]
+            batch_skus = skus[start:start + batch_size]
+
+            try:
+                _sync_batch(oracle_conn, batch_products, batch_skus, cod_usuario, sync_results)
+
+            except oracledb.Error as db_e:
+                # Erro do lote inteiro (não de uma linha): nada do lote fica gravado
+                oracle_conn.rollback()
+                error_code, error_message = _oracle_error(db_e)
+                sync_results['error_count'] += len(batch_skus)
+                print(f"❌ Erro DB Oracle no lote ({len(batch_skus)} SKUs): {error_code} - {error_message}")
+                sync_results['errors'].append(
+                    f"Erro DB Oracle no lote {', '.join(batch_skus)}: {error_code} - {error_message}"
+                )
+                sync_results['skus'].update({sku: f"{error_code} - {error_message}" for sku in batch_skus})
+
+            except Exception as e:
+                # Outros erros (ex: erro de tipo de dados)
+                oracle_conn.rollback()
+                sync_results['error_count'] += len(batch_skus)
+                print(f"\n❌ ERRO GERAL CRÍTICO NO LOTE ({len(batch_skus)} SKUs) ❌")
+                traceback.print_exc()
+                sync_results['errors'].append(f"Erro Geral no lote {', '.join(batch_skus)}: {e}")
+                sync_results['skus'].update({sku: str(e) for sku in batch_skus})
+
+    finally:
+        # 4. Devolve a sessão ao pool após processar todos os produtos
         oracle_conn.close()
 
-    return sync_results
\ No newline at end of file
+    return sync_results
@@ -1,7 +1,7 @@
 from rest_framework import serializers
 from configurations.models import Configuration
 from sites.models import Site
-from products.models import Product, ProductImage
+from products.models import Product, ProductImage, ScrapeJob
 
 class ConfigurationSerializer(serializers.ModelSerializer):
     class Meta:
@@ -64,3 +64,15 @@ class ProductSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
         fields = '__all__'
+
+
+class ScrapeJobSerializer(serializers.ModelSerializer):
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+    requested_by = serializers.CharField(source='requested_by.username', read_only=True, default=None)
+    
+    class Meta:
+        model = ScrapeJob
+        fields = [
+            'id', 'query', 'parameters', 'status', 'status_display', 'requested_by',
+            'error', 'worker', 'attempts', 'created_at', 'started_at', 'finished_at'
+        ]
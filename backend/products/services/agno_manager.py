@@ -1,5 +1,6 @@
 from configurations.models import Configuration
 from products.services.agno_scraper import AgnoIntelligentScraper
+from products.services.query_index import record_query_run
 from sites.models import Site
 from typing import List, Dict, Any
 
@@ -32,6 +33,7 @@ class AgnoScrapingManager:
             try:
                 scraper = AgnoIntelligentScraper(site)
                 products = scraper.scrape_products(query, max_results)
+                record_query_run(site, query, [product.get('url') for product in products])
                 
                 results['sites_processed'] += 1
                 results['total_products'] += len(products)
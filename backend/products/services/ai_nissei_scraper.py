@@ -25,10 +25,55 @@ from selenium.common.exceptions import TimeoutException, WebDriverException
 from selenium.webdriver.common.action_chains import ActionChains
 
 from products.models import Product, ProductImage
+from products.services.image_store import release_main_image
+from products.services.magento_gallery import parse_magento_gallery
+from products.services.rate_limiter import get_rate_limiter, mount_rate_limiter
 from sites.models import Site
 from configurations.models import Configuration
 
 
+# Modos de extração do carrossel
+CAROUSEL_MODE_HARVEST = 'harvest'  # Lê todos os frames de uma vez (clique só como fallback)
+CAROUSEL_MODE_CLICK = 'click'  # Sempre navega clicando na seta "próximo"
+
+# Lê todos os frames do Fotorama em uma única execução (sem cliques)
+CAROUSEL_FRAMES_SCRIPT = """
+const results = [];
+const seen = new Set();
+const add = (src) => {
+    if (src && !src.startsWith('data:') && !seen.has(src)) {
+        results.push(src);
+        seen.add(src);
+    }
+};
+
+// 1. Estado JS da instância Fotorama (todos os frames, inclusive os não carregados)
+try {
+    const gallery = document.querySelector('[data-gallery-role="gallery"], .fotorama');
+    const fotorama = gallery && window.jQuery ? window.jQuery(gallery).data('fotorama') : null;
+    if (fotorama && fotorama.data) {
+        fotorama.data.forEach(item => {
+            if (item.type !== 'video') {
+                add(item.full || item.img || item.thumb);
+            }
+        });
+    }
+} catch (e) {}
+
+// 2. DOM do Fotorama: frames do palco (href = imagem grande) e miniaturas
+if (results.length === 0) {
+    document.querySelectorAll('.fotorama__stage__frame').forEach(frame => {
+        add(frame.getAttribute('href') || frame.getAttribute('data-full') || frame.getAttribute('data-img'));
+    });
+    document.querySelectorAll('.fotorama__nav__frame img, [data-gallery-role="nav-frame"] img').forEach(img => {
+        add(img.getAttribute('src'));
+    });
+}
+
+return results;
+"""
+
+
 class AISeleniumNisseiScraper:
     """
     Scraper refatorado - apenas o essencial que funciona
@@ -52,13 +97,20 @@ class AISeleniumNisseiScraper:
             'Cache-Control': 'no-cache',
         })
         
+        # Ritmo por host adaptativo (substitui as pausas fixas entre produtos/imagens)
+        self.rate_limiter = get_rate_limiter()
+        mount_rate_limiter(self.session, self.rate_limiter)
+        
         # Configurações simplificadas
-        self.delay_between_products = 2
         self.max_images_per_product = 8  # Aumentado para pegar mais imagens
         
-        # Configurar Selenium
+        # Carrossel: colheita sem cliques (padrão) ou navegação clicando
+        self.carousel_mode = getattr(settings, 'SELENIUM_CAROUSEL_MODE', CAROUSEL_MODE_HARVEST)
+        self.carousel_harvest_timeout = getattr(settings, 'SELENIUM_CAROUSEL_HARVEST_TIMEOUT', 10)
+        
+        # Selenium sob demanda: o Chrome só sobe quando uma página precisa ser renderizada
         self.driver = None
-        self.setup_selenium()
+        self._selenium_failed = False
         
         # Verificar se IA está disponível
         self.ai_available = self._check_ai_availability()
@@ -85,6 +137,13 @@ class AISeleniumNisseiScraper:
         print(f"IA configurada: {self.configuration.model_integration}")
         return True
     
+    def _ensure_driver(self) -> bool:
+        """Inicia o Chrome no primeiro uso (uma tentativa por scraper)"""
+        if self.driver is None and not self._selenium_failed:
+            self.setup_selenium()
+            self._selenium_failed = self.driver is None
+        return self.driver is not None
+    
     def setup_selenium(self):
         """Setup do Selenium - igual ao teste que funciona"""
         try:
@@ -179,11 +238,6 @@ class AISeleniumNisseiScraper:
                         print(f"{image_count} imagens baixadas")
                     else:
                         print("Falha ao processar produto")
-                    
-                    # Rate limiting
-                    if i < len(products_for_details):
-                        print(f"Aguardando {self.delay_between_products}s...")
-                        time.sleep(self.delay_between_products)
                         
                 except Exception as e:
                     print(f"Erro ao processar produto {i}: {str(e)}")
@@ -283,9 +337,13 @@ class AISeleniumNisseiScraper:
     
     def _extract_carousel_images_like_test(self, url: str) -> List[str]:
         """
-        MÉTODO PRINCIPAL: Extrai imagens exatamente como no teste que funciona
+        MÉTODO PRINCIPAL: Extrai imagens do carrossel
+        
+        Modo harvest: lê todos os frames de uma vez (estado do Fotorama ou
+        configuração da galeria). A navegação por cliques só roda se a
+        colheita não encontrar nada (ou no modo click).
         """
-        if not self.driver:
+        if not self._ensure_driver():
             print("❌ Selenium não disponível")
             return []
         
@@ -293,58 +351,111 @@ class AISeleniumNisseiScraper:
             print(f"🎠 Acessando página para extrair carrossel: {url}")
             
             # Acessar página
+            page_start = time.time()
+            self.rate_limiter.wait(url)  # Navegação do Chrome fora da sessão HTTP
             self.driver.get(url)
             
-            # Aguardar carregamento (igual ao teste)
             WebDriverWait(self.driver, 30).until(
                 EC.presence_of_element_located((By.TAG_NAME, "body"))
             )
-            time.sleep(5)  # Mesmo timing do teste
-            
-            all_images = []
-            
-            # PASSO 1: Aguardar carrossel carregar
-            print("⏳ Aguardando carrossel carregar...")
-            carousel_loaded = self._wait_for_carousel_loading()
-            if not carousel_loaded:
-                print("⚠️ Carrossel não detectado")
-                return []
-            
-            # PASSO 2: Capturar imagem inicial
-            print("📸 Capturando imagem inicial...")
-            initial_image = self._get_current_carousel_image()
-            if initial_image:
-                all_images.append(initial_image)
-                print(f"   ✅ Inicial: {initial_image[:60]}...")
-            
-            # PASSO 3: Encontrar botões de navegação
-            print("🔍 Procurando botões de navegação...")
-            next_buttons = self._find_next_buttons()
+            print(f"   ⏱️ Página carregada em {time.time() - page_start:.2f}s")
             
-            if not next_buttons:
-                print("   ⚠️ Nenhum botão encontrado")
-                return all_images
-            
-            print(f"   ✅ {len(next_buttons)} botão(ões) encontrado(s)")
-            
-            # PASSO 4: Navegar pelo carrossel (igual ao teste)
-            print("🔄 Navegando pelo carrossel...")
-            navigation_images = self._navigate_carousel_unlimited(next_buttons[0])
-            
-            # Adicionar imagens únicas
-            for img in navigation_images:
-                if img and img not in all_images:
-                    all_images.append(img)
+            if self.carousel_mode == CAROUSEL_MODE_HARVEST:
+                harvest_start = time.time()
+                harvested = self._harvest_carousel_frames()
+                print(f"⚡ Colheita sem cliques: {len(harvested)} imagens em {time.time() - harvest_start:.2f}s")
+                
+                if harvested:
+                    final_images = harvested[:self.max_images_per_product]
+                    print(f"🎯 RESULTADO: {len(final_images)} imagens extraídas")
+                    return final_images
+                
+                print("⚠️ Colheita vazia, usando navegação por cliques")
             
-            # Limitar resultado
-            final_images = all_images[:self.max_images_per_product]
-            print(f"🎯 RESULTADO: {len(final_images)} imagens extraídas")
+            click_start = time.time()
+            final_images = self._extract_carousel_by_clicking()
+            print(f"🖱️ Navegação por cliques: {len(final_images)} imagens em {time.time() - click_start:.2f}s")
             
             return final_images
             
         except Exception as e:
             print(f"❌ Erro na extração do carrossel: {e}")
             return []
+    
+    def _harvest_carousel_frames(self) -> List[str]:
+        """
+        Lê todos os frames do carrossel sem clicar
+        
+        1. Estado/DOM do Fotorama (CAROUSEL_FRAMES_SCRIPT, repetido até o
+           JS da galeria inicializar ou carousel_harvest_timeout)
+        2. Configuração mage/gallery/gallery do HTML da página
+        """
+        try:
+            raw_urls = WebDriverWait(self.driver, self.carousel_harvest_timeout, poll_frequency=0.25).until(
+                lambda driver: driver.execute_script(CAROUSEL_FRAMES_SCRIPT) or False
+            )
+            print(f"   ✅ Frames lidos do Fotorama: {len(raw_urls)}")
+        except TimeoutException:
+            raw_urls = []
+        
+        if not raw_urls:
+            gallery = parse_magento_gallery(BeautifulSoup(self.driver.page_source, 'html.parser'), self.base_url)
+            if gallery is not None:
+                raw_urls = gallery.urls()
+                print(f"   ✅ Frames lidos da configuração da galeria: {len(raw_urls)}")
+        
+        images = []
+        for raw_url in raw_urls:
+            image_url = self._resolve_image_url(raw_url)
+            if self._is_valid_product_image_url(image_url) and image_url not in images:
+                images.append(image_url)
+        
+        return images
+    
+    def _extract_carousel_by_clicking(self) -> List[str]:
+        """Fallback: navega pelo carrossel clicando na seta (igual ao teste)"""
+        time.sleep(5)  # Mesmo timing do teste
+        
+        all_images = []
+        
+        # PASSO 1: Aguardar carrossel carregar
+        print("⏳ Aguardando carrossel carregar...")
+        carousel_loaded = self._wait_for_carousel_loading()
+        if not carousel_loaded:
+            print("⚠️ Carrossel não detectado")
+            return []
+        
+        # PASSO 2: Capturar imagem inicial
+        print("📸 Capturando imagem inicial...")
+        initial_image = self._get_current_carousel_image()
+        if initial_image:
+            all_images.append(initial_image)
+            print(f"   ✅ Inicial: {initial_image[:60]}...")
+        
+        # PASSO 3: Encontrar botões de navegação
+        print("🔍 Procurando botões de navegação...")
+        next_buttons = self._find_next_buttons()
+        
+        if not next_buttons:
+            print("   ⚠️ Nenhum botão encontrado")
+            return all_images
+        
+        print(f"   ✅ {len(next_buttons)} botão(ões) encontrado(s)")
+        
+        # PASSO 4: Navegar pelo carrossel (igual ao teste)
+        print("🔄 Navegando pelo carrossel...")
+        navigation_images = self._navigate_carousel_unlimited(next_buttons[0])
+        
+        # Adicionar imagens únicas
+        for img in navigation_images:
+            if img and img not in all_images:
+                all_images.append(img)
+        
+        # Limitar resultado
+        final_images = all_images[:self.max_images_per_product]
+        print(f"🎯 RESULTADO: {len(final_images)} imagens extraídas")
+        
+        return final_images
 
     # ===== MÉTODOS DO CARROSSEL (COPIADOS DO TESTE) =====
     
@@ -717,7 +828,7 @@ class AISeleniumNisseiScraper:
             try:
                 print(f"  📸 Baixando {i+1}/{len(image_urls)}: {img_url[:60]}...")
                 
-                response = requests.get(
+                response = self.session.get(
                     img_url, 
                     timeout=30, 
                     stream=True, 
@@ -762,8 +873,6 @@ class AISeleniumNisseiScraper:
                 
                 downloaded_count += 1
                 print(f"    ✅ Processada: {processed_image['width']}x{processed_image['height']}")
-                
-                time.sleep(0.5)  # Rate limiting
                     
             except Exception as e:
                 print(f"    ❌ Erro: {str(e)}")
@@ -889,8 +998,9 @@ class AISeleniumNisseiScraper:
             # Verificar campos do modelo
             model_fields = [field.name for field in ProductImage._meta.get_fields()]
             
-            # Remover imagens antigas
+            # Remover imagens antigas (ref_count do image store: post_delete)
             ProductImage.objects.filter(product=product).delete()
+            release_main_image(product)
             
             saved_count = 0
             
@@ -0,0 +1,184 @@
+# products/services/ai_probe.py
+
+"""
+Health check leve das configurações de IA (sem navegador, sem scraper)
+
+- Um prompt mínimo (max_tokens pequeno, timeout curto) direto na API do
+  provedor (OpenAI ou Anthropic)
+- Resultado com latência, status HTTP e erro legível
+- Cache em memória por configuração + token/modelo: checar a mesma
+  configuração de novo não chama a API até o cache expirar
+  (AI_PROBE_CACHE_SECONDS para sucesso, AI_PROBE_FAILURE_CACHE_SECONDS
+  para falha)
+"""
+
+import hashlib
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Optional, Tuple
+
+import requests
+from django.conf import settings
+from django.utils import timezone
+
+from configurations.models import Configuration
+
+
+PROVIDER_OPENAI = 'openai'
+PROVIDER_ANTHROPIC = 'anthropic'
+
+PROBE_PROMPT = 'Responda apenas com: {"status": "ok", "test": true}'
+PROBE_MAX_TOKENS = 20
+
+
+@dataclass
+class AIProbeResult:
+    ok: bool
+    provider: Optional[str]
+    model: Optional[str]
+    latency_ms: float = 0.0
+    status_code: Optional[int] = None
+    response: str = ''
+    error: Optional[str] = None
+    checked_at: str = ''
+    cached: bool = False
+
+    def as_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def resolve_provider(configuration: Configuration) -> Optional[str]:
+    """Provedor da configuração (None se não suportado)"""
+    model_type = (configuration.model_integration or '').lower()
+    if 'openai' in model_type or 'gpt' in model_type:
+        return PROVIDER_OPENAI
+    if 'claude' in model_type or 'anthropic' in model_type:
+        return PROVIDER_ANTHROPIC
+    return None
+
+
+def _request_for(provider: str, configuration: Configuration) -> Tuple[str, Dict[str, str], Dict[str, Any], str]:
+    """(url, headers, payload, modelo) da chamada mínima ao provedor"""
+    params = configuration.parameters or {}
+
+    if provider == PROVIDER_OPENAI:
+        model = params.get('model', 'gpt-3.5-turbo')
+        return (
+            'https://api.openai.com/v1/chat/completions',
+            {'Content-Type': 'application/json', 'Authorization': f'Bearer {configuration.token}'},
+            {'model': model, 'max_tokens': PROBE_MAX_TOKENS, 'messages': [{'role': 'user', 'content': PROBE_PROMPT}]},
+            model,
+        )
+
+    model = params.get('model', 'claude-3-sonnet-20240229')
+    return (
+        'https://api.anthropic.com/v1/messages',
+        {'Content-Type': 'application/json', 'x-api-key': configuration.token, 'anthropic-version': '2023-06-01'},
+        {'model': model, 'max_tokens': PROBE_MAX_TOKENS, 'messages': [{'role': 'user', 'content': PROBE_PROMPT}]},
+        model,
+    )
+
+
+def _response_text(provider: str, data: Dict[str, Any]) -> str:
+    if provider == PROVIDER_OPENAI:
+        return data['choices'][0]['message']['content']
+    return data['content'][0]['text']
+
+
+def _error_message(response: requests.Response) -> str:
+    try:
+        error = response.json().get('error')
+    except ValueError:
+        error = None
+    if isinstance(error, dict):
+        error = error.get('message')
+    return f"HTTP {response.status_code}: {error or response.text[:200]}"
+
+
+def _run_probe(configuration: Configuration) -> AIProbeResult:
+    provider = resolve_provider(configuration)
+    checked_at = timezone.now().isoformat()
+
+    if provider is None:
+        return AIProbeResult(
+            ok=False, provider=None, model=None, checked_at=checked_at,
+            error=f"Modelo não suportado: {configuration.model_integration}"
+        )
+    if not configuration.token:
+        return AIProbeResult(ok=False, provider=provider, model=None, checked_at=checked_at, error='Token não definido')
+
+    url, headers, payload, model = _request_for(provider, configuration)
+    start = time.time()
+
+    try:
+        response = requests.post(url, headers=headers, json=payload, timeout=getattr(settings, 'AI_PROBE_TIMEOUT', 10))
+    except requests.RequestException as e:
+        return AIProbeResult(
+            ok=False, provider=provider, model=model, checked_at=checked_at,
+            latency_ms=round((time.time() - start) * 1000, 1), error=f"Erro de conexão: {e}"
+        )
+
+    result = AIProbeResult(
+        ok=response.status_code == 200,
+        provider=provider,
+        model=model,
+        latency_ms=round((time.time() - start) * 1000, 1),
+        status_code=response.status_code,
+        checked_at=checked_at,
+    )
+
+    if result.ok:
+        try:
+            result.response = _response_text(provider, response.json())
+        except (ValueError, KeyError, IndexError, TypeError) as e:
+            result.ok = False
+            result.error = f"Resposta inesperada do provedor: {e}"
+    else:
+        result.error = _error_message(response)
+
+    return result
+
+
+_cache: Dict[Tuple[int, str], Tuple[float, AIProbeResult]] = {}
+_cache_lock = threading.Lock()
+
+
+def _cache_key(configuration: Configuration) -> Tuple[int, str]:
+    # Trocar token, modelo ou parâmetros invalida o resultado guardado
+    params_model = (configuration.parameters or {}).get('model', '')
+    fingerprint = f"{configuration.model_integration}|{params_model}|{configuration.token or ''}"
+    return configuration.id, hashlib.sha256(fingerprint.encode('utf-8')).hexdigest()
+
+
+def probe_ai_configuration(configuration: Configuration, use_cache: bool = True) -> AIProbeResult:
+    """
+    Testa a configuração com uma chamada mínima ao provedor
+
+    Args:
+        use_cache: False força uma chamada nova (o resultado ainda vai para o cache)
+    """
+    key = _cache_key(configuration)
+    now = time.time()
+
+    if use_cache:
+        with _cache_lock:
+            cached = _cache.get(key)
+        if cached and cached[0] > now:
+            return AIProbeResult(**{**cached[1].as_dict(), 'cached': True})
+
+    result = _run_probe(configuration)
+
+    ttl = (
+        getattr(settings, 'AI_PROBE_CACHE_SECONDS', 300) if result.ok
+        else getattr(settings, 'AI_PROBE_FAILURE_CACHE_SECONDS', 30)
+    )
+    with _cache_lock:
+        _cache[key] = (now + ttl, result)
+
+    return result
+
+
+def clear_probe_cache():
+    with _cache_lock:
+        _cache.clear()
@@ -0,0 +1,291 @@
+# products/services/browser_pool.py
+
+"""
+Pool de navegadores Playwright compartilhado pelo processo
+
+- Mantém N instâncias de Chromium "quentes" (sem custo de startup por produto)
+- Cada instância vive em uma thread dedicada (a API sync do Playwright
+  não pode ser usada fora da thread que a criou)
+- Contexto reaproveitado, página nova por empréstimo
+- Health check antes de cada empréstimo (browser conectado)
+- Reciclagem após N páginas ou quando o heap JS passa do teto configurado
+"""
+
+import atexit
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from django.conf import settings
+from playwright.sync_api import Error as PlaywrightError
+from playwright.sync_api import Page, sync_playwright
+
+
+LAUNCH_ARGS = [
+    '--disable-blink-features=AutomationControlled',
+    '--disable-dev-shm-usage',
+    '--no-sandbox'
+]
+
+CONTEXT_OPTIONS = {
+    'viewport': {'width': 1920, 'height': 1080},
+    'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+}
+
+
+def log(message: str):
+    """Log com timestamp (mesmo formato do NisseiExtractorV2)"""
+    ts = datetime.now().strftime('%H:%M:%S.%f')[:-3]
+    print(f'[{ts}] {message}')
+
+
+class BrowserSlot:
+    """
+    Uma instância de Chromium presa a uma thread dedicada.
+    Todos os métodos com prefixo _ rodam SOMENTE na thread do slot.
+    """
+
+    def __init__(self, slot_id: int, max_pages: int, max_heap_bytes: int):
+        self.slot_id = slot_id
+        self.max_pages = max_pages
+        self.max_heap_bytes = max_heap_bytes
+        self.executor = ThreadPoolExecutor(
+            max_workers=1,
+            thread_name_prefix=f'browser-slot-{slot_id}'
+        )
+
+        self._playwright = None
+        self._browser = None
+        self._context = None
+        self._recycle_requested = False
+
+        # Métricas
+        self.launches = 0
+        self.pages_served = 0
+        self.pages_since_launch = 0
+        self.failures = 0
+        self.last_heap_bytes = 0
+
+    # ------------------------------------------------------------------
+    # Ciclo de vida do browser (thread do slot)
+    # ------------------------------------------------------------------
+
+    def _is_healthy(self) -> bool:
+        try:
+            return self._browser is not None and self._browser.is_connected()
+        except Exception:
+            return False
+
+    def _ensure_browser(self):
+        """Health check: relança o Chromium se caiu ou se foi marcado para reciclagem"""
+        if self._recycle_requested or not self._is_healthy():
+            self._shutdown_browser()
+
+        if self._browser is not None:
+            return
+
+        if self._playwright is None:
+            self._playwright = sync_playwright().start()
+
+        started = time.time()
+        self._browser = self._playwright.chromium.launch(headless=True, args=LAUNCH_ARGS)
+        self._context = self._browser.new_context(**CONTEXT_OPTIONS)
+        self._recycle_requested = False
+        self.pages_since_launch = 0
+        self.launches += 1
+        log(f"      🧊→🔥 Browser #{self.slot_id} iniciado em {time.time() - started:.2f}s")
+
+    def _shutdown_browser(self):
+        for resource in (self._context, self._browser):
+            if resource is None:
+                continue
+            try:
+                resource.close()
+            except Exception:
+                pass
+        self._context = None
+        self._browser = None
+
+    def _shutdown(self):
+        self._shutdown_browser()
+        if self._playwright is not None:
+            try:
+                self._playwright.stop()
+            except Exception:
+                pass
+            self._playwright = None
+
+    def _measure_heap(self, page: Page) -> int:
+        """Lê o heap JS da página via CDP (0 se indisponível)"""
+        try:
+            cdp = self._context.new_cdp_session(page)
+            cdp.send('Performance.enable')
+            metrics = cdp.send('Performance.getMetrics').get('metrics', [])
+            cdp.detach()
+            for metric in metrics:
+                if metric.get('name') == 'JSHeapTotalSize':
+                    return int(metric.get('value', 0))
+        except Exception:
+            pass
+        return 0
+
+    def _lease(self, fn: Callable[[Page], Any]) -> Any:
+        """Empresta uma página nova do contexto quente e executa fn(page)"""
+        self._ensure_browser()
+
+        page = self._context.new_page()
+        try:
+            return fn(page)
+        except PlaywrightError:
+            self.failures += 1
+            # Browser morto no meio do empréstimo: força relançamento no próximo
+            if not self._is_healthy():
+                self._recycle_requested = True
+            raise
+        finally:
+            self.pages_served += 1
+            self.pages_since_launch += 1
+
+            if self.max_heap_bytes:
+                self.last_heap_bytes = self._measure_heap(page)
+                if self.last_heap_bytes > self.max_heap_bytes:
+                    log(f"      ♻️  Browser #{self.slot_id} acima do teto de memória "
+                        f"({self.last_heap_bytes // (1024 * 1024)}MB), reciclando")
+                    self._recycle_requested = True
+
+            try:
+                page.close()
+            except Exception:
+                pass
+
+            if self.max_pages and self.pages_since_launch >= self.max_pages:
+                log(f"      ♻️  Browser #{self.slot_id} atingiu {self.pages_since_launch} páginas, reciclando")
+                self._recycle_requested = True
+
+    # ------------------------------------------------------------------
+    # API usada pelo pool (qualquer thread)
+    # ------------------------------------------------------------------
+
+    def submit(self, fn: Callable[[Page], Any]):
+        return self.executor.submit(self._lease, fn)
+
+    def warm_up(self):
+        return self.executor.submit(self._ensure_browser)
+
+    def close(self):
+        try:
+            self.executor.submit(self._shutdown).result(timeout=30)
+        except Exception:
+            pass
+        self.executor.shutdown(wait=False)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'slot': self.slot_id,
+            'launches': self.launches,
+            'pages_served': self.pages_served,
+            'pages_since_launch': self.pages_since_launch,
+            'failures': self.failures,
+            'last_heap_mb': round(self.last_heap_bytes / (1024 * 1024), 1),
+        }
+
+
+class BrowserPool:
+    """
+    Pool de browsers do processo.
+
+    Uso:
+        pool = get_browser_pool()
+        urls = pool.run(lambda page: coletar(page, url))
+    """
+
+    def __init__(
+        self,
+        size: int = 2,
+        max_pages_per_browser: int = 50,
+        max_heap_mb: int = 512,
+        acquire_timeout: int = 60
+    ):
+        self.size = max(size, 1)
+        self.acquire_timeout = acquire_timeout
+        self._slots: List[BrowserSlot] = [
+            BrowserSlot(i + 1, max_pages_per_browser, max_heap_mb * 1024 * 1024)
+            for i in range(self.size)
+        ]
+        self._available: "queue.Queue[BrowserSlot]" = queue.Queue()
+        for slot in self._slots:
+            self._available.put(slot)
+
+        self._closed = False
+        self._stats_lock = threading.Lock()
+        self.leases = 0
+        self.wait_time_total = 0.0
+
+    def run(self, fn: Callable[[Page], Any], timeout: Optional[float] = None) -> Any:
+        """
+        Empresta uma página de um browser livre e executa fn(page) na thread do browser.
+        Bloqueia até um slot ficar livre (acquire_timeout).
+        """
+        if self._closed:
+            raise RuntimeError("BrowserPool já foi encerrado")
+
+        wait_start = time.time()
+        try:
+            slot = self._available.get(timeout=self.acquire_timeout)
+        except queue.Empty:
+            raise TimeoutError(f"Nenhum browser livre em {self.acquire_timeout}s")
+        with self._stats_lock:
+            self.wait_time_total += time.time() - wait_start
+            self.leases += 1
+
+        try:
+            return slot.submit(fn).result(timeout=timeout)
+        finally:
+            self._available.put(slot)
+
+    def warm_up(self):
+        """Inicia todos os browsers antecipadamente"""
+        for future in [slot.warm_up() for slot in self._slots]:
+            try:
+                future.result(timeout=60)
+            except Exception as e:
+                log(f"⚠️  Falha ao aquecer browser: {e}")
+
+    def close(self):
+        self._closed = True
+        for slot in self._slots:
+            slot.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'size': self.size,
+            'available': self._available.qsize(),
+            'leases': self.leases,
+            'avg_wait_ms': round(self.wait_time_total * 1000 / self.leases, 1) if self.leases else 0,
+            'browsers': [slot.stats() for slot in self._slots],
+        }
+
+
+_pool: Optional[BrowserPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_browser_pool() -> BrowserPool:
+    """Retorna o pool do processo (criado sob demanda com as configurações do settings.py)"""
+    global _pool
+
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = BrowserPool(
+                    size=getattr(settings, 'BROWSER_POOL_SIZE', 2),
+                    max_pages_per_browser=getattr(settings, 'BROWSER_POOL_MAX_PAGES', 50),
+                    max_heap_mb=getattr(settings, 'BROWSER_POOL_MAX_HEAP_MB', 512),
+                    acquire_timeout=getattr(settings, 'BROWSER_POOL_ACQUIRE_TIMEOUT', 60),
+                )
+                atexit.register(_pool.close)
+
+    return _pool
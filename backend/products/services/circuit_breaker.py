@@ -0,0 +1,397 @@
+# products/services/circuit_breaker.py
+
+"""
+Circuit breaker por host e classe de endpoint + orçamento global de retentativas
+
+Quando o nissei.com ou o CDN degradam, cada produto esperava o timeout
+inteiro (15-30s) da página, das imagens e do goto do Playwright. Com o
+circuito por (host, classe):
+
+- closed: requisições normais; falhas consecutivas (timeout, erro de
+  conexão, 429/5xx) acima de CIRCUIT_FAILURE_THRESHOLD abrem o circuito
+- open: falha imediata com CircuitOpenError, sem tocar a rede, durante
+  CIRCUIT_OPEN_SECONDS
+- half_open: passado esse tempo, até CIRCUIT_HALF_OPEN_PROBES requisições
+  de teste passam; sucesso fecha o circuito e o trabalho volta sozinho,
+  falha reabre com o tempo dobrado (até CIRCUIT_OPEN_MAX_SECONDS)
+
+Classes de endpoint: páginas (HTML), imagens e render (Playwright). O CDN
+de imagens pode cair sem derrubar as páginas e vice-versa.
+
+RetryBudget limita as retentativas do processo a uma fração das
+requisições recentes: com o site fora do ar, as retentativas não
+multiplicam a carga nem o tempo de espera.
+
+O estado fica na memória de cada processo: a view, cada worker do
+run_scrape_workers e o drenador do outbox abrem e fecham seus próprios
+circuitos, e stats() mostra só os do processo que respondeu.
+"""
+
+import os
+import socket
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+import requests
+from django.conf import settings
+
+
+ENDPOINT_PAGE = 'page'
+ENDPOINT_IMAGE = 'image'
+ENDPOINT_RENDER = 'render'
+
+STATE_CLOSED = 'closed'
+STATE_OPEN = 'open'
+STATE_HALF_OPEN = 'half_open'
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.gif', '.avif', '.svg')
+
+# Status que indicam host degradado (404 e afins são respostas saudáveis)
+FAILURE_STATUSES = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """
+    Circuito aberto: a requisição nem foi enviada
+
+    Herda de requests.ConnectionError para cair nos mesmos
+    `except requests.RequestException` dos scrapers.
+    """
+
+    def __init__(self, host: str, endpoint: str, retry_in: float):
+        self.host = host
+        self.endpoint = endpoint
+        self.retry_in = retry_in
+        super().__init__(f"Circuito aberto para {host} ({endpoint}), nova tentativa em {retry_in:.0f}s")
+
+
+def classify_endpoint(url: str) -> str:
+    """Classe do endpoint pela URL (imagens pela extensão ou pelo caminho de mídia)"""
+    path = urlparse(url).path.lower()
+    if path.endswith(IMAGE_EXTENSIONS) or '/media/catalog/' in path:
+        return ENDPOINT_IMAGE
+    return ENDPOINT_PAGE
+
+
+def host_of(url: str) -> str:
+    return urlparse(url).netloc or url
+
+
+def is_failure_status(status_code: Optional[int]) -> bool:
+    return status_code in FAILURE_STATUSES
+
+
+class CircuitBreaker:
+    """Estado de um (host, classe de endpoint)"""
+
+    def __init__(self, failure_threshold: int = 5, open_seconds: float = 30.0, open_max_seconds: float = 300.0, half_open_probes: int = 1):
+        self.failure_threshold = max(failure_threshold, 1)
+        self.base_open_seconds = open_seconds
+        self.open_max_seconds = max(open_max_seconds, open_seconds)
+        self.half_open_probes = max(half_open_probes, 1)
+
+        self.state = STATE_CLOSED
+        self.consecutive_failures = 0
+        self.open_seconds = open_seconds
+        self.opened_at = 0.0  # monotonic
+        self.probes_in_flight = 0
+        self._lock = threading.Lock()
+
+        # Métricas
+        self.successes = 0
+        self.failures = 0
+        self.rejected = 0
+        self.times_opened = 0
+        self.last_error: Optional[str] = None
+
+    def _retry_in(self) -> float:
+        return max(self.opened_at + self.open_seconds - time.monotonic(), 0.0)
+
+    def allow(self) -> Tuple[bool, float]:
+        """
+        Reserva a passagem de uma requisição
+
+        Returns:
+            (permitida, segundos até a próxima tentativa se recusada)
+        """
+        with self._lock:
+            if self.state == STATE_OPEN:
+                retry_in = self._retry_in()
+                if retry_in > 0:
+                    self.rejected += 1
+                    return False, retry_in
+                self.state = STATE_HALF_OPEN
+                self.probes_in_flight = 0
+
+            if self.state == STATE_HALF_OPEN:
+                if self.probes_in_flight >= self.half_open_probes:
+                    self.rejected += 1
+                    return False, 1.0
+                self.probes_in_flight += 1
+
+            return True, 0.0
+
+    def _open(self):
+        self.state = STATE_OPEN
+        self.opened_at = time.monotonic()
+        self.probes_in_flight = 0
+        self.times_opened += 1
+
+    def record_success(self):
+        with self._lock:
+            self.successes += 1
+            self.consecutive_failures = 0
+            if self.state != STATE_CLOSED:
+                self.state = STATE_CLOSED
+                self.open_seconds = self.base_open_seconds
+                self.probes_in_flight = 0
+
+    def record_failure(self, error: Optional[str] = None):
+        with self._lock:
+            self.failures += 1
+            self.consecutive_failures += 1
+            self.last_error = error
+
+            if self.state == STATE_HALF_OPEN:
+                # Teste falhou: reabre por mais tempo
+                self.open_seconds = min(self.open_seconds * 2, self.open_max_seconds)
+                self._open()
+            elif self.state == STATE_CLOSED and self.consecutive_failures >= self.failure_threshold:
+                self._open()
+
+    def release_probe(self):
+        """Requisição reservada que terminou sem resultado de saúde (ex.: cancelada)"""
+        with self._lock:
+            if self.state == STATE_HALF_OPEN and self.probes_in_flight:
+                self.probes_in_flight -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            state = self.state
+            if state == STATE_OPEN and self._retry_in() <= 0:
+                state = STATE_HALF_OPEN  # Próxima requisição já é um teste
+            return {
+                'state': state,
+                'consecutive_failures': self.consecutive_failures,
+                'retry_in_seconds': round(self._retry_in(), 1) if self.state == STATE_OPEN else 0.0,
+                'open_seconds': self.open_seconds,
+                'successes': self.successes,
+                'failures': self.failures,
+                'rejected': self.rejected,
+                'times_opened': self.times_opened,
+                'last_error': self.last_error,
+            }
+
+
+class RetryBudget:
+    """
+    Retentativas permitidas = min_retries + ratio × requisições na janela
+
+    Cada requisição nova conta em record_request(); cada retentativa pede
+    licença em try_retry() e é recusada quando o orçamento acabou.
+    """
+
+    def __init__(self, ratio: float = 0.2, min_retries: int = 10, window_seconds: float = 10.0):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window_seconds = window_seconds
+        self._requests: Deque[float] = deque()
+        self._retries: Deque[float] = deque()
+        self._lock = threading.Lock()
+
+        # Métricas
+        self.allowed = 0
+        self.denied = 0
+
+    def _trim(self, now: float):
+        cutoff = now - self.window_seconds
+        for events in (self._requests, self._retries):
+            while events and events[0] < cutoff:
+                events.popleft()
+
+    def record_request(self):
+        with self._lock:
+            now = time.monotonic()
+            self._trim(now)
+            self._requests.append(now)
+
+    def try_retry(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            self._trim(now)
+            if len(self._retries) >= self.min_retries + self.ratio * len(self._requests):
+                self.denied += 1
+                return False
+            self._retries.append(now)
+            self.allowed += 1
+            return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._trim(time.monotonic())
+            available = self.min_retries + self.ratio * len(self._requests) - len(self._retries)
+            return {
+                'ratio': self.ratio,
+                'min_retries': self.min_retries,
+                'window_seconds': self.window_seconds,
+                'requests_in_window': len(self._requests),
+                'retries_in_window': len(self._retries),
+                'available': max(int(available), 0),
+                'allowed': self.allowed,
+                'denied': self.denied,
+            }
+
+
+class CircuitBreakerRegistry:
+    """
+    Um CircuitBreaker por (host, classe de endpoint) + o RetryBudget do processo
+
+    Uso:
+        breakers = get_circuit_breakers()
+        with breakers.guard(url, ENDPOINT_RENDER) as call:
+            ...  # levanta CircuitOpenError se o circuito está aberto
+            call.failure('timeout')  # ou call.success(); exceção conta como falha
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        open_seconds: float = 30.0,
+        open_max_seconds: float = 300.0,
+        half_open_probes: int = 1,
+        retry_budget: Optional[RetryBudget] = None,
+        enabled: bool = True
+    ):
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.open_max_seconds = open_max_seconds
+        self.half_open_probes = half_open_probes
+        self.retry_budget = retry_budget or RetryBudget()
+        self.enabled = enabled
+        self._breakers: Dict[Tuple[str, str], CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def breaker_for(self, url: str, endpoint: Optional[str] = None) -> CircuitBreaker:
+        key = (host_of(url), endpoint or classify_endpoint(url))
+        with self._lock:
+            breaker = self._breakers.get(key)
+            if breaker is None:
+                breaker = CircuitBreaker(
+                    failure_threshold=self.failure_threshold,
+                    open_seconds=self.open_seconds,
+                    open_max_seconds=self.open_max_seconds,
+                    half_open_probes=self.half_open_probes,
+                )
+                self._breakers[key] = breaker
+            return breaker
+
+    def before_request(self, url: str, endpoint: Optional[str] = None):
+        """Levanta CircuitOpenError se o circuito não deixa a requisição passar"""
+        if not self.enabled:
+            return
+        endpoint = endpoint or classify_endpoint(url)
+        allowed, retry_in = self.breaker_for(url, endpoint).allow()
+        if not allowed:
+            raise CircuitOpenError(host_of(url), endpoint, retry_in)
+        self.retry_budget.record_request()
+
+    def record(self, url: str, endpoint: Optional[str] = None, status_code: Optional[int] = None, error: Optional[str] = None):
+        """Resultado da requisição: erro ou status de falha contam contra o host"""
+        if not self.enabled:
+            return
+        breaker = self.breaker_for(url, endpoint)
+        if error is not None or is_failure_status(status_code):
+            breaker.record_failure(error or f"HTTP {status_code}")
+        else:
+            breaker.record_success()
+
+    def try_retry(self) -> bool:
+        return not self.enabled or self.retry_budget.try_retry()
+
+    @contextmanager
+    def guard(self, url: str, endpoint: Optional[str] = None):
+        endpoint = endpoint or classify_endpoint(url)
+        self.before_request(url, endpoint)
+        call = _GuardedCall(self, url, endpoint)
+        try:
+            yield call
+        except Exception as e:
+            if not call.recorded:
+                call.failure(f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            if not call.recorded and self.enabled:
+                self.breaker_for(url, endpoint).release_probe()
+
+    def reset(self, host: Optional[str] = None):
+        """Esquece os circuitos (de um host ou todos)"""
+        with self._lock:
+            for key in list(self._breakers):
+                if host is None or key[0] == host:
+                    del self._breakers[key]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            breakers = dict(self._breakers)
+
+        hosts: Dict[str, Dict[str, Any]] = {}
+        for (host, endpoint), breaker in sorted(breakers.items()):
+            hosts.setdefault(host, {})[endpoint] = breaker.stats()
+
+        return {
+            'scope': 'process',  # Outros processos (workers, outbox) têm circuitos próprios
+            'process': f"{socket.gethostname()}:{os.getpid()}",
+            'enabled': self.enabled,
+            'failure_threshold': self.failure_threshold,
+            'open_seconds': self.open_seconds,
+            'open_max_seconds': self.open_max_seconds,
+            'half_open_probes': self.half_open_probes,
+            'hosts': hosts,
+            'retry_budget': self.retry_budget.stats(),
+        }
+
+
+class _GuardedCall:
+    def __init__(self, registry: CircuitBreakerRegistry, url: str, endpoint: str):
+        self.registry = registry
+        self.url = url
+        self.endpoint = endpoint
+        self.recorded = False
+
+    def success(self, status_code: Optional[int] = None):
+        self.recorded = True
+        self.registry.record(self.url, self.endpoint, status_code=status_code)
+
+    def failure(self, error: str):
+        self.recorded = True
+        self.registry.record(self.url, self.endpoint, error=error)
+
+
+_registry: Optional[CircuitBreakerRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_circuit_breakers() -> CircuitBreakerRegistry:
+    """Circuit breakers do processo (compartilhados por scrapers, imagens e Playwright)"""
+    global _registry
+
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = CircuitBreakerRegistry(
+                    failure_threshold=getattr(settings, 'CIRCUIT_FAILURE_THRESHOLD', 5),
+                    open_seconds=getattr(settings, 'CIRCUIT_OPEN_SECONDS', 30),
+                    open_max_seconds=getattr(settings, 'CIRCUIT_OPEN_MAX_SECONDS', 300),
+                    half_open_probes=getattr(settings, 'CIRCUIT_HALF_OPEN_PROBES', 1),
+                    retry_budget=RetryBudget(
+                        ratio=getattr(settings, 'RETRY_BUDGET_RATIO', 0.2),
+                        min_retries=getattr(settings, 'RETRY_BUDGET_MIN_RETRIES', 10),
+                        window_seconds=getattr(settings, 'RETRY_BUDGET_WINDOW_SECONDS', 10),
+                    ),
+                    enabled=getattr(settings, 'CIRCUIT_BREAKER_ENABLED', True),
+                )
+    return _registry
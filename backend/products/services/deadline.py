@@ -0,0 +1,80 @@
+# products/services/deadline.py
+
+"""
+Prazo total de uma busca (timeout_ms do request)
+
+Um Deadline é criado no início da busca e passado para todas as fases
+(listagem, detalhes, render, imagens). Cada fase:
+
+- usa deadline.timeout(padrão) no lugar do timeout fixo da requisição,
+  então nenhuma espera passa do prazo
+- consulta deadline.expired antes de começar trabalho novo e pula o que
+  não cabe mais (o produto fica marcado como incompleto)
+
+Sem timeout_ms o Deadline é ilimitado e tudo funciona como antes.
+"""
+
+import time
+from typing import Any, Dict, Optional
+
+
+MIN_REQUEST_TIMEOUT = 0.5  # Segundos; requisição com menos que isso nem é enviada
+
+
+class DeadlineExceeded(Exception):
+    """O prazo da busca acabou antes da etapa começar"""
+
+    def __init__(self, stage: str):
+        self.stage = stage
+        super().__init__(f"Prazo da busca esgotado antes de: {stage}")
+
+
+class Deadline:
+    def __init__(self, timeout_seconds: Optional[float] = None):
+        self.timeout_seconds = timeout_seconds
+        self.started_at = time.monotonic()
+        self.expires_at = self.started_at + timeout_seconds if timeout_seconds is not None else None
+
+    @classmethod
+    def from_ms(cls, timeout_ms: Optional[int]) -> 'Deadline':
+        return cls(timeout_ms / 1000 if timeout_ms else None)
+
+    @property
+    def limited(self) -> bool:
+        return self.expires_at is not None
+
+    def remaining(self) -> Optional[float]:
+        """Segundos restantes (None = sem prazo)"""
+        if self.expires_at is None:
+            return None
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    @property
+    def expired(self) -> bool:
+        remaining = self.remaining()
+        return remaining is not None and remaining < MIN_REQUEST_TIMEOUT
+
+    def timeout(self, default: float) -> float:
+        """Timeout de uma requisição: o padrão, limitado ao que resta do prazo"""
+        remaining = self.remaining()
+        if remaining is None:
+            return default
+        return max(min(default, remaining), MIN_REQUEST_TIMEOUT)
+
+    def check(self, stage: str):
+        """Levanta DeadlineExceeded se não há mais tempo para a etapa"""
+        if self.expired:
+            raise DeadlineExceeded(stage)
+
+    def elapsed_ms(self) -> int:
+        return int((time.monotonic() - self.started_at) * 1000)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'timeout_ms': int(self.timeout_seconds * 1000) if self.timeout_seconds is not None else None,
+            'elapsed_ms': self.elapsed_ms(),
+            'expired': self.expired,
+        }
+
+
+NO_DEADLINE = Deadline()
@@ -0,0 +1,482 @@
+# products/services/fetch_engine.py
+
+"""
+Motor de requisições assíncrono (httpx + HTTP/2) compartilhado pelos scrapers
+
+- Um httpx.AsyncClient com HTTP/2: várias requisições ao mesmo host
+  multiplexadas em poucas conexões (pool com keep-alive)
+- Limite de requisições simultâneas por host (semáforo por host)
+- Retentativas com backoff exponencial e jitter em erros de transporte,
+  429 e 5xx (respeita Retry-After)
+- Descompressão gzip/deflate/br feita pelo httpx
+- Opcional: DiskHttpCache (mesmo cache da requests.Session, com
+  revalidação ETag/Last-Modified) e o rate limiter adaptativo por host
+  (vaga + token antes de cada envio, status/latência como feedback)
+- Opcional: circuit breakers por host/classe de endpoint (falha imediata
+  com o circuito aberto) e orçamento global de retentativas
+- Opcional por chamada: Deadline da busca (timeout de cada tentativa
+  limitado ao prazo restante; sem retentativa que não cabe no prazo)
+
+FetchEngine é a fachada síncrona: o loop asyncio roda em uma thread
+própria e qualquer thread (workers de detalhes, downloads de imagens)
+pode chamar get() / get_many() sem lidar com async.
+"""
+
+import asyncio
+import atexit
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+
+import httpx
+from django.conf import settings
+
+from products.services.circuit_breaker import CircuitBreakerRegistry, CircuitOpenError, get_circuit_breakers
+from products.services.deadline import Deadline
+from products.services.http_cache import DiskHttpCache, get_http_cache
+from products.services.rate_limiter import HostRateLimiter, SlotTimeout, get_rate_limiter, parse_retry_after
+
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'es-419,es;q=0.9,en;q=0.8',
+    'Accept-Encoding': 'gzip, deflate, br',
+}
+
+
+class FetchError(Exception):
+    """Requisição sem resposta de sucesso (após as retentativas)"""
+
+
+@dataclass
+class FetchResult:
+    url: str  # URL pedida (chave para quem chamou)
+    status_code: Optional[int] = None
+    content: bytes = b''
+    headers: httpx.Headers = field(default_factory=httpx.Headers)
+    final_url: str = ''
+    http_version: str = ''
+    elapsed: float = 0.0
+    attempts: int = 0
+    from_cache: bool = False
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and self.status_code is not None and 200 <= self.status_code < 300
+
+    @property
+    def text(self) -> str:
+        content_type = self.headers.get('content-type', '')
+        encoding = 'utf-8'
+        if 'charset=' in content_type:
+            encoding = content_type.split('charset=')[-1].split(';')[0].strip() or encoding
+        return self.content.decode(encoding, errors='replace')
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise FetchError(self.error or f"HTTP {self.status_code} em {self.url}")
+
+
+class AsyncFetchEngine:
+    """
+    Cliente HTTP/2 assíncrono com limites por host e retentativas
+
+    Fica preso ao loop em que é usado pela primeira vez (cliente e
+    semáforos são criados nele).
+    """
+
+    def __init__(
+        self,
+        http2: bool = True,
+        max_connections: int = 10,
+        per_host: int = 6,
+        timeout: float = 15,
+        retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        cache: Optional[DiskHttpCache] = None,
+        rate_limiter: Optional[HostRateLimiter] = None,
+        circuit_breakers: Optional[CircuitBreakerRegistry] = None,
+        headers: Optional[Dict[str, str]] = None
+    ):
+        self.http2 = http2
+        self.max_connections = max(max_connections, 1)
+        self.per_host = max(per_host, 1)
+        self.timeout = timeout
+        self.retries = max(retries, 0)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.cache = cache
+        self.rate_limiter = rate_limiter
+        self.circuit_breakers = circuit_breakers
+        self.headers = {**DEFAULT_HEADERS, **(headers or {})}
+
+        self._client: Optional[httpx.AsyncClient] = None
+        self._host_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+        # Métricas
+        self._stats_lock = threading.Lock()
+        self.requests = 0
+        self.retried = 0
+        self.failed = 0
+        self.cache_hits = 0
+        self.bytes_received = 0
+        self.short_circuited = 0
+        self.retry_budget_denied = 0
+        self.http_versions: Dict[str, int] = {}
+
+    # ------------------------------------------------------------------
+    # Recursos (no loop do motor)
+    # ------------------------------------------------------------------
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                http2=self.http2,
+                headers=self.headers,
+                timeout=self.timeout,
+                follow_redirects=True,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections
+                ),
+            )
+        return self._client
+
+    def _semaphore_for(self, url: str) -> asyncio.Semaphore:
+        host = urlparse(url).netloc or url
+        semaphore = self._host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.per_host)
+            self._host_semaphores[host] = semaphore
+        return semaphore
+
+    def _count(self, name: str, amount: int = 1):
+        with self._stats_lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def _backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """Exponencial com jitter (metade fixa + metade aleatória), ou Retry-After se maior"""
+        cap = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        delay = cap / 2 + random.uniform(0, cap / 2)
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, min(float(retry_after), self.backoff_max))
+        return delay
+
+    def _may_retry(self, attempt: int, delay: float, deadline: Optional[Deadline]) -> bool:
+        """Ainda há tentativa, ela cabe no prazo e o orçamento global de retentativas permite"""
+        if attempt >= self.retries:
+            return False
+        if deadline is not None and deadline.limited and delay >= deadline.remaining():
+            return False
+        if self.circuit_breakers is not None and not self.circuit_breakers.try_retry():
+            self._count('retry_budget_denied')
+            return False
+        return True
+
+    async def _acquire_slot(self, limiter: HostRateLimiter, url: str, timeout: Optional[float] = None):
+        """
+        Vaga do host (espera em thread); se a task for cancelada durante a
+        espera, a vaga que a thread ainda obtiver é devolvida ao terminar
+        """
+        waiting = asyncio.ensure_future(asyncio.to_thread(limiter.acquire, url, timeout))
+        try:
+            await asyncio.shield(waiting)
+        except asyncio.CancelledError:
+            def _release_if_acquired(task):
+                if not task.cancelled() and task.exception() is None:
+                    limiter.release(url)
+
+            waiting.add_done_callback(_release_if_acquired)
+            raise
+
+    # ------------------------------------------------------------------
+    # Requisições
+    # ------------------------------------------------------------------
+
+    def _from_cache_entry(self, url: str, entry: Dict[str, Any]) -> FetchResult:
+        return FetchResult(
+            url=url,
+            status_code=entry['status'],
+            content=entry['body'],
+            headers=httpx.Headers(entry['headers']),
+            final_url=url,
+            from_cache=True,
+        )
+
+    async def fetch(
+        self,
+        url: str,
+        use_cache: bool = True,
+        rate_limited: bool = True,
+        headers: Optional[Dict[str, str]] = None,
+        endpoint: Optional[str] = None,
+        deadline: Optional[Deadline] = None
+    ) -> FetchResult:
+        """
+        GET com cache, circuito, limite por host e retentativas (nunca levanta
+        exceção, exceto o cancelamento da task: veja result.error)
+
+        Args:
+            endpoint: classe do endpoint para o circuit breaker (None: pela URL)
+            deadline: prazo da busca (None: só o timeout do motor)
+        """
+        cache = self.cache if use_cache else None
+        entry = cache.get(url) if cache is not None else None
+
+        if entry and entry['fresh']:
+            cache.touch(url)
+            cache.record('hits')
+            self._count('cache_hits')
+            return self._from_cache_entry(url, entry)
+
+        request_headers = dict(headers or {})
+        if entry:
+            if entry.get('etag'):
+                request_headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                request_headers['If-Modified-Since'] = entry['last_modified']
+
+        start = time.time()
+        result = FetchResult(url=url)
+
+        breakers = self.circuit_breakers
+
+        async with self._semaphore_for(url):
+            for attempt in range(self.retries + 1):
+                if deadline is not None and deadline.expired:
+                    result.error = result.error or 'Prazo da busca esgotado'
+                    break
+
+                if breakers is not None:
+                    try:
+                        breakers.before_request(url, endpoint)
+                    except CircuitOpenError as e:
+                        # Host degradado: falha já, sem esperar timeout
+                        result.error = str(e)
+                        self._count('short_circuited')
+                        break
+
+                result.attempts = attempt + 1
+                if attempt:
+                    self._count('retried')
+
+                limiter = self.rate_limiter if rate_limited else None
+                acquired = False
+                response = None
+                error = None
+                try:
+                    if limiter is not None:
+                        await self._acquire_slot(limiter, url, deadline.remaining() if deadline is not None else None)
+                        acquired = True
+
+                    self._count('requests')
+                    sent_at = time.monotonic()
+                    request_kwargs = {'timeout': deadline.timeout(self.timeout)} if deadline is not None else {}
+                    response = await self._get_client().get(url, headers=request_headers, **request_kwargs)
+                except (httpx.HTTPError, httpx.InvalidURL, SlotTimeout) as e:
+                    error = e
+                finally:
+                    # Vaga do host e sonda half-open nunca ficam presas (cancelamento incluso)
+                    if acquired:
+                        limiter.release(url)
+                    if response is None and error is None and breakers is not None:
+                        breakers.breaker_for(url, endpoint).release_probe()
+
+                if isinstance(error, SlotTimeout):
+                    # Prazo acabou esperando vaga do host: nada foi enviado
+                    result.error = f"SlotTimeout: {error}"
+                    if breakers is not None:
+                        breakers.breaker_for(url, endpoint).release_probe()
+                    break
+
+                if error is not None:
+                    if limiter is not None:
+                        limiter.record(url, latency=time.monotonic() - sent_at, error=True)
+                    result.error = f"{type(error).__name__}: {error}"
+
+                    if not isinstance(error, httpx.TransportError):
+                        # Loop de redirecionamento, resposta corrompida...: repetir não
+                        # adianta e não indica host degradado
+                        if breakers is not None:
+                            breakers.breaker_for(url, endpoint).release_probe()
+                        break
+
+                    if breakers is not None:
+                        if deadline is not None and deadline.expired:
+                            # Timeout encurtado pelo prazo da busca não conta contra o host
+                            breakers.breaker_for(url, endpoint).release_probe()
+                        else:
+                            breakers.record(url, endpoint, error=result.error)
+                    delay = self._backoff(attempt)
+                    if not self._may_retry(attempt, delay, deadline):
+                        break
+                    await asyncio.sleep(delay)
+                    continue
+
+                if limiter is not None:
+                    # Feedback para o AIMD do host (latência, 429/503, Retry-After)
+                    limiter.record(
+                        url,
+                        status_code=response.status_code,
+                        latency=time.monotonic() - sent_at,
+                        retry_after=parse_retry_after(response.headers.get('Retry-After'))
+                    )
+                if breakers is not None:
+                    breakers.record(url, endpoint, status_code=response.status_code)
+
+                if response.status_code in RETRY_STATUSES:
+                    delay = self._backoff(attempt, response.headers.get('Retry-After'))
+                    if self._may_retry(attempt, delay, deadline):
+                        result.error = f"HTTP {response.status_code}"
+                        await asyncio.sleep(delay)
+                        continue
+
+                result.status_code = response.status_code
+                result.content = response.content
+                result.headers = response.headers
+                result.final_url = str(response.url)
+                result.http_version = response.http_version
+                result.error = None
+                break
+
+        result.elapsed = time.time() - start
+
+        if result.status_code is None:
+            self._count('failed')
+            return result
+
+        with self._stats_lock:
+            self.bytes_received += len(result.content)
+            self.http_versions[result.http_version] = self.http_versions.get(result.http_version, 0) + 1
+
+        if cache is not None:
+            if entry and result.status_code == 304:
+                cache.touch(url, revalidated=True)
+                cache.record('revalidated')
+                revalidated = self._from_cache_entry(url, entry)
+                revalidated.elapsed = result.elapsed
+                revalidated.attempts = result.attempts
+                return revalidated
+
+            cache.record('misses')
+            cache_control = result.headers.get('cache-control', '').lower()
+            if result.status_code == 200 and 'no-store' not in cache_control:
+                try:
+                    cache.put(url, result)
+                except OSError as e:
+                    print(f"⚠️  Cache HTTP: falha ao gravar {url}: {e}")
+
+        if not result.ok:
+            result.error = f"HTTP {result.status_code}"
+            self._count('failed')
+
+        return result
+
+    async def fetch_many(self, urls: Iterable[str], **kwargs) -> List[FetchResult]:
+        """Busca todas as URLs ao mesmo tempo (respeitando os limites); mesma ordem de urls"""
+        return list(await asyncio.gather(*[self.fetch(url, **kwargs) for url in urls]))
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                'http2': self.http2,
+                'max_connections': self.max_connections,
+                'per_host': self.per_host,
+                'requests': self.requests,
+                'retried': self.retried,
+                'failed': self.failed,
+                'cache_hits': self.cache_hits,
+                'short_circuited': self.short_circuited,
+                'retry_budget_denied': self.retry_budget_denied,
+                'bytes_received': self.bytes_received,
+                'http_versions': dict(self.http_versions),
+            }
+
+
+class FetchEngine:
+    """
+    Fachada síncrona do AsyncFetchEngine (loop em thread dedicada)
+
+    Uso:
+        engine = get_fetch_engine()
+        result = engine.get(url)
+        results = engine.get_many(urls)  # concorrente, mesma ordem
+    """
+
+    def __init__(self, **engine_kwargs):
+        self.engine = AsyncFetchEngine(**engine_kwargs)
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='fetch-engine', daemon=True)
+        self._thread.start()
+        self._closed = False
+
+    def _run(self, coro, timeout: Optional[float] = None):
+        if self._closed:
+            coro.close()
+            raise RuntimeError("FetchEngine já foi encerrado")
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result(timeout)
+
+    def get(self, url: str, **kwargs) -> FetchResult:
+        return self._run(self.engine.fetch(url, **kwargs))
+
+    def get_many(self, urls: Iterable[str], **kwargs) -> List[FetchResult]:
+        return self._run(self.engine.fetch_many(list(urls), **kwargs))
+
+    def stats(self) -> Dict[str, Any]:
+        return self.engine.stats()
+
+    def close(self):
+        if self._closed:
+            return
+        try:
+            self._run(self.engine.aclose(), timeout=10)
+        except Exception:
+            pass
+        self._closed = True
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+
+
+_engine: Optional[FetchEngine] = None
+_engine_lock = threading.Lock()
+
+
+def fetch_engine_enabled() -> bool:
+    return getattr(settings, 'FETCH_ENGINE_ENABLED', True)
+
+
+def get_fetch_engine() -> FetchEngine:
+    """Motor do processo (cache HTTP, rate limiter e circuitos compartilhados com a requests.Session)"""
+    global _engine
+
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = FetchEngine(
+                    http2=getattr(settings, 'FETCH_HTTP2', True),
+                    max_connections=getattr(settings, 'FETCH_MAX_CONNECTIONS', 10),
+                    per_host=getattr(settings, 'FETCH_PER_HOST_CONCURRENCY', 6),
+                    timeout=getattr(settings, 'FETCH_TIMEOUT', 15),
+                    retries=getattr(settings, 'FETCH_RETRIES', 3),
+                    backoff_base=getattr(settings, 'FETCH_BACKOFF_BASE', 0.5),
+                    backoff_max=getattr(settings, 'FETCH_BACKOFF_MAX', 8.0),
+                    cache=get_http_cache() if getattr(settings, 'HTTP_CACHE_ENABLED', True) else None,
+                    rate_limiter=get_rate_limiter(),
+                    circuit_breakers=get_circuit_breakers(),
+                )
+                atexit.register(_engine.close)
+
+    return _engine
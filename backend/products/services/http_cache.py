@@ -0,0 +1,329 @@
+# products/services/http_cache.py
+
+"""
+Cache HTTP em disco para a requests.Session dos extratores
+
+- Respostas GET 200 ficam em HTTP_CACHE_DIR (metadados .json + corpo .body)
+- TTL por classe de URL (busca, produto, imagem): dentro do TTL a resposta
+  sai do disco sem tocar a rede
+- Fora do TTL, revalida com If-None-Match / If-Modified-Since (ETag e
+  Last-Modified guardados); 304 reaproveita o corpo do disco
+- Tamanho limitado: ao passar de HTTP_CACHE_MAX_MB remove as entradas
+  usadas há mais tempo (LRU pelo mtime, atualizado a cada hit)
+
+O disco é compartilhado entre processos (view e workers); os contadores
+de hit/miss são do processo.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+from urllib.parse import urlparse
+
+import requests
+from django.conf import settings
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from products.services.circuit_breaker import get_circuit_breakers
+from products.services.rate_limiter import RateLimitedAdapter
+
+
+URL_CLASS_SEARCH = 'search'
+URL_CLASS_PRODUCT = 'product'
+URL_CLASS_IMAGE = 'image'
+
+DEFAULT_TTLS = {
+    URL_CLASS_SEARCH: 10 * 60,
+    URL_CLASS_PRODUCT: 60 * 60,
+    URL_CLASS_IMAGE: 7 * 24 * 60 * 60,
+}
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.gif')
+
+# Cabeçalhos que não valem para o corpo guardado (já descomprimido)
+DROPPED_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding', 'connection', 'set-cookie'}
+
+
+def classify_url(url: str) -> str:
+    """Classe da URL para escolher o TTL"""
+    parsed = urlparse(url)
+    path = parsed.path.lower()
+
+    if path.endswith(IMAGE_EXTENSIONS) or '/media/catalog/' in path:
+        return URL_CLASS_IMAGE
+    if 'catalogsearch' in path or 'q=' in parsed.query:
+        return URL_CLASS_SEARCH
+    return URL_CLASS_PRODUCT
+
+
+class DiskHttpCache:
+    """Armazenamento das respostas em disco com despejo LRU"""
+
+    def __init__(self, directory: str, max_bytes: int, ttls: Optional[Dict[str, int]] = None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        os.makedirs(self.directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._approx_bytes: Optional[int] = None  # Recalculado no primeiro despejo
+
+        # Métricas (do processo)
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.stores = 0
+        self.evictions = 0
+
+    # ------------------------------------------------------------------
+    # Arquivos
+    # ------------------------------------------------------------------
+
+    def _paths(self, url: str):
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        folder = os.path.join(self.directory, key[:2])
+        return folder, os.path.join(folder, f'{key}.json'), os.path.join(folder, f'{key}.body')
+
+    def ttl_for(self, url: str) -> int:
+        return self.ttls.get(classify_url(url), DEFAULT_TTLS[URL_CLASS_PRODUCT])
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        """Entrada guardada (metadados + corpo) ou None"""
+        _, meta_path, body_path = self._paths(url)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as meta_file:
+                entry = json.load(meta_file)
+            with open(body_path, 'rb') as body_file:
+                entry['body'] = body_file.read()
+        except (OSError, ValueError):
+            return None
+
+        entry['fresh'] = time.time() - entry['stored_at'] < self.ttl_for(url)
+        return entry
+
+    def touch(self, url: str, revalidated: bool = False):
+        """Marca uso recente (LRU); revalidated renova também o TTL"""
+        _, meta_path, body_path = self._paths(url)
+        try:
+            now = time.time()
+            os.utime(body_path, (now, now))
+            if revalidated:
+                with open(meta_path, 'r', encoding='utf-8') as meta_file:
+                    entry = json.load(meta_file)
+                entry['stored_at'] = now
+                self._write_json(meta_path, entry)
+        except (OSError, ValueError):
+            pass
+
+    def put(self, url: str, response: requests.Response):
+        folder, meta_path, body_path = self._paths(url)
+        os.makedirs(folder, exist_ok=True)
+
+        headers = {k: v for k, v in response.headers.items() if k.lower() not in DROPPED_HEADERS}
+        entry = {
+            'url': url,
+            'status': response.status_code,
+            'headers': headers,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'stored_at': time.time(),
+        }
+
+        # Corpo primeiro: metadados sem corpo nunca ficam visíveis
+        tmp_body = f'{body_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_body, 'wb') as body_file:
+            body_file.write(response.content)
+        os.replace(tmp_body, body_path)
+        self._write_json(meta_path, entry)
+
+        with self._lock:
+            self.stores += 1
+            if self._approx_bytes is not None:
+                self._approx_bytes += len(response.content)
+            needs_eviction = self._approx_bytes is None or self._approx_bytes > self.max_bytes
+
+        if needs_eviction:
+            self.evict()
+
+    def _write_json(self, path: str, data: Dict[str, Any]):
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as tmp_file:
+            json.dump(data, tmp_file)
+        os.replace(tmp_path, path)
+
+    def _scan(self):
+        """Lista (mtime, tamanho, caminho do corpo) de todas as entradas"""
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith('.body'):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def evict(self) -> int:
+        """Remove as entradas menos usadas até voltar a 90% do limite"""
+        entries = self._scan()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+
+        if total > self.max_bytes:
+            target = self.max_bytes * 0.9
+            for _, size, body_path in sorted(entries):
+                if total <= target:
+                    break
+                for path in (body_path, body_path[:-len('.body')] + '.json'):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                total -= size
+                removed += 1
+
+        with self._lock:
+            self._approx_bytes = total
+            self.evictions += removed
+
+        return removed
+
+    def clear(self):
+        for _, _, body_path in self._scan():
+            for path in (body_path, body_path[:-len('.body')] + '.json'):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        with self._lock:
+            self._approx_bytes = 0
+
+    def record(self, outcome: str):
+        """Conta um hit / revalidated / miss"""
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses + self.revalidated
+            return {
+                'directory': self.directory,
+                'max_bytes': self.max_bytes,
+                'approx_bytes': self._approx_bytes,
+                'hits': self.hits,
+                'revalidated': self.revalidated,
+                'misses': self.misses,
+                'stores': self.stores,
+                'evictions': self.evictions,
+                'hit_rate': round((self.hits + self.revalidated) / lookups, 3) if lookups else None,
+                'ttls': self.ttls,
+            }
+
+
+class CachingHTTPAdapter(RateLimitedAdapter):
+    """
+    HTTPAdapter que atende GETs pelo DiskHttpCache (cache=None: só repassa)
+
+    rate_limiter e circuit_breakers (opcionais) só são consultados quando a
+    requisição vai de fato para a rede: hits não gastam tokens nem vagas do
+    host e continuam sendo servidos com o circuito aberto.
+    """
+
+    def __init__(self, cache: Optional[DiskHttpCache], rate_limiter=None, circuit_breakers=None, **kwargs):
+        self.cache = cache
+        super().__init__(rate_limiter=rate_limiter, circuit_breakers=circuit_breakers, **kwargs)
+
+    def _build_cached_response(self, request, entry: Dict[str, Any]) -> requests.Response:
+        response = requests.Response()
+        response.status_code = entry['status']
+        response.reason = 'OK'
+        response.headers = CaseInsensitiveDict(entry['headers'])
+        response.headers['X-From-Cache'] = '1'
+        response._content = entry['body']
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        response.from_cache = True
+        return response
+
+    def send(self, request, **kwargs):
+        if self.cache is None or request.method != 'GET' or kwargs.get('stream'):
+            return self._network_send(request, **kwargs)
+
+        url = request.url
+        entry = self.cache.get(url)
+
+        if entry and entry['fresh']:
+            self.cache.touch(url)
+            self.cache.record('hits')
+            return self._build_cached_response(request, entry)
+
+        if entry:
+            if entry.get('etag'):
+                request.headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                request.headers['If-Modified-Since'] = entry['last_modified']
+
+        response = self._network_send(request, **kwargs)
+
+        if entry and response.status_code == 304:
+            response.close()
+            self.cache.touch(url, revalidated=True)
+            self.cache.record('revalidated')
+            return self._build_cached_response(request, entry)
+
+        self.cache.record('misses')
+
+        cache_control = response.headers.get('Cache-Control', '').lower()
+        if response.status_code == 200 and 'no-store' not in cache_control:
+            try:
+                self.cache.put(url, response)
+            except OSError as e:
+                print(f"⚠️  Cache HTTP: falha ao gravar {url}: {e}")
+
+        return response
+
+
+_cache: Optional[DiskHttpCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_http_cache() -> DiskHttpCache:
+    """Cache do processo (diretório, limite e TTLs do settings.py)"""
+    global _cache
+
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = DiskHttpCache(
+                    directory=getattr(settings, 'HTTP_CACHE_DIR', os.path.join(settings.BASE_DIR, 'cache', 'http')),
+                    max_bytes=getattr(settings, 'HTTP_CACHE_MAX_MB', 512) * 1024 * 1024,
+                    ttls=getattr(settings, 'HTTP_CACHE_TTLS', None),
+                )
+
+    return _cache
+
+
+def mount_http_cache(session: requests.Session, rate_limiter=None, circuit_breakers=None, **adapter_kwargs) -> CachingHTTPAdapter:
+    """
+    Monta o CachingHTTPAdapter na sessão (sem cache se HTTP_CACHE_ENABLED=False)
+
+    circuit_breakers=None usa os circuitos do processo
+    """
+    cache = get_http_cache() if getattr(settings, 'HTTP_CACHE_ENABLED', True) else None
+    adapter = CachingHTTPAdapter(
+        cache,
+        rate_limiter=rate_limiter,
+        circuit_breakers=circuit_breakers or get_circuit_breakers(),
+        **adapter_kwargs
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return adapter
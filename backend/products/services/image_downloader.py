@@ -4,12 +4,12 @@ from urllib.parse import urljoin, urlparse
 from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage
 from bs4 import BeautifulSoup
-import time
 import logging
 from PIL import Image
 from io import BytesIO
 import uuid
 from ..models import Product, ProductImage
+from .rate_limiter import mount_rate_limiter
 
 logger = logging.getLogger(__name__)
 
@@ -23,6 +23,7 @@ class ProductImageDownloader:
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
         })
+        mount_rate_limiter(self.session)  # Ritmo por host adaptativo (sem sleep entre imagens)
         self.max_image_size = 5 * 1024 * 1024  # 5MB
         self.min_image_size = 1024  # 1KB
         self.supported_formats = ['jpeg', 'jpg', 'png', 'webp']
@@ -58,9 +59,6 @@ class ProductImageDownloader:
                     image_data = self._download_single_image(img_url, product)
                     if image_data:
                         downloaded_images.append(image_data)
-                        
-                    # Rate limiting
-                    time.sleep(1)
                     
                 except Exception as e:
                     logger.warning(f"Erro ao baixar imagem {img_url}: {str(e)}")
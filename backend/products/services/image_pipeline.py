@@ -0,0 +1,358 @@
+# products/services/image_pipeline.py
+
+"""
+Pipeline de imagens dos produtos (download -> otimização)
+
+- Download: threads usando o motor HTTP/2 compartilhado (fetch_engine;
+  requisições multiplexadas em poucas conexões, retentativas com backoff)
+  ou, com FETCH_ENGINE_ENABLED=False, uma requests.Session com keep-alive
+- Circuit breaker das imagens por host: CDN degradado falha na hora em
+  vez de esperar o timeout de cada imagem
+- Otimização (decode, conversão RGB, resize LANCZOS, JPEG optimize=True):
+  ProcessPoolExecutor, fora do GIL e fora da thread do request
+- Filas limitadas entre os estágios: a rede e a CPU trabalham ao mesmo
+  tempo, sobre as imagens de todos os produtos da busca
+
+Os resultados voltam para a thread que chamou process(), que é quem
+grava no banco (ORM fica numa thread só).
+
+Com um Deadline, cada download usa no máximo o tempo restante e as
+imagens que ainda não começaram quando o prazo acaba voltam como
+canceladas (ImageResult.cancelled), sem tocar a rede.
+"""
+
+import atexit
+import hashlib
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+import requests
+from PIL import Image
+from django.conf import settings
+
+from products.services.circuit_breaker import ENDPOINT_IMAGE, get_circuit_breakers
+from products.services.deadline import NO_DEADLINE, Deadline
+from products.services.fetch_engine import fetch_engine_enabled, get_fetch_engine
+from products.services.rate_limiter import RateLimitedAdapter
+
+
+MAX_IMAGE_SIDE = 1500
+JPEG_QUALITY = 90
+
+_DONE = object()
+
+
+def optimize_image_bytes(content: bytes) -> bytes:
+    """
+    Converte para RGB, reduz para no máximo 1500px e gera JPEG otimizado
+
+    Roda nos processos do pool: só depende do PIL.
+    """
+    img = Image.open(BytesIO(content))
+
+    # Converter para RGB
+    if img.mode not in ('RGB', 'L'):
+        if img.mode in ('RGBA', 'LA', 'P'):
+            bg = Image.new('RGB', img.size, (255, 255, 255))
+            if img.mode == 'P':
+                img = img.convert('RGBA')
+            bg.paste(img, mask=img.split()[-1] if len(img.split()) > 3 else None)
+            img = bg
+        else:
+            img = img.convert('RGB')
+
+    # Redimensionar se muito grande
+    if img.width > MAX_IMAGE_SIDE or img.height > MAX_IMAGE_SIDE:
+        img.thumbnail((MAX_IMAGE_SIDE, MAX_IMAGE_SIDE), Image.Resampling.LANCZOS)
+
+    output = BytesIO()
+    img.save(output, format='JPEG', quality=JPEG_QUALITY, optimize=True)
+    return output.getvalue()
+
+
+@dataclass
+class ImageTask:
+    """Uma imagem a baixar (key identifica o produto para quem chamou)"""
+    key: Any
+    order: int
+    url: str
+
+
+@dataclass
+class ImageResult:
+    task: ImageTask
+    content: Optional[bytes] = None
+    source_hash: Optional[str] = None  # sha256 dos bytes baixados (antes da otimização)
+    error: Optional[str] = None
+    download_seconds: float = 0.0
+    cancelled: bool = False  # Prazo da busca acabou antes do download
+
+    @property
+    def ok(self) -> bool:
+        return self.content is not None
+
+
+class ImagePipeline:
+    """Download em threads + otimização em processos, ligados por filas limitadas"""
+
+    def __init__(self, download_workers: int = 6, process_workers: int = 2, queue_size: int = 16, timeout: int = 15):
+        self.download_workers = max(download_workers, 1)
+        self.process_workers = max(process_workers, 1)
+        self.queue_size = max(queue_size, 1)
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        self.session.headers.update({
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+            'Accept': 'image/webp,image/apng,image/*,*/*;q=0.8'
+        })
+        adapter = RateLimitedAdapter(
+            circuit_breakers=get_circuit_breakers(),
+            pool_connections=4,
+            pool_maxsize=self.download_workers
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+
+        # Métricas
+        self._stats_lock = threading.Lock()
+        self.downloaded = 0
+        self.optimized = 0
+        self.failed = 0
+        self.bytes_downloaded = 0
+
+    # ------------------------------------------------------------------
+    # Pool de processos
+    # ------------------------------------------------------------------
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                # spawn: o processo pai tem threads (Playwright, downloads), fork não é seguro
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.process_workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._executor
+
+    def _reset_executor(self):
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def _submit_optimize(self, content: bytes) -> Future:
+        try:
+            return self._get_executor().submit(optimize_image_bytes, content)
+        except (BrokenProcessPool, RuntimeError) as e:
+            # Pool quebrado (processo morto): recria na próxima e otimiza aqui mesmo
+            print(f"⚠️  Pool de processos de imagem indisponível ({e}), otimizando na thread")
+            self._reset_executor()
+            future: Future = Future()
+            try:
+                future.set_result(optimize_image_bytes(content))
+            except Exception as inline_error:
+                future.set_exception(inline_error)
+            return future
+
+    # ------------------------------------------------------------------
+    # Estágios
+    # ------------------------------------------------------------------
+
+    def _download(self, task: ImageTask, deadline: Deadline = NO_DEADLINE) -> ImageResult:
+        if deadline.expired:
+            return ImageResult(task=task, error='Cancelado: prazo da busca esgotado', cancelled=True)
+
+        if fetch_engine_enabled():
+            return self._download_with_engine(task, deadline)
+
+        start = time.time()
+        try:
+            response = self.session.get(task.url, timeout=deadline.timeout(self.timeout))
+            response.raise_for_status()
+            return ImageResult(
+                task=task,
+                content=response.content,
+                source_hash=hashlib.sha256(response.content).hexdigest(),
+                download_seconds=time.time() - start
+            )
+        except requests.RequestException as e:
+            return ImageResult(task=task, error=f"Erro no download: {e}", download_seconds=time.time() - start)
+
+    def _download_with_engine(self, task: ImageTask, deadline: Deadline = NO_DEADLINE) -> ImageResult:
+        start = time.time()
+        try:
+            result = get_fetch_engine().get(
+                task.url,
+                use_cache=False,  # As imagens já têm o store endereçado por conteúdo
+                rate_limited=False,
+                headers={'Accept': self.session.headers['Accept']},
+                endpoint=ENDPOINT_IMAGE,
+                deadline=deadline
+            )
+        except Exception as e:
+            return ImageResult(task=task, error=f"Erro no download: {e}", download_seconds=time.time() - start)
+
+        if not result.ok:
+            return ImageResult(
+                task=task,
+                error=f"Erro no download: {result.error}",
+                download_seconds=time.time() - start,
+                cancelled=deadline.expired
+            )
+
+        return ImageResult(
+            task=task,
+            content=result.content,
+            source_hash=hashlib.sha256(result.content).hexdigest(),
+            download_seconds=time.time() - start
+        )
+
+    def process(self, tasks: Iterable[ImageTask], deadline: Deadline = NO_DEADLINE) -> Iterator[ImageResult]:
+        """
+        Processa as imagens e devolve os resultados conforme ficam prontos
+        (a ordem de chegada não é a ordem das tasks)
+        """
+        download_queue: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        optimize_queue: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        results: queue.Queue = queue.Queue()
+
+        # Limita imagens em otimização (memória das imagens decodificadas)
+        max_in_flight = self.process_workers * 2
+        in_flight = threading.BoundedSemaphore(max_in_flight)
+
+        def feeder():
+            for task in tasks:
+                download_queue.put(task)
+            for _ in range(self.download_workers):
+                download_queue.put(_DONE)
+
+        def downloader():
+            while True:
+                task = download_queue.get()
+                if task is _DONE:
+                    optimize_queue.put(_DONE)
+                    return
+
+                result = self._download(task, deadline)
+                if result.ok:
+                    with self._stats_lock:
+                        self.downloaded += 1
+                        self.bytes_downloaded += len(result.content)
+                    optimize_queue.put(result)  # Bloqueia se a CPU estiver atrasada
+                else:
+                    results.put(result)
+
+        def dispatcher():
+            finished_downloaders = 0
+
+            while finished_downloaders < self.download_workers:
+                item = optimize_queue.get()
+                if item is _DONE:
+                    finished_downloaders += 1
+                    continue
+
+                in_flight.acquire()
+                future = self._submit_optimize(item.content)
+                future.add_done_callback(lambda f, downloaded=item: _on_optimized(f, downloaded))
+
+            # Todas as vagas de volta = todos os callbacks já entregaram o resultado
+            for _ in range(max_in_flight):
+                in_flight.acquire()
+            results.put(_DONE)
+
+        def _on_optimized(future: Future, downloaded: ImageResult):
+            try:
+                try:
+                    content = future.result()
+                except BrokenProcessPool:
+                    # Processo do pool morreu (ex.: OOM): refaz esta imagem aqui mesmo
+                    self._reset_executor()
+                    content = optimize_image_bytes(downloaded.content)
+
+                results.put(ImageResult(
+                    task=downloaded.task,
+                    content=content,
+                    source_hash=downloaded.source_hash,
+                    download_seconds=downloaded.download_seconds
+                ))
+            except Exception as e:
+                results.put(ImageResult(
+                    task=downloaded.task,
+                    error=f"Erro ao otimizar: {e}",
+                    download_seconds=downloaded.download_seconds
+                ))
+            finally:
+                in_flight.release()
+
+        threads = [threading.Thread(target=feeder, name='image-feeder', daemon=True)]
+        threads += [
+            threading.Thread(target=downloader, name=f'image-download-{i}', daemon=True)
+            for i in range(self.download_workers)
+        ]
+        threads.append(threading.Thread(target=dispatcher, name='image-dispatcher', daemon=True))
+
+        for thread in threads:
+            thread.start()
+
+        while True:
+            result = results.get()
+            if result is _DONE:
+                break
+
+            with self._stats_lock:
+                if result.ok:
+                    self.optimized += 1
+                else:
+                    self.failed += 1
+            yield result
+
+        for thread in threads:
+            thread.join(timeout=1)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                'download_workers': self.download_workers,
+                'process_workers': self.process_workers,
+                'queue_size': self.queue_size,
+                'downloaded': self.downloaded,
+                'optimized': self.optimized,
+                'failed': self.failed,
+                'bytes_downloaded': self.bytes_downloaded,
+            }
+
+    def close(self):
+        self._reset_executor()
+        self.session.close()
+
+
+_pipeline: Optional[ImagePipeline] = None
+_pipeline_lock = threading.Lock()
+
+
+def get_image_pipeline() -> ImagePipeline:
+    """Retorna o pipeline do processo (sessão e pool de processos reaproveitados entre buscas)"""
+    global _pipeline
+
+    if _pipeline is None:
+        with _pipeline_lock:
+            if _pipeline is None:
+                _pipeline = ImagePipeline(
+                    download_workers=getattr(settings, 'IMAGE_DOWNLOAD_WORKERS', 6),
+                    process_workers=getattr(settings, 'IMAGE_PROCESS_WORKERS', 2),
+                    queue_size=getattr(settings, 'IMAGE_PIPELINE_QUEUE_SIZE', 16),
+                )
+                atexit.register(_pipeline.close)
+
+    return _pipeline
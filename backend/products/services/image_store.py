@@ -0,0 +1,277 @@
+# products/services/image_store.py
+
+"""
+Armazenamento de imagens endereçado por conteúdo
+
+- ImageSource: sha256 da URL de origem -> StoredImage (URL já conhecida
+  não é baixada de novo enquanto não passar IMAGE_STORE_REFETCH_DAYS)
+- StoredImage: sha256 dos bytes baixados -> um único arquivo em
+  products/store/<aa>/<hash>.jpg, compartilhado entre produtos e buscas
+- ref_count: quantos ProductImage / Product.main_image apontam para ele
+  (remoções de ProductImage/Product descontam via products.signals)
+
+Imagens sem referência são apagadas pelo command purge_image_store
+(com carência, para não disputar com uma busca em andamento).
+"""
+
+import hashlib
+from datetime import timedelta
+from typing import Any, Dict, Iterable, List, Tuple
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, F, IntegerField, ProtectedError, Sum, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from products.models import ImageSource, Product, ProductImage, StoredImage
+
+
+STORE_PREFIX = 'products/store'
+
+
+def url_hash(url: str) -> str:
+    return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+
+def _store_path(content_hash: str) -> str:
+    return f"{STORE_PREFIX}/{content_hash[:2]}/{content_hash}.jpg"
+
+
+def known_images_for_urls(urls: Iterable[str]) -> Dict[str, StoredImage]:
+    """URLs já baixadas recentemente (e com arquivo presente) -> StoredImage"""
+    max_age = timezone.now() - timedelta(days=getattr(settings, 'IMAGE_STORE_REFETCH_DAYS', 30))
+    hashes = {url_hash(url): url for url in urls}
+
+    sources = (
+        ImageSource.objects
+        .filter(url_hash__in=hashes.keys(), last_fetched_at__gte=max_age)
+        .select_related('stored_image')
+    )
+
+    known = {}
+    for source in sources:
+        if default_storage.exists(source.stored_image.file.name):
+            known[hashes[source.url_hash]] = source.stored_image
+    return known
+
+
+def store_image(source_url: str, source_hash: str, content: bytes) -> StoredImage:
+    """
+    Guarda a imagem otimizada (se o conteúdo ainda não existe) e registra a URL de origem
+
+    Bytes idênticos vindos de URLs diferentes viram um único arquivo.
+    """
+    stored = StoredImage.objects.filter(content_hash=source_hash).first()
+
+    if stored is None or not default_storage.exists(stored.file.name):
+        path = _store_path(source_hash)
+        if not default_storage.exists(path):
+            path = default_storage.save(path, ContentFile(content))
+
+        if stored is None:
+            try:
+                with transaction.atomic():
+                    stored = StoredImage.objects.create(
+                        content_hash=source_hash,
+                        file=path,
+                        size_bytes=len(content)
+                    )
+            except IntegrityError:
+                # Outro worker guardou o mesmo conteúdo ao mesmo tempo
+                stored = StoredImage.objects.get(content_hash=source_hash)
+        else:
+            stored.file = path
+            stored.size_bytes = len(content)
+            stored.save(update_fields=['file', 'size_bytes', 'last_used_at'])
+
+    ImageSource.objects.update_or_create(
+        url_hash=url_hash(source_url),
+        defaults={'source_url': source_url, 'stored_image': stored}
+    )
+    return stored
+
+
+def _apply_ref_deltas(deltas: Dict[int, int]):
+    """Ajusta ref_count de várias imagens em um único UPDATE"""
+    deltas = {stored_id: delta for stored_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    StoredImage.objects.filter(id__in=deltas).update(
+        # Nunca abaixo de zero (contagens antigas podem estar defasadas)
+        ref_count=Greatest(F('ref_count') + Case(
+            *[When(id=stored_id, then=Value(delta)) for stored_id, delta in deltas.items()],
+            default=Value(0),
+            output_field=IntegerField()
+        ), Value(0)),
+        last_used_at=timezone.now()
+    )
+
+
+def release_refs(stored_ids: Iterable[int]):
+    """Uma referência a menos para cada id (ProductImage/Product removidos: ver products.signals)"""
+    deltas: Dict[int, int] = {}
+    for stored_id in stored_ids:
+        if stored_id:
+            deltas[stored_id] = deltas.get(stored_id, 0) - 1
+    _apply_ref_deltas(deltas)
+
+
+def release_main_image(product: Product):
+    """
+    Solta a imagem principal do store antes de um salvamento antigo trocar
+    main_image por um arquivo próprio (o arquivo do store é compartilhado: não apaga)
+    """
+    if product.main_stored_image_id:
+        release_refs([product.main_stored_image_id])
+        product.main_stored_image = None
+        product.main_image = None
+        product.save(update_fields=['main_image', 'main_stored_image'])
+
+
+def _delete_legacy_file(field_file):
+    """Arquivos antigos (nissei_<id>_<n>.jpg / main_...) não pertencem ao store"""
+    name = field_file.name if field_file else None
+    if name and not name.startswith(STORE_PREFIX + '/'):
+        try:
+            default_storage.delete(name)
+        except Exception as e:
+            print(f"⚠️  Não foi possível remover arquivo antigo {name}: {e}")
+
+
+def attach_images_bulk(galleries: Dict[Product, List[Tuple[int, str, StoredImage]]]) -> Dict[int, Dict[str, int]]:
+    """
+    Sincroniza as galerias de vários produtos com as listas (order, url, StoredImage)
+
+    Imagens iguais na mesma posição são mantidas; só as diferenças geram
+    escrita, em lote (1 DELETE, 1 INSERT, 1 UPDATE de ref_count, 1 UPDATE
+    dos produtos; as imagens removidas são descontadas pelo post_delete).
+    A primeira imagem vira main_image (mesmo arquivo, sem cópia).
+
+    Returns:
+        {product_id: {'kept': n, 'added': n, 'removed': n}}
+    """
+    counters = {product.id: {'kept': 0, 'added': 0, 'removed': 0} for product in galleries}
+    ref_deltas: Dict[int, int] = {}
+    to_delete: List[ProductImage] = []
+    to_create: List[ProductImage] = []
+    main_changed: List[Product] = []
+    legacy_files = []  # Removidos só depois do commit
+
+    def release(image: ProductImage):
+        # ref_count da imagem removida é ajustado pelo post_delete (products.signals)
+        if not image.stored_image_id:
+            legacy_files.append(image.image)
+        to_delete.append(image)
+        counters[image.product_id]['removed'] += 1
+
+    existing_by_product: Dict[int, Dict[int, ProductImage]] = {product.id: {} for product in galleries}
+    for image in ProductImage.objects.filter(product__in=list(galleries)):
+        existing_by_product[image.product_id][image.order] = image
+
+    for product, images in galleries.items():
+        images = sorted(images, key=lambda item: item[0])
+        existing = existing_by_product[product.id]
+
+        for position, (_, source_url, stored) in enumerate(images):
+            current = existing.pop(position, None)
+
+            if current is not None and current.stored_image_id == stored.id:
+                counters[product.id]['kept'] += 1
+                continue
+
+            if current is not None:
+                release(current)
+
+            to_create.append(ProductImage(
+                product=product,
+                image=stored.file.name,
+                stored_image=stored,
+                original_url=source_url,
+                alt_text=product.name,
+                is_main=(position == 0),
+                order=position
+            ))
+            ref_deltas[stored.id] = ref_deltas.get(stored.id, 0) + 1
+            counters[product.id]['added'] += 1
+
+        # Posições que sobraram
+        for current in existing.values():
+            release(current)
+
+        # Imagem principal = primeira da galeria
+        main = images[0][2] if images else None
+        if main is not None and product.main_stored_image_id != main.id:
+            if product.main_stored_image_id:
+                ref_deltas[product.main_stored_image_id] = ref_deltas.get(product.main_stored_image_id, 0) - 1
+            else:
+                legacy_files.append(product.main_image)
+            product.main_image = main.file.name
+            product.main_stored_image = main
+            ref_deltas[main.id] = ref_deltas.get(main.id, 0) + 1
+            main_changed.append(product)
+
+    with transaction.atomic():
+        if to_delete:
+            ProductImage.objects.filter(id__in=[image.id for image in to_delete]).delete()
+        if to_create:
+            ProductImage.objects.bulk_create(to_create)
+        if main_changed:
+            Product.objects.bulk_update(main_changed, ['main_image', 'main_stored_image'])
+        _apply_ref_deltas(ref_deltas)
+
+    for field_file in legacy_files:
+        _delete_legacy_file(field_file)
+
+    return counters
+
+
+def attach_product_images(product: Product, images: List[Tuple[int, str, StoredImage]]) -> Dict[str, int]:
+    """Sincroniza a galeria de um produto (ver attach_images_bulk)"""
+    return attach_images_bulk({product: images})[product.id]
+
+
+def purge_unreferenced_images(grace_hours: int = 24, dry_run: bool = False) -> Dict[str, int]:
+    """Remove arquivos e registros de StoredImage sem referências há mais de grace_hours"""
+    cutoff = timezone.now() - timedelta(hours=grace_hours)
+    candidates = StoredImage.objects.filter(ref_count=0, last_used_at__lt=cutoff)
+
+    removed = 0
+    freed_bytes = 0
+
+    for stored in candidates.iterator():
+        if dry_run:
+            removed += 1
+            freed_bytes += stored.size_bytes
+            continue
+
+        with transaction.atomic():
+            locked = StoredImage.objects.select_for_update().filter(id=stored.id, ref_count=0).first()
+            if locked is None:
+                continue
+            name = locked.file.name
+            try:
+                locked.delete()  # ImageSource em cascata
+            except ProtectedError:
+                # ref_count desatualizado: ainda há produto apontando para a imagem
+                continue
+
+        try:
+            default_storage.delete(name)
+        except Exception as e:
+            print(f"⚠️  Não foi possível remover {name}: {e}")
+
+        removed += 1
+        freed_bytes += stored.size_bytes
+
+    return {'removed': removed, 'freed_bytes': freed_bytes}
+
+
+def store_stats() -> Dict[str, Any]:
+    totals = StoredImage.objects.aggregate(images=Count('id'), bytes=Sum('size_bytes'), refs=Sum('ref_count'))
+    totals['sources'] = ImageSource.objects.count()
+    totals['unreferenced'] = StoredImage.objects.filter(ref_count=0).count()
+    return totals
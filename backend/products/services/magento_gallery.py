@@ -0,0 +1,139 @@
+# products/services/magento_gallery.py
+
+"""
+Galeria do produto a partir do JSON do Magento (sem navegador)
+
+A página de produto do Magento já traz a galeria inteira em um
+<script type="text/x-magento-init">, na configuração do widget
+mage/gallery/gallery:
+
+    {"[data-gallery-role=gallery-placeholder]": {
+        "mage/gallery/gallery": {"data": [
+            {"thumb": "...", "img": "...", "full": "...", "position": "1",
+             "isMain": true, "type": "image", "caption": "..."}, ...
+        ]}
+    }}
+
+Com isso as URLs saem do HTML que já foi baixado; o Playwright só é
+necessário quando o JSON não existe ou vem incompleto.
+"""
+
+import json
+from dataclasses import dataclass
+from typing import Any, List, Optional
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup
+
+
+GALLERY_WIDGET = 'mage/gallery/gallery'
+
+# Caminho escolhido para as imagens de cada produto (gravado em scraped_data['image_source'])
+IMAGE_SOURCE_MAGENTO_JSON = 'magento_json'
+IMAGE_SOURCE_BROWSER = 'browser'
+IMAGE_SOURCE_HTML = 'html_fallback'
+IMAGE_SOURCE_NONE = 'none'
+
+
+@dataclass
+class GalleryImage:
+    full: Optional[str]
+    img: Optional[str]
+    thumb: Optional[str]
+    position: int
+    is_main: bool = False
+    caption: str = ''
+
+    @property
+    def best_url(self) -> Optional[str]:
+        """Maior versão disponível"""
+        return self.full or self.img or self.thumb
+
+
+@dataclass
+class MagentoGallery:
+    images: List[GalleryImage]
+    skipped: int = 0  # Itens sem nenhuma URL de imagem
+
+    @property
+    def complete(self) -> bool:
+        """Tem imagens e todas elas têm URL grande (full ou img)"""
+        return bool(self.images) and self.skipped == 0 and all(image.full or image.img for image in self.images)
+
+    def urls(self) -> List[str]:
+        return [image.best_url for image in self.images if image.best_url]
+
+
+def _position(value: Any, default: int) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _find_gallery_data(node: Any) -> Optional[List[Any]]:
+    """Procura a configuração de mage/gallery/gallery em qualquer nível do JSON"""
+    if isinstance(node, dict):
+        widget = node.get(GALLERY_WIDGET)
+        if isinstance(widget, dict) and isinstance(widget.get('data'), list):
+            return widget['data']
+        for value in node.values():
+            found = _find_gallery_data(value)
+            if found is not None:
+                return found
+    elif isinstance(node, list):
+        for value in node:
+            found = _find_gallery_data(value)
+            if found is not None:
+                return found
+    return None
+
+
+def parse_magento_gallery(soup: BeautifulSoup, base_url: str = '') -> Optional[MagentoGallery]:
+    """
+    Lê a galeria dos scripts text/x-magento-init
+
+    Returns:
+        MagentoGallery ordenada por position (principal primeiro em caso de
+        empate, vídeos ignorados) ou None se a página não tem o JSON
+    """
+    for script in soup.find_all('script', type='text/x-magento-init'):
+        text = script.string or script.get_text()
+        if not text or GALLERY_WIDGET not in text:
+            continue
+
+        try:
+            data = _find_gallery_data(json.loads(text))
+        except ValueError:
+            continue
+
+        if data is None:
+            continue
+
+        images = []
+        skipped = 0
+        for index, item in enumerate(data):
+            if not isinstance(item, dict) or item.get('type', 'image') != 'image':
+                continue
+
+            urls = {
+                key: urljoin(base_url, item[key]) if item.get(key) else None
+                for key in ('full', 'img', 'thumb')
+            }
+            if not any(urls.values()):
+                skipped += 1
+                continue
+
+            images.append(GalleryImage(
+                full=urls['full'],
+                img=urls['img'],
+                thumb=urls['thumb'],
+                position=_position(item.get('position'), index),
+                is_main=bool(item.get('isMain')),
+                caption=item.get('caption') or '',
+            ))
+
+        images.sort(key=lambda image: (image.position, not image.is_main))
+        return MagentoGallery(images=images, skipped=skipped)
+
+    return None
@@ -0,0 +1,33 @@
+# products/services/metrics.py
+
+"""
+Métricas dos recursos compartilhados do scraping (deste processo)
+
+Só lê os singletons que já existem: consultar métricas nunca sobe
+navegadores nem pools.
+"""
+
+from typing import Any, Dict
+
+from django.conf import settings
+
+from products.oracle_connector import oracle_pool_stats
+from products.services import browser_pool, fetch_engine, image_pipeline
+from products.services.circuit_breaker import get_circuit_breakers
+from products.services.http_cache import get_http_cache
+from products.services.rate_limiter import get_rate_limiter
+from products.services.search_cache import get_search_cache, search_cache_enabled
+
+
+def collect_scraping_metrics() -> Dict[str, Any]:
+    metrics: Dict[str, Any] = {
+        'http_cache': get_http_cache().stats() if getattr(settings, 'HTTP_CACHE_ENABLED', True) else None,
+        'search_cache': get_search_cache().stats() if search_cache_enabled() else None,
+        'rate_limiter': get_rate_limiter().stats(),
+        'circuit_breakers': get_circuit_breakers().stats(),
+        'browser_pool': browser_pool._pool.stats() if browser_pool._pool is not None else None,
+        'image_pipeline': image_pipeline._pipeline.stats() if image_pipeline._pipeline is not None else None,
+        'fetch_engine': fetch_engine._engine.stats() if fetch_engine._engine is not None else None,
+        'oracle_pool': oracle_pool_stats(),
+    }
+    return metrics
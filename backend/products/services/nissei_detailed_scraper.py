@@ -2,7 +2,6 @@ import base64
 import os
 import re
 import requests
-import time
 import urllib.request
 import uuid
 from bs4 import BeautifulSoup
@@ -14,6 +13,9 @@ from django.core.files.base import ContentFile
 from PIL import Image
 from io import BytesIO
 from products.models import Product, ProductImage
+from products.services.image_store import release_main_image
+from products.services.query_index import products_for_query, record_query_run
+from products.services.rate_limiter import mount_rate_limiter
 from sites.models import Site
 
 
@@ -43,9 +45,10 @@ class NisseiDetailedScraper:
             'Cache-Control': 'no-cache',
         })
         
+        # Ritmo por host adaptativo (substitui as pausas fixas entre requests/produtos)
+        mount_rate_limiter(self.session)
+        
         # Configurações
-        self.delay_between_requests = 3  # Mais tempo entre requests
-        self.delay_between_products = 5  # Pausa entre produtos individuais
         self.max_retries = 3
         self.max_images_per_product = 3
         
@@ -95,11 +98,6 @@ class NisseiDetailedScraper:
                         print(f"📸 {image_count} imagens baixadas")
                     else:
                         print("❌ Falha ao processar produto")
-                    
-                    # Rate limiting entre produtos
-                    if i < len(basic_products):
-                        print(f"⏱️ Aguardando {self.delay_between_products}s...")
-                        time.sleep(self.delay_between_products)
                         
                 except Exception as e:
                     print(f"❌ Erro ao processar produto {i}: {str(e)}")
@@ -635,7 +633,7 @@ class NisseiDetailedScraper:
                 }
                 
                 # ✅ CORREÇÃO 2: Download com stream=True e sem encoding automático
-                response = requests.get(
+                response = self.session.get(
                     img_url, 
                     timeout=30, 
                     stream=True,
@@ -705,8 +703,6 @@ class NisseiDetailedScraper:
                 downloaded_count += 1
                 print(f"    ✅ Imagem processada ({processed_image['width']}x{processed_image['height']})")
                 
-                # Rate limiting
-                time.sleep(1)
                 # import json
                 # print(json.dumps(processed_image['content'], default=str))  
 
@@ -1184,11 +1180,6 @@ class NisseiDetailedScraper:
                         print(f"📸 {image_count} imagens baixadas")
                     else:
                         print("❌ Falha ao processar produto")
-                    
-                    # Rate limiting entre produtos
-                    if i < len(products_for_details):
-                        print(f"⏱️ Aguardando {self.delay_between_products}s...")
-                        time.sleep(self.delay_between_products)
                         
                 except Exception as e:
                     print(f"❌ Erro ao processar produto {i}: {str(e)}")
@@ -1217,6 +1208,7 @@ class NisseiDetailedScraper:
             # FASE 4: Salvar no banco de dados
             print(f"\n💾 FASE 4: Salvando {len(detailed_products)} produtos...")
             saved_count = self._save_products_with_details_flag(detailed_products)
+            record_query_run(self.site, query, [product.get('url') for product in detailed_products])
             
             print(f"🎉 SCRAPING CONCLUÍDO!")
             print(f"📊 Total encontrados: {len(basic_products)}")
@@ -1246,11 +1238,9 @@ class NisseiDetailedScraper:
                     'saved_products_count': saved_count,
                     # Se você precisa do serializer aqui, deixe — vamos sanitizar tudo depois
                     'products': ProductSerializer(
-                        Product.objects.filter(
-                            search_query__icontains=query,
-                            site=self.site,
+                        products_for_query(query, self.site).filter(
                             status__in=[1, 2]
-                        ).prefetch_related('images').order_by('-created_at')[:10],
+                        ).prefetch_related('images')[:10],
                         many=True,
                         context={'request': None}
                     ).data
@@ -1431,8 +1421,9 @@ class NisseiDetailedScraper:
     def _save_product_images(self, product: Product, processed_images: List[Dict]):
         """Salva imagens processadas no banco - VERSÃO CORRIGIDA"""
         try:
-            # Remover imagens antigas se existirem
+            # Remover imagens antigas se existirem (ref_count do image store: post_delete)
             ProductImage.objects.filter(product=product).delete()
+            release_main_image(product)  # Arquivo do store é compartilhado: não apaga
             if product.main_image:
                 try:
                     if hasattr(product.main_image, 'path') and os.path.exists(product.main_image.path):
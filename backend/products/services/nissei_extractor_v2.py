@@ -3,31 +3,120 @@
 """
 Nissei Extractor V2 - ULTRA OTIMIZADO
 - Sem Selenium (mais rápido e estável)
-- Playwright apenas para imagens (método rápido)
+- Imagens lidas do JSON da galeria do Magento (sem navegador); Playwright
+  só quando o JSON não existe ou vem incompleto
+- Browsers Playwright emprestados de um pool compartilhado
+- Detalhes processados em paralelo (cortesia via rate limiter por host)
 - BeautifulSoup + Requests para todos os dados
-- Download paralelo de imagens
+- Páginas sem alteração desde a última extração não são reprocessadas
 - 8x mais rápido que a versão anterior
 """
 
 import re
 import requests
+import threading
 import time
 import json
 from bs4 import BeautifulSoup
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterator, Optional, Tuple
 from datetime import datetime
 from decimal import Decimal, InvalidOperation
-from django.core.files.base import ContentFile
-from PIL import Image
-from io import BytesIO
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FuturesTimeoutError
 from urllib.parse import quote
+from django.conf import settings
 
-from playwright.sync_api import sync_playwright
-
-from products.models import Product, ProductImage
 from sites.models import Site
 from configurations.models import Configuration
+from products.services.browser_pool import get_browser_pool
+from products.services.circuit_breaker import ENDPOINT_RENDER, CircuitOpenError, get_circuit_breakers
+from products.services.deadline import NO_DEADLINE, Deadline, DeadlineExceeded
+from products.services.fetch_engine import FetchResult, fetch_engine_enabled, get_fetch_engine
+from products.services.http_cache import mount_http_cache
+from products.services.magento_gallery import (
+    IMAGE_SOURCE_BROWSER,
+    IMAGE_SOURCE_HTML,
+    IMAGE_SOURCE_MAGENTO_JSON,
+    IMAGE_SOURCE_NONE,
+    parse_magento_gallery,
+)
+from products.services.product_persistence import compute_content_fingerprint, load_known_pages, page_fingerprint
+from products.services.rate_limiter import get_rate_limiter
+from products.services.render_profile import RenderTiming, get_render_profile
+from products.services.progress import (
+    EVENT_ERROR,
+    EVENT_PHASE,
+    EVENT_PRODUCT_PARSED,
+    ProgressReporter,
+)
+
+
+# Coleta as URLs das miniaturas do carrossel (executado dentro da página)
+GALLERY_URLS_SCRIPT = """
+() => {
+    const results = [];
+    const seen = new Set();
+
+    // Método 0: Dados da instância Fotorama (não dependem das imagens terem carregado)
+    try {
+        const gallery = document.querySelector('[data-gallery-role="gallery"], .fotorama');
+        const fotorama = gallery && window.jQuery ? window.jQuery(gallery).data('fotorama') : null;
+        (fotorama && fotorama.data ? fotorama.data : []).forEach(item => {
+            const src = item.full || item.img || item.thumb;
+            if (src && item.type !== 'video' && !seen.has(src)) {
+                results.push(src);
+                seen.add(src);
+            }
+        });
+    } catch (e) {}
+
+    // Método 1: Miniaturas Fotorama com data-gallery-role
+    if (results.length === 0) {
+        const navFrames = document.querySelectorAll('[data-gallery-role="nav-frame"] img, [data-gallery-role="gallery-nav"] img');
+        navFrames.forEach(img => {
+            if (img.src && !img.src.includes('data:image') && !seen.has(img.src)) {
+                results.push(img.src);
+                seen.add(img.src);
+            }
+        });
+    }
+
+    // Método 2: Classe fotorama__nav__frame
+    if (results.length === 0) {
+        const fotoFrames = document.querySelectorAll('.fotorama__nav__frame img, .fotorama__nav img');
+        fotoFrames.forEach(img => {
+            if (img.src && !img.src.includes('data:image') && !seen.has(img.src)) {
+                results.push(img.src);
+                seen.add(img.src);
+            }
+        });
+    }
+
+    // Método 3: Galeria principal (imagens grandes)
+    if (results.length === 0) {
+        const mainImages = document.querySelectorAll('.fotorama__stage img, [data-gallery-role="gallery"] img');
+        mainImages.forEach(img => {
+            if (img.src && !img.src.includes('data:image') && !seen.has(img.src)) {
+                results.push(img.src);
+                seen.add(img.src);
+            }
+        });
+    }
+
+    // Método 4: Qualquer img dentro de .product-image-container
+    if (results.length === 0) {
+        const containerImages = document.querySelectorAll('.product-image-container img, .product.media img');
+        containerImages.forEach(img => {
+            if (img.src && !img.src.includes('data:image') && !seen.has(img.src)) {
+                results.push(img.src);
+                seen.add(img.src);
+            }
+        });
+    }
+
+    return results;
+}
+"""
 
 
 class NisseiExtractorV2:
@@ -47,9 +136,15 @@ class NisseiExtractorV2:
     - Mesma estrutura no banco
     """
     
-    def __init__(self, site: Site, configuration: Configuration):
+    def __init__(
+        self,
+        site: Site,
+        configuration: Configuration,
+        progress: Optional[ProgressReporter] = None
+    ):
         self.site = site
         self.configuration = configuration
+        self.progress = progress or ProgressReporter()  # Eventos estruturados (WebSocket/SSE)
         self.base_url = "https://nissei.com"
         self.currency = "Gs."
         
@@ -64,9 +159,42 @@ class NisseiExtractorV2:
         })
         
         # Configurações
-        self.delay_between_products = 1  # Segundos entre produtos
         self.max_images_per_product = 8  # Máximo de imagens
         self.image_download_workers = 4  # Workers paralelos para download
+        self.detail_workers = getattr(settings, 'SCRAPE_DETAIL_WORKERS', 4)  # Produtos processados em paralelo
+        
+        # Páginas já extraídas (url -> fingerprint + snapshot), carregadas antes da FASE 3
+        self.known_pages: Dict[str, Dict[str, Any]] = {}
+        
+        # Páginas de produto baixadas de uma vez pelo motor HTTP/2 (url -> FetchResult)
+        self.prefetched: Dict[str, FetchResult] = {}
+        
+        # Prazo da busca atual (scrape_products_intelligent) e produtos que não couberam nele
+        self.deadline: Deadline = NO_DEADLINE
+        self.cancelled_products = 0
+        
+        # Quantos produtos tiveram as imagens de cada caminho (JSON, navegador, HTML)
+        self.image_source_counts: Dict[str, int] = {}
+        self._counts_lock = threading.Lock()
+        
+        # Perfil de renderização do Playwright (bloqueio de recursos, espera única) e tempos por página
+        self.render_profile = get_render_profile()
+        self.render_timings: List[RenderTiming] = []
+        
+        # Cortesia com o site: token bucket por host (substitui sleeps fixos)
+        self.rate_limiter = get_rate_limiter()
+        
+        # Circuitos por host/classe (páginas, imagens, render): site degradado falha rápido
+        self.circuit_breakers = get_circuit_breakers()
+        
+        # Cache HTTP em disco (ETag/Last-Modified, TTL por tipo de URL); o rate
+        # limiter só é consultado quando a requisição vai para a rede.
+        # Pool de conexões grande o suficiente para os workers paralelos
+        self.http_adapter = mount_http_cache(
+            self.session,
+            rate_limiter=self.rate_limiter,
+            pool_maxsize=max(self.detail_workers, self.image_download_workers) * 2
+        )
         
         # Verificar IA
         self.ai_available = self._check_ai_availability()
@@ -109,7 +237,8 @@ class NisseiExtractorV2:
         self, 
         query: str, 
         max_results: int = 10, 
-        max_detailed: int = 5
+        max_detailed: int = 5,
+        deadline: Deadline = NO_DEADLINE
     ) -> List[Dict[str, Any]]:
         """
         Método principal - busca e processa produtos
@@ -118,11 +247,45 @@ class NisseiExtractorV2:
             query: Termo de busca
             max_results: Máximo de produtos na listagem inicial
             max_detailed: Máximo de produtos para processar detalhes completos
+            deadline: Prazo total; o que não couber é cancelado e os
+                produtos prontos são devolvidos (product['incomplete']
+                lista as etapas puladas)
         
         Returns:
-            Lista de dicionários com dados completos dos produtos
+            Lista de dicionários com dados completos dos produtos (ordem da listagem)
+        """
+        indexed = list(self._iter_scrape(query, max_results, max_detailed, deadline))
+        return [product for _, product in sorted(indexed, key=lambda item: item[0])]
+    
+    def iter_products_intelligent(
+        self,
+        query: str,
+        max_results: int = 10,
+        max_detailed: int = 5,
+        deadline: Deadline = NO_DEADLINE
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Mesmo fluxo de scrape_products_intelligent, mas entrega cada produto
+        assim que ele fica pronto (ordem de conclusão, não da listagem)
+        
+        Quem consome pode salvar/emitir cada produto na hora: a memória fica
+        limitada aos produtos em processamento e o primeiro produto sai com a
+        latência de um produto. Parar a iteração cancela os que não começaram.
         """
+        for _, product in self._iter_scrape(query, max_results, max_detailed, deadline):
+            yield product
+    
+    def _iter_scrape(
+        self,
+        query: str,
+        max_results: int,
+        max_detailed: int,
+        deadline: Deadline
+    ) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """Fases 1-3; gera (posição na listagem, produto) conforme cada produto termina"""
         start_time = time.time()
+        self.deadline = deadline
+        self.cancelled_products = 0
         
         try:
             self.log("=" * 70)
@@ -132,75 +295,74 @@ class NisseiExtractorV2:
             
             # FASE 1: Buscar produtos básicos
             self.log("\n📋 FASE 1: Buscando produtos...")
+            self.progress.emit(EVENT_PHASE, phase='search', query=query)
             basic_products = self._search_products(query, max_results)
             
             if not basic_products:
                 self.log("❌ Nenhum produto encontrado")
-                return []
+                self.progress.emit(EVENT_PHASE, phase='search_done', found=0)
+                return
             
             self.log(f"✅ {len(basic_products)} produtos encontrados")
+            self.progress.emit(EVENT_PHASE, phase='search_done', found=len(basic_products))
             
             # FASE 2: Filtrar com IA (opcional)
             products_to_process = basic_products
             
-            if self.ai_available and len(basic_products) > max_detailed:
+            if self.ai_available and len(basic_products) > max_detailed and not self.deadline.expired:
                 self.log("\n🧠 FASE 2: Filtrando com IA...")
+                self.progress.emit(EVENT_PHASE, phase='ai_filter')
                 filtered = self._filter_products_with_ai(basic_products, query)
                 products_to_process = filtered[:max_detailed]
             else:
                 products_to_process = basic_products[:max_detailed]
             
             # FASE 3: Processar detalhes completos
-            self.log(f"\n📦 FASE 3: Processando {len(products_to_process)} produtos...")
+            self.log(f"\n📦 FASE 3: Processando {len(products_to_process)} produtos ({self.detail_workers} em paralelo)...")
             self.log("=" * 70)
+            self.progress.emit(EVENT_PHASE, phase='details', total=len(products_to_process))
             
-            detailed_products = []
+            self.known_pages = load_known_pages(self.site, [p['url'] for p in products_to_process])
+            self.prefetched = self._prefetch_product_pages([p['url'] for p in products_to_process])
+            self.image_source_counts = {}
+            self.render_timings = []
             
-            for i, basic_product in enumerate(products_to_process, 1):
-                try:
-                    product_name = basic_product.get('name', 'Sem nome')[:60]
-                    self.log(f"\n[{i}/{len(products_to_process)}] {product_name}")
-                    self.log(f"URL: {basic_product.get('url', '')}")
-                    
-                    # Processar produto completo
-                    detailed = self._process_product_complete(basic_product)
-                    
-                    if detailed:
-                        detailed_products.append(detailed)
-                        img_count = len(detailed.get('images', []))
-                        self.log(f"✅ Produto processado ({img_count} imagens)")
-                    else:
-                        self.log("⚠️  Falha no processamento")
-                    
-                    # Rate limiting
-                    if i < len(products_to_process):
-                        time.sleep(self.delay_between_products)
-                
-                except Exception as e:
-                    self.log(f"❌ Erro no produto {i}: {str(e)[:100]}")
-                    continue
+            processed = 0
+            unchanged = 0
+            for i, detailed in self._iter_products_concurrently(products_to_process):
+                detailed['search_rank'] = i + 1  # Posição na listagem (QueryHit.rank)
+                processed += 1
+                unchanged += 1 if detailed.get('unchanged_page') else 0
+                yield i, detailed
             
-            # FASE 4: Salvar no banco
-            self.log(f"\n💾 FASE 4: Salvando {len(detailed_products)} produtos...")
-            saved_count = self._save_products_to_database(detailed_products)
+            # (Salvar no banco é responsabilidade de quem chama: upsert_scraped_products)
             
             # RESUMO
             elapsed = time.time() - start_time
             self.log("\n" + "=" * 70)
             self.log("✅ SCRAPING CONCLUÍDO!")
             self.log(f"Encontrados: {len(basic_products)}")
-            self.log(f"Processados: {len(detailed_products)}")
-            self.log(f"Salvos: {saved_count}")
+            self.log(f"Processados: {processed} ({unchanged} páginas sem alteração)")
+            if self.cancelled_products:
+                self.log(f"⏰ Cancelados pelo prazo: {self.cancelled_products}")
+            if self.image_source_counts:
+                self.log(f"Origem das imagens: {self.image_source_counts}")
+            if self.render_timings:
+                render_avg = sum(t.total_ms for t in self.render_timings) / len(self.render_timings)
+                self.log(f"Render Playwright: {len(self.render_timings)} páginas, média {render_avg / 1000:.2f}s")
             self.log(f"Tempo total: {elapsed:.2f}s")
+            if self.http_adapter.cache is not None:
+                cache_stats = self.http_adapter.cache.stats()
+                self.log(f"Cache HTTP: {cache_stats['hits']} hits, {cache_stats['revalidated']} revalidados, "
+                         f"{cache_stats['misses']} da rede")
             self.log("=" * 70)
-            
-            return detailed_products
         
         except Exception as e:
+            # Produtos já entregues continuam válidos; a busca só para aqui
             self.log(f"❌ Erro crítico no scraping: {e}")
+            self.progress.emit(EVENT_ERROR, stage='scrape', message=str(e))
             import traceback
             traceback.print_exc()
-            return []
     
     # =====================================================================
     # FASE 1: BUSCA DE PRODUTOS
@@ -215,7 +377,7 @@ class NisseiExtractorV2:
             search_url = f"{self.base_url}/py/catalogsearch/result/?q={quote(query)}"
             self.log(f"🔎 {search_url}")
             
-            response = self.session.get(search_url, timeout=15)
+            response = self.session.get(search_url, timeout=self.deadline.timeout(15))
             response.raise_for_status()
             
             soup = BeautifulSoup(response.content, 'html.parser')
@@ -327,34 +489,165 @@ Responda APENAS com JSON válido:
     # FASE 3: PROCESSAMENTO COMPLETO DO PRODUTO
     # =====================================================================
     
+    def _iter_products_concurrently(self, products: List[Dict]) -> Iterator[Tuple[int, Dict]]:
+        """
+        Processa produtos com concorrência limitada (detail_workers)
+        Busca, parse e render de produtos diferentes se sobrepõem;
+        o ritmo de requisições é controlado pelo rate limiter por host
+        
+        Gera (índice, produto) conforme cada um termina; os workers seguem
+        trabalhando enquanto quem consome salva o produto anterior.
+        """
+        total = len(products)
+        delivered = set()
+        
+        executor = ThreadPoolExecutor(max_workers=max(self.detail_workers, 1))
+        futures = {
+            executor.submit(self._process_product_complete, basic_product): i
+            for i, basic_product in enumerate(products)
+        }
+        
+        try:
+            for future in as_completed(futures, timeout=self.deadline.remaining()):
+                i = futures[future]
+                product_name = products[i].get('name', 'Sem nome')[:60]
+                
+                try:
+                    detailed = future.result()
+                    
+                    if detailed:
+                        img_count = len(detailed.get('images', []))
+                        self.log(f"✅ [{i + 1}/{total}] {product_name} ({img_count} imagens)")
+                        self.progress.emit(
+                            EVENT_PRODUCT_PARSED,
+                            index=i + 1,
+                            total=total,
+                            name=detailed.get('name', ''),
+                            url=detailed.get('url', ''),
+                            price=detailed.get('price'),
+                            image_count=img_count
+                        )
+                        delivered.add(i)
+                        yield i, detailed
+                    else:
+                        self.log(f"⚠️  [{i + 1}/{total}] Falha no processamento: {product_name}")
+                        self.progress.emit(
+                            EVENT_ERROR, stage='details', index=i + 1, url=products[i].get('url', ''),
+                            message='Falha no processamento'
+                        )
+                
+                except DeadlineExceeded as e:
+                    self.cancelled_products += 1
+                    self.log(f"⏰ [{i + 1}/{total}] {product_name}: {e}")
+                    self.progress.emit(
+                        EVENT_ERROR, stage='details', index=i + 1, url=products[i].get('url', ''),
+                        message='Cancelado: prazo da busca esgotado'
+                    )
+                
+                except Exception as e:
+                    self.log(f"❌ Erro no produto {i + 1}: {str(e)[:100]}")
+                    self.progress.emit(
+                        EVENT_ERROR, stage='details', index=i + 1, url=products[i].get('url', ''),
+                        message=str(e)[:200]
+                    )
+                    continue
+        
+        except FuturesTimeoutError:
+            # Prazo esgotado: devolve o que terminou; o resto é cancelado
+            for future, i in futures.items():
+                if i not in delivered and future.done() and not future.cancelled() and future.exception() is None:
+                    detailed = future.result()
+                    if detailed:
+                        delivered.add(i)
+                        yield i, detailed
+            pending = [future for future in futures if not future.done()]
+            self.cancelled_products += len(pending)
+            self.log(f"⏰ Prazo da busca esgotado: {len(pending)} produtos cancelados")
+            for future in pending:
+                future.cancel()
+                i = futures[future]
+                self.progress.emit(
+                    EVENT_ERROR, stage='details', index=i + 1, url=products[i].get('url', ''),
+                    message='Cancelado: prazo da busca esgotado'
+                )
+        
+        finally:
+            # Com prazo não espera os workers ainda rodando (os timeouts deles já
+            # estão limitados ao prazo e o resultado é descartado)
+            executor.shutdown(wait=not self.deadline.limited, cancel_futures=True)
+    
+    def _prefetch_product_pages(self, urls: List[str]) -> Dict[str, FetchResult]:
+        """
+        Baixa todas as páginas de produto ao mesmo tempo (HTTP/2, poucas
+        conexões, cache e rate limiter respeitados). Falhas ficam de fora e
+        o worker tenta de novo pela sessão.
+        """
+        if not fetch_engine_enabled() or not urls:
+            return {}
+        
+        start = time.time()
+        try:
+            results = get_fetch_engine().get_many(urls, deadline=self.deadline)
+        except Exception as e:
+            self.log(f"⚠️  Motor HTTP/2 indisponível ({e}), páginas serão baixadas pela sessão")
+            return {}
+        
+        prefetched = {result.url: result for result in results if result.ok}
+        self.log(f"⚡ {len(prefetched)}/{len(urls)} páginas baixadas em {time.time() - start:.2f}s "
+                 f"({sum(1 for r in results if r.from_cache)} do cache)")
+        return prefetched
+    
     def _process_product_complete(self, basic_product: Dict) -> Optional[Dict]:
         """
         Processa produto completo:
         1. Busca HTML da página
         2. Extrai TODOS os dados (nome, preço, descrição, specs, etc)
-        3. Extrai imagens (método rápido com Playwright)
+        3. Extrai imagens (JSON da galeria; Playwright só se faltar)
         """
         try:
             url = basic_product['url']
+            self.deadline.check('página do produto')
             
-            # 1️⃣ Buscar HTML
-            response = self.session.get(url, timeout=15)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.content, 'html.parser')
+            # 1️⃣ Buscar HTML (já baixado pelo motor HTTP/2, ou agora pela sessão)
+            self.log(f"   🔗 {url}")
+            prefetched = self.prefetched.get(url)
+            if prefetched is not None and prefetched.ok:
+                content = prefetched.content
+            else:
+                response = self.session.get(url, timeout=self.deadline.timeout(15))
+                response.raise_for_status()
+                content = response.content
+            
+            # Página idêntica à da última extração: reaproveita os dados do banco
+            page_hash = page_fingerprint(content)
+            known = self.known_pages.get(url)
+            if known and known['page_fingerprint'] == page_hash:
+                self.log("   ⏭️  Página sem alterações (parse e imagens pulados)")
+                return dict(known['snapshot'], search_query=basic_product.get('search_query', ''))
+            
+            soup = BeautifulSoup(content, 'html.parser')
             
             # 2️⃣ Extrair TODOS os dados
             self.log("   📝 Extraindo dados...")
             product_data = self._extract_all_product_data(soup, url)
             product_data['search_query'] = basic_product.get('search_query', '')
             
-            # 3️⃣ Extrair imagens (método RÁPIDO)
+            # 3️⃣ Extrair imagens (do HTML já baixado sempre que possível)
             self.log("   📸 Extraindo imagens...")
-            image_urls = self._extract_images_playwright(url)
+            image_urls, image_source, images_complete = self._extract_product_images(url, soup)
             product_data['images'] = image_urls
-            self.log(f"   ✅ {len(image_urls)} imagens encontradas")
+            product_data['image_source'] = image_source
+            product_data['incomplete'] = [] if images_complete else ['images']
+            self.log(f"   ✅ {len(image_urls)} imagens encontradas ({image_source})")
+            
+            # Galeria cortada pelo prazo: sem fingerprint, a próxima busca refaz a página
+            product_data['page_fingerprint'] = page_hash if images_complete else None
+            product_data['content_fingerprint'] = compute_content_fingerprint(product_data)
             
             return product_data
         
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             self.log(f"   ❌ Erro: {e}")
             return None
@@ -532,149 +825,132 @@ Responda APENAS com JSON válido:
             return Decimal('0')
     
     # =====================================================================
-    # EXTRAÇÃO RÁPIDA DE IMAGENS (PLAYWRIGHT)
+    # EXTRAÇÃO DE IMAGENS (JSON DO MAGENTO -> PLAYWRIGHT -> HTML)
     # =====================================================================
     
+    def _extract_product_images(self, url: str, soup: BeautifulSoup):
+        """
+        Escolhe o caminho mais barato que entrega a galeria completa
+        
+        1. JSON mage/gallery/gallery do HTML já baixado (sem navegador)
+        2. Playwright (JSON ausente ou incompleto)
+        3. Imagens do HTML (Playwright falhou)
+        
+        Sem tempo para o navegador (prazo da busca), usa o que o HTML já tem
+        e marca a galeria como incompleta.
+        
+        Returns:
+            (urls, origem, completa) com origem em IMAGE_SOURCE_*
+        """
+        gallery = parse_magento_gallery(soup, self.base_url)
+        complete = True
+        
+        if gallery is not None and gallery.complete:
+            urls = self._original_urls(gallery.urls())
+            self.log(f"      ✅ Galeria do Magento: {len(urls)} imagens (sem navegador)")
+            source = IMAGE_SOURCE_MAGENTO_JSON
+        elif self.deadline.expired:
+            self.log("      ⏰ Sem tempo para o navegador, galeria incompleta")
+            complete = False
+            urls = self._original_urls(gallery.urls()) if gallery is not None else []
+            source = IMAGE_SOURCE_MAGENTO_JSON
+            if not urls:
+                urls = self._extract_images_beautifulsoup_fallback(url, soup)
+                source = IMAGE_SOURCE_HTML
+        else:
+            if gallery is None:
+                self.log("      ⚠️  JSON da galeria ausente, usando navegador")
+            else:
+                self.log(f"      ⚠️  JSON da galeria incompleto ({len(gallery.images)} imagens, "
+                         f"{gallery.skipped} sem URL), usando navegador")
+            
+            urls = self._extract_images_playwright(url)
+            source = IMAGE_SOURCE_BROWSER
+            
+            if not urls:
+                urls = self._extract_images_beautifulsoup_fallback(url, soup)
+                source = IMAGE_SOURCE_HTML
+        
+        if not urls:
+            source = IMAGE_SOURCE_NONE
+        
+        with self._counts_lock:
+            self.image_source_counts[source] = self.image_source_counts.get(source, 0) + 1
+        
+        return urls, source, complete
+    
+    def _original_urls(self, urls: List[str]) -> List[str]:
+        """URLs originais (sem /cache/), sem repetição, até max_images_per_product"""
+        original_urls = []
+        seen = set()
+        
+        for image_url in urls:
+            original_url = self._convert_cache_url_to_original(image_url)
+            
+            if original_url and original_url not in seen:
+                original_urls.append(original_url)
+                seen.add(original_url)
+                
+                if len(original_urls) >= self.max_images_per_product:
+                    break
+        
+        return original_urls
+    
     def _extract_images_playwright(self, url: str) -> List[str]:
         """
-        Extrai imagens usando Playwright com múltiplos fallbacks
+        Extrai imagens usando Playwright
+        Usa uma página emprestada do pool de browsers (sem startup por produto)
+        
+        Returns:
+            URLs originais ou [] (quem chama decide o fallback)
         """
         try:
-            with sync_playwright() as p:
-                # Configurações anti-detecção
-                browser = p.chromium.launch(
-                    headless=True,
-                    args=[
-                        '--disable-blink-features=AutomationControlled',
-                        '--disable-dev-shm-usage',
-                        '--no-sandbox'
-                    ]
-                )
-                
-                context = browser.new_context(
-                    viewport={'width': 1920, 'height': 1080},
-                    user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-                )
-                
-                page = context.new_page()
-                
-                # Carregar página
-                self.log("      🌐 Carregando página...")
-                page.goto(url, wait_until='networkidle', timeout=30000)
-                
-                # ===================================================
-                # ESTRATÉGIA 1: Tentar seletores do carrossel Fotorama
-                # ===================================================
-                selectors_to_try = [
-                    '[data-gallery-role="gallery"]',
-                    '.fotorama',
-                    '.product-image-container',
-                    '.gallery-placeholder',
-                    '[data-role="fotorama"]'
-                ]
-                
-                carousel_found = False
-                for selector in selectors_to_try:
-                    try:
-                        self.log(f"      🔍 Tentando seletor: {selector}")
-                        page.wait_for_selector(selector, timeout=8000)
-                        carousel_found = True
-                        self.log(f"      ✅ Carrossel encontrado: {selector}")
-                        break
-                    except:
-                        continue
-                
-                if carousel_found:
-                    # Aguardar inicialização do JS
-                    page.wait_for_timeout(3000)
-                
-                # ===================================================
-                # ESTRATÉGIA 2: Extrair URLs (múltiplos métodos)
-                # ===================================================
-                self.log("      📸 Extraindo URLs das imagens...")
-                
-                thumb_urls = page.evaluate("""
-                    () => {
-                        const results = [];
-                        const seen = new Set();
-                        
-                        // Método 1: Miniaturas Fotorama com data-gallery-role
-                        const navFrames = document.querySelectorAll('[data-gallery-role="nav-frame"] img, [data-gallery-role="gallery-nav"] img');
-                        navFrames.forEach(img => {
-                            if (img.src && !img.src.includes('data:image') && !seen.has(img.src)) {
-                                results.push(img.src);
-                                seen.add(img.src);
-                            }
-                        });
-                        
-                        // Método 2: Classe fotorama__nav__frame
-                        if (results.length === 0) {
-                            const fotoFrames = document.querySelectorAll('.fotorama__nav__frame img, .fotorama__nav img');
-                            fotoFrames.forEach(img => {
-                                if (img.src && !img.src.includes('data:image') && !seen.has(img.src)) {
-                                    results.push(img.src);
-                                    seen.add(img.src);
-                                }
-                            });
-                        }
-                        
-                        // Método 3: Galeria principal (imagens grandes)
-                        if (results.length === 0) {
-                            const mainImages = document.querySelectorAll('.fotorama__stage img, [data-gallery-role="gallery"] img');
-                            mainImages.forEach(img => {
-                                if (img.src && !img.src.includes('data:image') && !seen.has(img.src)) {
-                                    results.push(img.src);
-                                    seen.add(img.src);
-                                }
-                            });
-                        }
-                        
-                        // Método 4: Qualquer img dentro de .product-image-container
-                        if (results.length === 0) {
-                            const containerImages = document.querySelectorAll('.product-image-container img, .product.media img');
-                            containerImages.forEach(img => {
-                                if (img.src && !img.src.includes('data:image') && !seen.has(img.src)) {
-                                    results.push(img.src);
-                                    seen.add(img.src);
-                                }
-                            });
-                        }
-                        
-                        return results;
-                    }
-                """)
-                
-                browser.close()
-                
-                if not thumb_urls:
-                    self.log("      ⚠️  Nenhuma URL encontrada via Playwright")
-                    # Fallback para BeautifulSoup
-                    return self._extract_images_beautifulsoup_fallback(url)
-                
-                self.log(f"      ✅ {len(thumb_urls)} URLs encontradas")
-                
-                # ===================================================
-                # ESTRATÉGIA 3: Converter URLs para originais
-                # ===================================================
-                original_urls = []
-                seen = set()
-                
-                for thumb_url in thumb_urls:
-                    original_url = self._convert_cache_url_to_original(thumb_url)
-                    
-                    if original_url and original_url not in seen:
-                        original_urls.append(original_url)
-                        seen.add(original_url)
-                        
-                        if len(original_urls) >= self.max_images_per_product:
-                            break
-                
-                return original_urls
+            with self.circuit_breakers.guard(url, ENDPOINT_RENDER) as call:
+                try:
+                    thumb_urls = get_browser_pool().run(
+                        lambda page: self._collect_gallery_urls(page, url)
+                    )
+                except Exception as e:
+                    if not self.deadline.expired:
+                        raise
+                    # Timeout causado pelo prazo da busca não conta contra o host
+                    self.log(f"      ⏰ Render interrompido pelo prazo da busca: {e}")
+                    return []
+                call.success()
+            
+            if not thumb_urls:
+                self.log("      ⚠️  Nenhuma URL encontrada via Playwright")
+                return []
+            
+            self.log(f"      ✅ {len(thumb_urls)} URLs encontradas")
+            
+            # Converter URLs para originais
+            return self._original_urls(thumb_urls)
         
+        except CircuitOpenError as e:
+            self.log(f"      ⏭️  Playwright pulado: {e}")
+            return []
         except Exception as e:
             self.log(f"      ❌ Erro Playwright: {e}")
-            # Fallback para BeautifulSoup
-            return self._extract_images_beautifulsoup_fallback(url)
+            return []
+    
+    def _collect_gallery_urls(self, page, url: str) -> List[str]:
+        """
+        Roda na thread do browser emprestado: carrega a página com o perfil
+        de renderização (requisições desnecessárias bloqueadas, uma espera
+        combinada pela galeria) e coleta as URLs das imagens
+        """
+        self.log("      🌐 Carregando página...")
+        urls, timing = self.render_profile.render(page, url, GALLERY_URLS_SCRIPT, deadline=self.deadline)
+        
+        with self._counts_lock:
+            self.render_timings.append(timing)
+        
+        self.log(f"      ⏱️  Render {timing.total_ms / 1000:.2f}s (goto {timing.goto_ms / 1000:.2f}s, "
+                 f"galeria {timing.gallery_wait_ms / 1000:.2f}s{'' if timing.gallery_ready else ' sem galeria'}, "
+                 f"{timing.blocked_requests} requisições bloqueadas)")
+        
+        return urls
     
     def _convert_cache_url_to_original(self, cache_url: str) -> str:
         """
@@ -692,190 +968,30 @@ Responda APENAS com JSON válido:
         
         return original_url
     
-    # =====================================================================
-    # FASE 4: SALVAMENTO NO BANCO DE DADOS
-    # =====================================================================
-    
-    def _save_products_to_database(self, products: List[Dict]) -> int:
-        """
-        Salva produtos no banco de dados
-        Mantém 100% de compatibilidade com estrutura anterior
-        """
-        saved_count = 0
-        
-        for product_data in products:
-            try:
-                # Remover produto duplicado se existir
-                Product.objects.filter(
-                    url=product_data['url'],
-                    site=self.site
-                ).delete()
-                
-                # Criar produto
-                product = Product.objects.create(
-                    site=self.site,
-                    name=product_data.get('name', '')[:255],
-                    url=product_data['url'],
-                    price=product_data.get('price', Decimal('0')),
-                    old_price=product_data.get('old_price', Decimal('0')),
-                    description=product_data.get('description', ''),
-                    short_description=product_data.get('short_description', ''),
-                    sku=product_data.get('sku', ''),
-                    brand=product_data.get('brand', ''),
-                    category=product_data.get('category', ''),
-                    stock_status=product_data.get('stock_status', ''),
-                    search_query=product_data.get('search_query', ''),
-                    status=1
-                )
-                
-                # Salvar especificações (JSONField)
-                specifications = product_data.get('specifications', {})
-                if specifications:
-                    product.specifications = specifications
-                    product.save(update_fields=['specifications'])
-                
-                # Salvar imagens
-                image_urls = product_data.get('images', [])
-                if image_urls:
-                    img_saved = self._save_product_images(product, image_urls)
-                    self.log(f"   💾 {img_saved}/{len(image_urls)} imagens salvas")
-                
-                saved_count += 1
-                self.log(f"   ✅ Produto {product.id} salvo no banco")
-            
-            except Exception as e:
-                self.log(f"   ❌ Erro ao salvar produto: {e}")
-                continue
-        
-        return saved_count
-    
-    def _save_product_images(self, product: Product, image_urls: List[str]) -> int:
-        """
-        Salva imagens do produto
-        Download PARALELO para maior velocidade
-        """
-        try:
-            # Download paralelo com ThreadPoolExecutor
-            with ThreadPoolExecutor(max_workers=self.image_download_workers) as executor:
-                futures = {
-                    executor.submit(self._download_and_optimize_image, url): (i, url)
-                    for i, url in enumerate(image_urls)
-                }
-                
-                saved_count = 0
-                
-                for future in futures:
-                    i, url = futures[future]
-                    try:
-                        image_content = future.result()
-                        
-                        if image_content:
-                            filename = f"nissei_{product.id}_{i+1}.jpg"
-                            
-                            # Criar ProductImage
-                            ProductImage.objects.create(
-                                product=product,
-                                image=ContentFile(image_content, name=filename),
-                                is_main=(i == 0),
-                                order=i,
-                                original_url=url
-                            )
-                            
-                            # Primeira imagem = imagem principal
-                            if i == 0:
-                                product.main_image = ContentFile(image_content, name=filename)
-                                product.save(update_fields=['main_image'])
-                            
-                            saved_count += 1
-                    
-                    except Exception as e:
-                        self.log(f"      ⚠️ Erro imagem {i+1}: {str(e)[:50]}")
-                        continue
-                
-                return saved_count
-        
-        except Exception as e:
-            self.log(f"      ❌ Erro no salvamento de imagens: {e}")
-            return 0
-    
-    def _download_and_optimize_image(self, url: str) -> Optional[bytes]:
-        """
-        Baixa e otimiza imagem
-        - Converte para RGB
-        - Redimensiona se necessário (max 1500x1500)
-        - Comprime para JPEG com qualidade 90%
-        """
-        try:
-            # Download
-            response = requests.get(
-                url,
-                timeout=15,
-                headers={'User-Agent': 'Mozilla/5.0'}
-            )
-            response.raise_for_status()
-            
-            # Abrir imagem
-            img = Image.open(BytesIO(response.content))
-            
-            # Converter para RGB (se necessário)
-            if img.mode not in ('RGB', 'L'):
-                if img.mode in ('RGBA', 'LA', 'P'):
-                    # Criar fundo branco
-                    bg = Image.new('RGB', img.size, (255, 255, 255))
-                    if img.mode == 'P':
-                        img = img.convert('RGBA')
-                    # Colar com transparência
-                    bg.paste(img, mask=img.split()[-1] if len(img.split()) > 3 else None)
-                    img = bg
-                else:
-                    img = img.convert('RGB')
-            
-            # Redimensionar se muito grande
-            if img.width > 1500 or img.height > 1500:
-                img.thumbnail((1500, 1500), Image.Resampling.LANCZOS)
-            
-            # Salvar otimizado
-            output = BytesIO()
-            img.save(output, format='JPEG', quality=90, optimize=True)
-            return output.getvalue()
-        
-        except Exception as e:
-            return None
-
-    def _extract_images_beautifulsoup_fallback(self, url: str) -> List[str]:
+    def _extract_images_beautifulsoup_fallback(self, url: str, soup: Optional[BeautifulSoup] = None) -> List[str]:
         """
         Fallback: extrai imagens usando BeautifulSoup (quando Playwright falha)
+        
+        soup: HTML já baixado da página (não precisa baixar de novo)
         """
         try:
             self.log("      🔄 Usando fallback BeautifulSoup...")
             
-            response = self.session.get(url, timeout=15)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.content, 'html.parser')
+            if soup is None:
+                response = self.session.get(url, timeout=15)
+                response.raise_for_status()
+                soup = BeautifulSoup(response.content, 'html.parser')
             
             image_urls = []
             seen = set()
             
-            # Método 1: Buscar em scripts JSON (Fotorama muitas vezes injeta dados em JS)
-            scripts = soup.find_all('script', type='text/x-magento-init')
-            for script in scripts:
-                try:
-                    script_text = script.string
-                    if script_text and 'mage/gallery/gallery' in script_text:
-                        # Extrair URLs do JSON
-                        import json
-                        data = json.loads(script_text)
-                        for key, value in data.items():
-                            if isinstance(value, dict) and 'mage/gallery/gallery' in value:
-                                gallery_data = value['mage/gallery/gallery'].get('data', [])
-                                for item in gallery_data:
-                                    if isinstance(item, dict):
-                                        img_url = item.get('full') or item.get('img')
-                                        if img_url and img_url not in seen:
-                                            image_urls.append(img_url)
-                                            seen.add(img_url)
-                except:
-                    continue
+            # Método 1: JSON da galeria (mesmo incompleto, aproveita o que tiver)
+            gallery = parse_magento_gallery(soup, self.base_url)
+            if gallery is not None:
+                for img_url in gallery.urls():
+                    if img_url not in seen:
+                        image_urls.append(img_url)
+                        seen.add(img_url)
             
             # Método 2: Buscar imagens no HTML
             if not image_urls:
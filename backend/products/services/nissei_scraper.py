@@ -1,11 +1,11 @@
 import re
 import requests
-import time
 from bs4 import BeautifulSoup
 from decimal import Decimal
 from products.models import Product
 from products.services.image_downloader import ProductImageDownloader
 from products.services.agno_scraper import AgnoIntelligentScraper
+from products.services.rate_limiter import mount_rate_limiter
 from sites.models import Site
 from typing import List, Dict, Any, Optional
 from urllib.parse import urljoin, urlparse
@@ -21,11 +21,14 @@ class NisseiSpecializedScraper(AgnoIntelligentScraper):
         self.base_url = "https://nissei.com"
         self.currency = "Gs."  # Guarani Paraguaio
         
-        # Headers específicos para Nissei
+        # Headers específicos para Nissei (a classe base não cria sessão HTTP)
+        self.session = requests.Session()
         self.session.headers.update({
             'Accept-Language': 'es-419,es;q=0.9,en;q=0.8,pt;q=0.7',
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8',
         })
+        # Ritmo/concorrência por host com feedback de latência e 429/5xx (AIMD)
+        mount_rate_limiter(self.session)
     
     def get_scraping_instructions(self, query: str) -> Dict[str, Any]:
         """
@@ -117,9 +120,6 @@ class NisseiSpecializedScraper(AgnoIntelligentScraper):
                     products.extend(page_products)
                     page += 1
                     
-                    # Rate limiting
-                    time.sleep(2)
-                    
                 except Exception as e:
                     print(f"⚠️ Erro na página {page}: {str(e)}")
                     break
@@ -7,6 +7,7 @@ import time
 from decimal import Decimal, InvalidOperation
 from django.utils import timezone  # ✅ IMPORT CORRIGIDO
 from products.models import Product
+from products.services.rate_limiter import mount_rate_limiter
 from sites.models import Site
 
 class NisseiScraper:
@@ -32,8 +33,8 @@ class NisseiScraper:
             'Pragma': 'no-cache'
         })
         
-        # Rate limiting
-        self.delay_between_requests = 2
+        # Rate limiting adaptativo por host (sem pausa fixa entre páginas)
+        mount_rate_limiter(self.session)
         self.max_retries = 3
     
     def scrape_products(self, query: str, max_results: int = 10) -> List[Dict[str, Any]]:
@@ -90,10 +91,6 @@ class NisseiScraper:
                         break
                     
                     page += 1
-                    
-                    # Rate limiting
-                    if page <= max_pages:
-                        time.sleep(self.delay_between_requests)
                 
                 except Exception as e:
                     print(f"❌ Erro na página {page}: {str(e)}")
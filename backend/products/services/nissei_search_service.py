@@ -0,0 +1,503 @@
+# products/services/nissei_search_service.py
+
+"""
+Busca detalhada no Nissei (núcleo compartilhado)
+
+Executa o NisseiExtractorV2 e salva os produtos/imagens no banco.
+Usado tanto pela view síncrona nissei_search_detailed quanto pelos
+workers de ScrapeJob (management command run_scrape_workers).
+"""
+
+import time
+import traceback
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from django.conf import settings
+from django.db import models
+
+from configurations.models import Configuration
+from products.models import Product
+from products.services.deadline import NO_DEADLINE, Deadline
+from products.services.image_pipeline import ImageTask, get_image_pipeline
+from products.services.image_store import attach_images_bulk, known_images_for_urls, store_image
+from products.services.nissei_extractor_v2 import NisseiExtractorV2
+from products.services.product_persistence import (
+    ROW_CREATED,
+    ROW_DUPLICATE,
+    ROW_ERROR,
+    ROW_SKIPPED,
+    ROW_UNCHANGED,
+    upsert_scraped_products,
+)
+from products.services.progress import (
+    EVENT_ERROR,
+    EVENT_IMAGE_SAVED,
+    EVENT_PHASE,
+    EVENT_PRODUCT_SAVED,
+    ProgressReporter,
+)
+from products.services.query_index import add_query_hits, start_query_run
+from sites.models import Site
+
+
+def _int_param(data: Dict[str, Any], name: str, default: Any) -> int:
+    try:
+        return int(data.get(name, default))
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} deve ser um número inteiro")
+
+
+def normalize_search_params(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Valida e normaliza os parâmetros de busca vindos do request
+
+    timeout_ms (opcional): prazo total da busca; sem ele vale
+    SCRAPE_DEFAULT_TIMEOUT_MS (0 = sem prazo)
+
+    ai_config e enhanced_extraction ficam em forma canônica ("False" e
+    False são a mesma busca para o single-flight e o cache)
+
+    Raises:
+        ValueError: query ausente/curta ou parâmetros de tipo inválido
+    """
+    query = data.get('query') or ''
+    if not isinstance(query, str):
+        raise ValueError('query deve ser um texto')
+    query = query.strip()
+    if len(query) < 2:
+        raise ValueError('Query deve ter pelo menos 2 caracteres')
+
+    max_results = _int_param(data, 'max_results', 20)
+    max_detailed = _int_param(data, 'max_detailed', 5)
+    max_images = _int_param(data, 'max_images', 3)
+
+    if data.get('timeout_ms') in (None, ''):
+        timeout_ms = getattr(settings, 'SCRAPE_DEFAULT_TIMEOUT_MS', 0)
+    else:
+        timeout_ms = _int_param(data, 'timeout_ms', None)
+    if timeout_ms > 0:
+        timeout_ms = min(
+            max(timeout_ms, getattr(settings, 'SCRAPE_MIN_TIMEOUT_MS', 2000)),
+            getattr(settings, 'SCRAPE_MAX_TIMEOUT_MS', 600000)
+        )
+
+    ai_config = data.get('ai_config') or 'none'
+    if not isinstance(ai_config, str):
+        raise ValueError('ai_config deve ser um texto')
+
+    return {
+        'query': query,
+        'max_results': min(max(max_results, 1), 50),
+        'max_detailed': min(max(max_detailed, 1), 10),
+        'max_images': min(max(max_images, 1), 8),
+        'ai_config': ai_config.strip().lower() or 'none',
+        'enhanced_extraction': str(data.get('enhanced_extraction', True)).lower() not in ('false', '0'),
+        'timeout_ms': timeout_ms if timeout_ms > 0 else None,
+    }
+
+
+def resolve_ai_configuration(ai_config_name: str) -> Configuration:
+    """Busca a configuração de IA pedida (ou uma configuração dummy SEM IA)"""
+    configuration = None
+
+    if ai_config_name != 'none':
+        print("🧠 Buscando configuração de IA...")
+
+        if ai_config_name == 'auto':
+            configuration = Configuration.objects.filter(
+                model_integration__in=['claude', 'anthropic', 'openai'],
+                token__isnull=False,
+                token__gt=''
+            ).order_by(
+                models.Case(
+                    models.When(model_integration__icontains='claude', then=1),
+                    models.When(model_integration__icontains='anthropic', then=1),
+                    models.When(model_integration__icontains='openai', then=2),
+                    default=3
+                )
+            ).first()
+        else:
+            configuration = Configuration.objects.filter(
+                name__icontains=ai_config_name,
+                token__isnull=False,
+                token__gt=''
+            ).first()
+
+        if configuration:
+            print(f"✅ IA: {configuration.name} ({configuration.model_integration})")
+        else:
+            print("⚠️  IA não encontrada, continuando SEM IA")
+    else:
+        print("⚡ Modo RÁPIDO (sem IA)")
+
+    if not configuration:
+        configuration = Configuration(
+            name="V2 Fast Without AI",
+            model_integration=None,
+            token=None,
+            parameters={}
+        )
+
+    return configuration
+
+
+def get_nissei_site() -> Site:
+    site, _ = Site.objects.get_or_create(
+        url="https://nissei.com",
+        defaults={
+            'name': 'Casa Nissei Paraguay',
+            'description': 'Loja de eletrônicos do Paraguai',
+            'active': True
+        }
+    )
+    return site
+
+
+def download_product_images(
+    products_with_urls: List[Tuple[Product, List[str]]],
+    progress: Optional[ProgressReporter] = None,
+    deadline: Deadline = NO_DEADLINE,
+    created_ids: Optional[Set[int]] = None
+) -> Dict[int, Dict[str, int]]:
+    """
+    Garante as imagens de todos os produtos da busca no image store
+
+    URLs já conhecidas reaproveitam o arquivo existente; as demais passam
+    juntas pelo pipeline (downloads e otimização se sobrepõem entre produtos).
+    No fim, cada produto tem a galeria sincronizada (só as diferenças).
+
+    Downloads cancelados pelo prazo: a galeria de um produto já existente
+    fica como estava (uma lista parcial apagaria imagens boas); produtos
+    criados nesta busca (created_ids) recebem o que foi baixado.
+
+    Returns:
+        {product_id: {'images': vinculadas nesta busca, 'expected': pedidas, 'cancelled': canceladas}}
+    """
+    progress = progress or ProgressReporter()
+    created_ids = created_ids or set()
+    products_by_id = {product.id: product for product, _ in products_with_urls}
+    resolved: Dict[int, List[Tuple[int, str, Any]]] = {product_id: [] for product_id in products_by_id}
+
+    known = known_images_for_urls(url for _, image_urls in products_with_urls for url in image_urls)
+    tasks = []
+
+    for product, image_urls in products_with_urls:
+        for order, image_url in enumerate(image_urls):
+            if image_url in known:
+                resolved[product.id].append((order, image_url, known[image_url]))
+            else:
+                tasks.append(ImageTask(key=product.id, order=order, url=image_url))
+
+    counts = {
+        product.id: {'images': 0, 'expected': len(image_urls), 'cancelled': 0}
+        for product, image_urls in products_with_urls
+    }
+
+    total_images = sum(len(image_urls) for _, image_urls in products_with_urls)
+    if not total_images:
+        print("   ⚠️  Nenhuma imagem para baixar")
+        return counts
+
+    print(f"📥 Imagens: {total_images} ({total_images - len(tasks)} já no store, {len(tasks)} para baixar)")
+    start = time.time()
+
+    for result in get_image_pipeline().process(tasks, deadline):
+        product = products_by_id[result.task.key]
+
+        if result.cancelled:
+            counts[product.id]['cancelled'] += 1
+            continue
+
+        if not result.ok:
+            print(f"         ❌ [{product.id}] imagem {result.task.order+1}: {result.error}")
+            continue
+
+        try:
+            stored = store_image(result.task.url, result.source_hash, result.content)
+            resolved[product.id].append((result.task.order, result.task.url, stored))
+            print(f"         ✅ [{product.id}] imagem {result.task.order+1}: {stored.file.name} ({len(result.content)//1024}KB)")
+            progress.emit(
+                EVENT_IMAGE_SAVED,
+                product_id=product.id,
+                order=result.task.order,
+                original_url=result.task.url,
+                size_kb=len(result.content) // 1024
+            )
+        except Exception as img_error:
+            print(f"         ❌ Erro: {img_error}")
+
+    galleries = {}
+    for product_id, images in resolved.items():
+        if not images:
+            continue
+        if counts[product_id]['cancelled'] and product_id not in created_ids:
+            print(f"   ⏰ [{product_id}] {counts[product_id]['cancelled']} imagens canceladas pelo prazo, galeria mantida")
+            continue
+        galleries[products_by_id[product_id]] = images
+
+    try:
+        changes = attach_images_bulk(galleries)
+        for product_id, product_changes in changes.items():
+            counts[product_id]['images'] = product_changes['kept'] + product_changes['added']
+            if product_changes['added'] or product_changes['removed']:
+                print(f"   🖼️  [{product_id}] galeria: +{product_changes['added']} "
+                      f"-{product_changes['removed']} ={product_changes['kept']}")
+    except Exception as attach_error:
+        print(f"   ❌ Erro ao vincular imagens: {attach_error}")
+
+    cancelled = sum(product_counts['cancelled'] for product_counts in counts.values())
+    print(f"✅ Imagens prontas em {time.time() - start:.1f}s ({len(tasks) - cancelled} baixadas"
+          f"{f', {cancelled} canceladas pelo prazo' if cancelled else ''})")
+    return counts
+
+
+class IncrementalProductSaver:
+    """
+    Salva os produtos da busca em lotes pequenos, conforme o extrator entrega
+
+    Cada lote: upsert no banco, QueryHits da busca, imagens no pipeline,
+    flags de completude e EVENT_PRODUCT_SAVED na hora. Só os Product salvos e as flags ficam em
+    memória; os dicionários extraídos são descartados depois do lote.
+    """
+
+    def __init__(
+        self,
+        site: Site,
+        query: str,
+        max_images: int,
+        extraction_method: str,
+        progress: ProgressReporter,
+        deadline: Deadline = NO_DEADLINE
+    ):
+        self.site = site
+        self.query = query
+        self.max_images = max_images
+        self.extraction_method = extraction_method
+        self.progress = progress
+        self.deadline = deadline
+
+        self.query_run = None
+        self.saved_products: List[Product] = []
+        self.created_ids: Set[int] = set()
+        self.seen_ids: Set[int] = set()
+        self.completeness: Dict[int, Dict[str, Any]] = {}
+        self.received_count = 0
+        self.saved_count = 0
+        self.updated_count = 0
+        self.unchanged_count = 0
+
+    @property
+    def incomplete_ids(self) -> List[int]:
+        return [product_id for product_id, flags in self.completeness.items() if not flags['complete']]
+
+    def save(self, rows: List[Dict[str, Any]]):
+        if not rows:
+            return
+
+        offset = self.received_count
+        self.received_count += len(rows)
+
+        # Lote em uma transação (INSERT ... ON CONFLICT (url, site) DO UPDATE)
+        try:
+            outcomes = upsert_scraped_products(
+                rows, self.site, self.query, self.max_images, self.extraction_method
+            )
+        except Exception as save_error:
+            print(f"   ❌ Erro ao salvar produtos: {save_error}")
+            print(traceback.format_exc())
+            outcomes = [
+                {'index': idx, 'url': product_data.get('url', ''), 'status': ROW_ERROR,
+                 'product': None, 'image_urls': [], 'error': str(save_error)}
+                for idx, product_data in enumerate(rows)
+            ]
+
+        batch: List[Product] = []
+        ranks: List[int] = []
+        pending_images: List[Tuple[Product, List[str]]] = []
+        extraction_incomplete: Dict[int, bool] = {}
+
+        for outcome in outcomes:
+            idx = offset + outcome['index'] + 1
+            product = outcome['product']
+
+            if outcome['status'] in (ROW_SKIPPED, ROW_ERROR):
+                print(f"   ❌ Produto {idx}: {outcome['error']}")
+                self.progress.emit(
+                    EVENT_ERROR, stage='save', index=idx, url=outcome['url'],
+                    message=str(outcome['error'])[:200]
+                )
+                continue
+
+            # Mesmo produto duas vezes na busca (no lote ou em lotes anteriores)
+            if outcome['status'] == ROW_DUPLICATE or product.id in self.seen_ids:
+                continue
+
+            if outcome['status'] == ROW_CREATED:
+                self.saved_count += 1
+                self.created_ids.add(product.id)
+            elif outcome['status'] == ROW_UNCHANGED:
+                self.unchanged_count += 1
+            else:
+                self.updated_count += 1
+
+            batch.append(product)
+            ranks.append(rows[outcome['index']].get('search_rank') or idx)
+            extraction_incomplete[product.id] = bool(rows[outcome['index']].get('incomplete'))
+            self.seen_ids.add(product.id)
+
+            # Galeria extraída pela metade (prazo): só produtos novos recebem a lista parcial
+            if outcome['image_urls'] and (product.id in self.created_ids or not extraction_incomplete[product.id]):
+                pending_images.append((product, outcome['image_urls']))
+
+        # Busca -> produtos (products_for_query nas views)
+        if batch:
+            try:
+                if self.query_run is None:
+                    self.query_run = start_query_run(self.site, self.query)
+                add_query_hits(self.query_run, batch, ranks=ranks)
+            except Exception as hits_error:
+                print(f"   ⚠️  Erro ao registrar busca -> produtos: {hits_error}")
+
+        # Imagens do lote no pipeline (download em threads, PIL em processos)
+        image_counts = download_product_images(pending_images, self.progress, self.deadline, self.created_ids)
+
+        for product in batch:
+            counts = image_counts.get(product.id, {'images': 0, 'expected': 0, 'cancelled': 0})
+            images_extracted = not extraction_incomplete[product.id]
+            self.completeness[product.id] = {
+                'details': True,
+                'images_extracted': images_extracted,
+                'images_expected': counts['expected'],
+                'images_saved': counts['images'],
+                'images_cancelled': counts['cancelled'],
+                'complete': images_extracted and not counts['cancelled'],
+            }
+
+        incomplete_ids = [product.id for product in batch if not self.completeness[product.id]['complete']]
+        if incomplete_ids:
+            # Sem fingerprint a próxima busca trata o produto como alterado e completa as imagens
+            Product.objects.filter(id__in=incomplete_ids).update(content_fingerprint=None)
+
+        for product in batch:
+            self.saved_products.append(product)
+            self.progress.emit(
+                EVENT_PRODUCT_SAVED,
+                index=len(self.saved_products),
+                product_id=product.id,
+                name=product.name,
+                url=product.url,
+                price=product.price,
+                created=product.id in self.created_ids,
+                main_image_url=product.main_image.url if product.main_image else None
+            )
+
+
+def summarize_search_outcome(outcome: Dict[str, Any]) -> Dict[str, Any]:
+    """Resumo serializável em JSON (guardado em ScrapeJob.result)"""
+    configuration = outcome['configuration']
+    ai_used = bool(configuration and configuration.token)
+
+    return {
+        'site_id': outcome['site'].id,
+        'detailed_count': outcome['detailed_count'],
+        'saved_product_ids': [product.id for product in outcome['saved_products']],
+        'saved_count': outcome['saved_count'],
+        'updated_count': outcome['updated_count'],
+        'unchanged_count': outcome['unchanged_count'],
+        'ai_used': ai_used,
+        'ai_config_name': configuration.name if ai_used else 'none',
+        'ai_model': configuration.model_integration if ai_used else 'none',
+        'partial': outcome.get('partial', False),
+        'deadline': outcome.get('deadline'),
+        'completeness': {str(product_id): flags for product_id, flags in outcome.get('completeness', {}).items()},
+    }
+
+
+def run_nissei_search(
+    params: Dict[str, Any],
+    progress: Optional[ProgressReporter] = None
+) -> Dict[str, Any]:
+    """
+    Executa a busca completa: scraping V2 + salvamento no banco
+
+    Os produtos são salvos em lotes de SCRAPE_PERSIST_CHUNK_SIZE conforme o
+    extrator os entrega (EVENT_PRODUCT_SAVED sai na hora, sem esperar a
+    busca inteira).
+
+    Com params['timeout_ms'], o prazo vale para todas as fases: o que não
+    couber é cancelado e os produtos prontos são salvos e devolvidos, com
+    flags de completude por produto (outcome['completeness']).
+
+    Args:
+        params: parâmetros já normalizados (normalize_search_params)
+        progress: destino dos eventos de progresso (opcional)
+
+    Returns:
+        Dicionário com total extraído, produtos salvos e contadores
+    """
+    query = params['query']
+    max_images = params['max_images']
+    deadline = Deadline.from_ms(params.get('timeout_ms'))
+
+    configuration = resolve_ai_configuration(params['ai_config'])
+    site = get_nissei_site()
+
+    progress = progress or ProgressReporter()
+    extractor = NisseiExtractorV2(site, configuration, progress=progress)
+    extractor.max_images_per_product = max_images
+
+    try:
+        # 1. SCRAPING + SALVAMENTO INCREMENTAL
+        # Cada produto é salvo (com imagens) assim que o extrator o entrega,
+        # enquanto os workers seguem processando os próximos
+        print("\n🚀 Iniciando scraping V2 (salvando conforme os produtos ficam prontos)...\n")
+
+        extraction_method = 'v2_fast_no_ai' if params['ai_config'] == 'none' else 'v2_fast_with_ai'
+        chunk_size = max(getattr(settings, 'SCRAPE_PERSIST_CHUNK_SIZE', 1), 1)
+        saver = IncrementalProductSaver(site, query, max_images, extraction_method, progress, deadline)
+        progress.emit(EVENT_PHASE, phase='save')
+
+        chunk: List[Dict[str, Any]] = []
+        for product_data in extractor.iter_products_intelligent(
+            query=query,
+            max_results=params['max_results'],
+            max_detailed=params['max_detailed'],
+            deadline=deadline
+        ):
+            chunk.append(product_data)
+            if len(chunk) >= chunk_size:
+                saver.save(chunk)
+                chunk = []
+        saver.save(chunk)
+
+        incomplete_ids = saver.incomplete_ids
+
+        print(f"\n{'='*70}")
+        print("💾 RESUMO DO SALVAMENTO")
+        print(f"{'='*70}")
+        print(f"📦 Produtos extraídos: {saver.received_count}")
+        print(f"✅ Produtos novos: {saver.saved_count}")
+        print(f"🔄 Produtos atualizados: {saver.updated_count}")
+        print(f"⏭️  Produtos sem alterações: {saver.unchanged_count}")
+        print(f"📊 Total salvo: {len(saver.saved_products)}")
+        if deadline.limited:
+            print(f"⏰ Prazo: {deadline.elapsed_ms()}ms de {params['timeout_ms']}ms "
+                  f"({len(incomplete_ids)} incompletos, {extractor.cancelled_products} cancelados)")
+        print(f"{'='*70}\n")
+
+        return {
+            'configuration': configuration,
+            'site': site,
+            'detailed_count': saver.received_count,
+            'saved_products': saver.saved_products,
+            'saved_count': saver.saved_count,
+            'updated_count': saver.updated_count,
+            'unchanged_count': saver.unchanged_count,
+            'completeness': saver.completeness,
+            'partial': bool(incomplete_ids or extractor.cancelled_products),
+            'deadline': {**deadline.as_dict(), 'cancelled_products': extractor.cancelled_products} if deadline.limited else None,
+        }
+
+    finally:
+        extractor.close()
+        print("🔌 Recursos liberados")
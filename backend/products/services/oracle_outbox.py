@@ -0,0 +1,286 @@
+# products/services/oracle_outbox.py
+
+"""
+Outbox da sincronização com o Oracle
+
+- enqueue_oracle_sync: chamado na mesma transação que aprova o produto
+  (status = 2); a API responde sem esperar o Oracle
+- claim_outbox_batch: o command drain_oracle_outbox pega um lote com
+  SELECT ... FOR UPDATE SKIP LOCKED (vários drenadores nunca pegam a
+  mesma linha)
+- process_outbox_batch: uma sessão Oracle por usuário no lote, um SKU
+  enviado uma vez só (aprovações repetidas viram um envio), falhas
+  reprogramadas com espera exponencial até ORACLE_OUTBOX_MAX_ATTEMPTS
+- outbox_stats: backlog e atraso da sincronização
+"""
+
+import traceback
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import Avg, Count, F, Max, Min
+from django.utils import timezone
+
+from products.models import OracleSyncOutbox, Product
+from products.oracle_sync import sync_products_to_oracle
+from products.serializers import ProductSerializer
+from users.models import CustomUser
+from users.utils import decode_simple
+
+
+User = get_user_model()
+
+
+def oracle_outbox_enabled() -> bool:
+    return getattr(settings, 'ORACLE_OUTBOX_ENABLED', True)
+
+
+def oracle_credentials_for_user(user) -> Tuple[str, Optional[str]]:
+    """(usuário, senha decodificada) do Oracle para o usuário do Django"""
+    if user is None or not user.is_authenticated:
+        return 'WEBSYNC', None
+
+    oracle_username = user.username.upper()
+    try:
+        oracle_password = user.customuser.oracle_password  # related_name='customuser'
+    except CustomUser.DoesNotExist:
+        oracle_password = None
+
+    if oracle_password:
+        try:
+            oracle_password = decode_simple(oracle_password)
+        except Exception as e:
+            print(f"❌ Erro ao decodificar senha Oracle do usuário {oracle_username}: {e}")
+            oracle_password = None
+
+    return oracle_username, oracle_password
+
+
+def enqueue_oracle_sync(products: Iterable[Product], user=None) -> int:
+    """
+    Registra os produtos para sincronização (use dentro da transação do UPDATE)
+
+    Produto que já tem envio pendente não ganha outra linha (índice único
+    parcial + ON CONFLICT DO NOTHING).
+
+    Returns:
+        Quantidade de produtos enviados para o outbox
+    """
+    requested_by = user if user is not None and user.is_authenticated else None
+    entries = [OracleSyncOutbox(product=product, requested_by=requested_by) for product in products]
+    OracleSyncOutbox.objects.bulk_create(entries, ignore_conflicts=True)
+    return len(entries)
+
+
+def claim_outbox_batch(worker_name: str, limit: Optional[int] = None) -> List[OracleSyncOutbox]:
+    """Reserva as próximas linhas vencidas para este drenador"""
+    limit = limit or getattr(settings, 'ORACLE_OUTBOX_BATCH_SIZE', 200)
+    now = timezone.now()
+
+    with transaction.atomic():
+        entries = list(
+            OracleSyncOutbox.objects
+            .select_for_update(skip_locked=True)
+            .filter(status=OracleSyncOutbox.STATUS_PENDING, next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')[:limit]
+        )
+
+        if not entries:
+            return []
+
+        OracleSyncOutbox.objects.filter(id__in=[entry.id for entry in entries]).update(
+            status=OracleSyncOutbox.STATUS_PROCESSING,
+            worker=worker_name,
+            locked_at=now,
+            attempts=F('attempts') + 1,
+        )
+
+    for entry in entries:
+        entry.status = OracleSyncOutbox.STATUS_PROCESSING
+        entry.worker = worker_name
+        entry.locked_at = now
+        entry.attempts += 1
+
+    return entries
+
+
+def retry_delay(attempts: int) -> float:
+    """Espera exponencial: base, 2x base, 4x base... até ORACLE_OUTBOX_RETRY_MAX_SECONDS"""
+    base = getattr(settings, 'ORACLE_OUTBOX_RETRY_BASE_SECONDS', 30)
+    return min(base * (2 ** max(attempts - 1, 0)), getattr(settings, 'ORACLE_OUTBOX_RETRY_MAX_SECONDS', 3600))
+
+
+def _finish(entry: OracleSyncOutbox, error: Optional[str] = None, retry: bool = True, skipped: bool = False):
+    """Marca a linha como sincronizada (ou dispensada), reprogramada ou falha definitiva"""
+    now = timezone.now()
+    entry.locked_at = None
+    entry.last_error = error
+
+    if error is None or skipped:
+        entry.status = OracleSyncOutbox.STATUS_DONE
+        entry.processed_at = now
+    elif retry and entry.attempts < getattr(settings, 'ORACLE_OUTBOX_MAX_ATTEMPTS', 8):
+        entry.status = OracleSyncOutbox.STATUS_PENDING
+        entry.next_attempt_at = now + timedelta(seconds=retry_delay(entry.attempts))
+    else:
+        entry.status = OracleSyncOutbox.STATUS_FAILED
+        entry.processed_at = now
+
+
+def _sync_group(user, entries: List[OracleSyncOutbox]):
+    """Entradas de um mesmo usuário: uma chamada (uma sessão) ao Oracle"""
+    products = Product.objects.select_related('site').prefetch_related('images').in_bulk(
+        [entry.product_id for entry in entries]
+    )
+
+    # Um envio por SKU: vale o produto atualizado por último
+    product_by_sku: Dict[str, Product] = {}
+    entries_by_sku: Dict[str, List[OracleSyncOutbox]] = OrderedDict()
+
+    for entry in entries:
+        product = products.get(entry.product_id)
+
+        if product is None or product.status != 2:
+            # Reprovado/removido depois de aprovado: nada a enviar
+            _finish(entry, 'Produto não está mais aprovado', skipped=True)
+            continue
+
+        if not product.sku_code:
+            _finish(entry, 'Produto sem sku_code', retry=False)
+            continue
+
+        current = product_by_sku.get(product.sku_code)
+        if current is None or product.updated_at > current.updated_at:
+            product_by_sku[product.sku_code] = product
+        entries_by_sku.setdefault(product.sku_code, []).append(entry)
+
+    if not product_by_sku:
+        return
+
+    cod_usuario, password = oracle_credentials_for_user(user)
+    serialized = ProductSerializer(list(product_by_sku.values()), many=True, context={'request': None}).data
+
+    try:
+        result = sync_products_to_oracle(serialized, cod_usuario=cod_usuario, password=password)
+    except Exception as e:
+        traceback.print_exc()
+        result = {'skus': {}, 'errors': [str(e)]}
+
+    # SKU sem resultado = falha antes do lote (ex.: conexão); tenta de novo depois
+    general_error = result['errors'][-1] if result['errors'] else 'Não sincronizado'
+    for sku, sku_entries in entries_by_sku.items():
+        error = result['skus'][sku] if sku in result['skus'] else general_error
+        for entry in sku_entries:
+            _finish(entry, error)
+
+
+RESULT_FIELDS = ['status', 'attempts', 'next_attempt_at', 'last_error', 'locked_at', 'processed_at']
+
+
+def _supersede(entry: OracleSyncOutbox):
+    """Já existe outra linha pendente do produto (aprovado de novo): esta sai"""
+    entry.status = OracleSyncOutbox.STATUS_DONE
+    entry.processed_at = timezone.now()
+    entry.locked_at = None
+    entry.last_error = 'Substituída por aprovação mais recente'
+    entry.save(update_fields=RESULT_FIELDS)
+
+
+def process_outbox_batch(entries: List[OracleSyncOutbox]) -> Dict[str, int]:
+    """Envia um lote reservado por claim_outbox_batch e grava o resultado de cada linha"""
+    groups: Dict[Any, List[OracleSyncOutbox]] = OrderedDict()
+    for entry in entries:
+        groups.setdefault(entry.requested_by_id, []).append(entry)
+
+    # Usuários (e senha Oracle) do lote numa consulta só
+    users = User.objects.select_related('customuser').in_bulk([user_id for user_id in groups if user_id])
+    for user_id, group in groups.items():
+        _sync_group(users.get(user_id), group)
+
+    # Finalizadas em lote; reprogramadas uma a uma (savepoint): o produto pode
+    # ter sido aprovado de novo durante o envio e já ter outra linha pendente
+    retries = [entry for entry in entries if entry.status == OracleSyncOutbox.STATUS_PENDING]
+    OracleSyncOutbox.objects.bulk_update(
+        [entry for entry in entries if entry.status != OracleSyncOutbox.STATUS_PENDING], RESULT_FIELDS
+    )
+    for entry in retries:
+        try:
+            with transaction.atomic():
+                entry.save(update_fields=RESULT_FIELDS)
+        except IntegrityError:
+            _supersede(entry)
+
+    counts = {'done': 0, 'retry': 0, 'failed': 0}
+    for entry in entries:
+        if entry.status == OracleSyncOutbox.STATUS_DONE:
+            counts['done'] += 1
+        elif entry.status == OracleSyncOutbox.STATUS_PENDING:
+            counts['retry'] += 1
+        else:
+            counts['failed'] += 1
+    return counts
+
+
+def requeue_stale_outbox() -> int:
+    """Linhas 'processing' de drenadores que morreram voltam a ficar pendentes"""
+    stale_before = timezone.now() - timedelta(minutes=getattr(settings, 'ORACLE_OUTBOX_STALE_MINUTES', 10))
+    stale = OracleSyncOutbox.objects.filter(status=OracleSyncOutbox.STATUS_PROCESSING, locked_at__lt=stale_before)
+
+    requeued = 0
+    for entry in stale:
+        try:
+            with transaction.atomic():
+                requeued += OracleSyncOutbox.objects.filter(id=entry.id).update(
+                    status=OracleSyncOutbox.STATUS_PENDING, worker=None, locked_at=None
+                )
+        except IntegrityError:
+            _supersede(entry)
+
+    if requeued:
+        print(f"♻️  Outbox Oracle: {requeued} linhas órfãs voltaram para a fila")
+    return requeued
+
+
+def purge_outbox(days: Optional[int] = None) -> int:
+    """Remove linhas sincronizadas há mais de ORACLE_OUTBOX_KEEP_DAYS"""
+    days = days if days is not None else getattr(settings, 'ORACLE_OUTBOX_KEEP_DAYS', 7)
+    deleted, _ = OracleSyncOutbox.objects.filter(
+        status=OracleSyncOutbox.STATUS_DONE,
+        processed_at__lt=timezone.now() - timedelta(days=days)
+    ).delete()
+    return deleted
+
+
+def outbox_stats() -> Dict[str, Any]:
+    """Backlog por status e atraso (aprovação -> Oracle) da última hora"""
+    now = timezone.now()
+    counts = dict(
+        OracleSyncOutbox.objects.values_list('status').annotate(total=Count('id')).order_by()
+    )
+    oldest_pending = OracleSyncOutbox.objects.filter(
+        status=OracleSyncOutbox.STATUS_PENDING
+    ).aggregate(oldest=Min('created_at'))['oldest']
+    recent = OracleSyncOutbox.objects.filter(
+        status=OracleSyncOutbox.STATUS_DONE,
+        processed_at__gte=now - timedelta(hours=1)
+    ).aggregate(
+        synced=Count('id'),
+        lag_avg=Avg(F('processed_at') - F('created_at')),
+        lag_max=Max(F('processed_at') - F('created_at')),
+    )
+
+    return {
+        'enabled': oracle_outbox_enabled(),
+        'pending': counts.get(OracleSyncOutbox.STATUS_PENDING, 0),
+        'processing': counts.get(OracleSyncOutbox.STATUS_PROCESSING, 0),
+        'failed': counts.get(OracleSyncOutbox.STATUS_FAILED, 0),
+        'done': counts.get(OracleSyncOutbox.STATUS_DONE, 0),
+        'oldest_pending_seconds': round((now - oldest_pending).total_seconds(), 1) if oldest_pending else None,
+        'synced_last_hour': recent['synced'],
+        'lag_seconds_avg': round(recent['lag_avg'].total_seconds(), 1) if recent['lag_avg'] else None,
+        'lag_seconds_max': round(recent['lag_max'].total_seconds(), 1) if recent['lag_max'] else None,
+    }
@@ -0,0 +1,318 @@
+# products/services/product_persistence.py
+
+"""
+Persistência incremental dos produtos extraídos
+
+- compute_content_fingerprint: hash do conteúdo normalizado (nome, preço,
+  descrição, especificações, lista de URLs de imagens)
+- page_fingerprint: hash do HTML da página; se a página é a mesma da
+  última extração (ex.: veio do cache HTTP), o parse inteiro é pulado
+- upsert_scraped_products: grava o lote inteiro em uma transação
+  (bulk_create com update_conflicts em (url, site)); conteúdo igual =
+  nada de escrita e nada de imagens
+"""
+
+import hashlib
+import json
+import re
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict, Iterable, List, Optional
+
+from django.db import transaction
+from django.utils import timezone
+
+from products.models import Product
+from sites.models import Site
+
+
+# Campos do scraped_data que mudam a cada execução (não são conteúdo)
+VOLATILE_SCRAPED_KEYS = {'scraped_at', 'extraction_method'}
+
+# Resultado por linha do upsert em lote
+ROW_CREATED = 'created'
+ROW_UPDATED = 'updated'
+ROW_UNCHANGED = 'unchanged'
+ROW_DUPLICATE = 'duplicate'
+ROW_SKIPPED = 'skipped'
+ROW_ERROR = 'error'
+
+# Colunas regravadas quando (url, site) já existe (imagens e created_at ficam)
+UPSERT_UPDATE_FIELDS = [
+    'name', 'price', 'original_price', 'description', 'sku_code', 'brand', 'category',
+    'availability', 'search_query', 'scraped_data', 'content_fingerprint', 'status', 'updated_at',
+]
+
+
+def _normalize_text(value: Any) -> str:
+    return re.sub(r'\s+', ' ', str(value or '')).strip()
+
+
+def _normalize_price(value: Any) -> Optional[Decimal]:
+    if value in (None, ''):
+        return None
+    try:
+        price = Decimal(str(value)).quantize(Decimal('0.01'))
+    except (InvalidOperation, ValueError):
+        return None
+    return price if price else None
+
+
+def _image_urls(product_data: Dict[str, Any]) -> List[str]:
+    return list(product_data.get('images') or product_data.get('image_urls') or [])
+
+
+def compute_content_fingerprint(product_data: Dict[str, Any]) -> str:
+    """
+    Fingerprint do conteúdo do produto (independe de espaços e formatação do preço)
+
+    As imagens ficam de fora: a lista vem cortada pelo max_images da busca,
+    e buscas do mesmo produto com limites diferentes não são alteração.
+    """
+    price = _normalize_price(product_data.get('price'))
+    old_price = _normalize_price(product_data.get('old_price'))
+    normalized = {
+        'name': _normalize_text(product_data.get('name')),
+        'price': str(price) if price is not None else None,
+        'old_price': str(old_price) if old_price is not None else None,
+        'description': _normalize_text(product_data.get('description')),
+        'specifications': {
+            _normalize_text(key): _normalize_text(value)
+            for key, value in (product_data.get('specifications') or {}).items()
+        },
+    }
+    encoded = json.dumps(normalized, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def page_fingerprint(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+def load_known_pages(site: Site, urls: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Produtos já extraídos, por URL: fingerprint da página e um snapshot
+    dos dados (usado quando a página não mudou e o parse é pulado)
+
+    Roda na thread principal, antes do processamento concorrente.
+    """
+    known = {}
+    products = Product.objects.filter(site=site, url__in=list(urls)).exclude(content_fingerprint__isnull=True)
+
+    for product in products:
+        scraped = product.scraped_data or {}
+        if not scraped.get('page_fingerprint'):
+            continue
+
+        known[product.url] = {
+            'page_fingerprint': scraped['page_fingerprint'],
+            'snapshot': {
+                'url': product.url,
+                'name': product.name,
+                'price': product.price,
+                'old_price': product.original_price,
+                'description': product.description or '',
+                'short_description': scraped.get('short_description', ''),
+                'sku': product.sku_code or '',
+                'brand': product.brand or '',
+                'category': product.category or '',
+                'stock_status': scraped.get('stock_status', ''),
+                'specifications': scraped.get('specifications', {}),
+                'images': scraped.get('image_urls', []),
+                'image_source': scraped.get('image_source'),
+                'content_fingerprint': product.content_fingerprint,
+                'page_fingerprint': scraped['page_fingerprint'],
+                'unchanged_page': True,
+            }
+        }
+
+    return known
+
+
+def build_product_fields(product_data: Dict[str, Any], query: str, extraction_method: str) -> Dict[str, Any]:
+    """Valores dos campos do Product a partir dos dados extraídos"""
+    scraped_data = {
+        'specifications': product_data.get('specifications', {}),
+        'short_description': product_data.get('short_description', ''),
+        'stock_status': product_data.get('stock_status', ''),
+        'image_urls': _image_urls(product_data),
+        'image_source': product_data.get('image_source'),  # magento_json | browser | html_fallback | none
+        'page_fingerprint': product_data.get('page_fingerprint'),
+        'currency': 'Gs.',
+        'extraction_method': extraction_method,
+        'scraped_at': timezone.now().isoformat()
+    }
+
+    return {
+        'name': product_data.get('name', 'Produto sem nome')[:300],
+        'price': _normalize_price(product_data.get('price')),
+        'original_price': _normalize_price(product_data.get('old_price')),
+        'description': product_data.get('description', ''),
+        'sku_code': product_data.get('sku', '') or product_data.get('sku_code', ''),
+        'brand': product_data.get('brand', ''),
+        'category': product_data.get('category', ''),
+        'availability': product_data.get('stock_status', 'in_stock'),
+        'search_query': query,
+        'scraped_data': scraped_data,
+    }
+
+
+def _content_of(scraped_data: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    return {k: v for k, v in (scraped_data or {}).items() if k not in VOLATILE_SCRAPED_KEYS}
+
+
+def changed_fields(product: Product, fields: Dict[str, Any]) -> List[str]:
+    """Campos cujo valor novo difere do gravado"""
+    changed = []
+    for name, value in fields.items():
+        current = getattr(product, name)
+        if name == 'scraped_data':
+            if _content_of(current) != _content_of(value):
+                changed.append(name)
+        elif name in ('price', 'original_price'):
+            if _normalize_price(current) != value:
+                changed.append(name)
+        elif (current or '') != (value or ''):
+            changed.append(name)
+    return changed
+
+
+def _outcome(index: int, url: str, status: str, product: Optional[Product] = None, **extra) -> Dict[str, Any]:
+    outcome = {
+        'index': index,
+        'url': url,
+        'status': status,
+        'product': product,
+        'changed_fields': [],
+        'image_urls': [],
+        'error': None,
+    }
+    outcome.update(extra)
+    return outcome
+
+
+def upsert_scraped_products(
+    rows: List[Dict[str, Any]],
+    site: Site,
+    query: str,
+    max_images: int,
+    extraction_method: str
+) -> List[Dict[str, Any]]:
+    """
+    Grava um lote de produtos extraídos em uma transação
+
+    - 1 SELECT para os produtos já existentes (url, site)
+    - 1 INSERT ... ON CONFLICT (url, site) DO UPDATE para novos + alterados
+    - 1 UPDATE em lote para os sem alteração que só mudaram de busca
+
+    Returns:
+        Um resultado por linha, na ordem de rows:
+        {'index', 'url', 'status', 'product', 'changed_fields', 'image_urls', 'error'}
+        status: created | updated | unchanged | duplicate | skipped | error
+        (image_urls vazio quando as imagens não precisam ser revistas)
+    """
+    outcomes: List[Optional[Dict[str, Any]]] = [None] * len(rows)
+    first_index_by_url: Dict[str, int] = {}
+
+    for index, product_data in enumerate(rows):
+        url = product_data.get('url', '')
+        if not url:
+            outcomes[index] = _outcome(index, '', ROW_SKIPPED, error='URL vazia')
+        elif url in first_index_by_url:
+            # Mesmo produto duas vezes no lote: ON CONFLICT não atualiza a mesma linha duas vezes
+            outcomes[index] = _outcome(index, url, ROW_DUPLICATE)
+        else:
+            first_index_by_url[url] = index
+
+    existing = {
+        product.url: product
+        for product in Product.objects.filter(site=site, url__in=list(first_index_by_url))
+    }
+
+    to_upsert: List[Product] = []  # Linhas do INSERT ... ON CONFLICT
+    touched: List[Product] = []  # Sem alteração, mas com search_query/page_fingerprint novos
+    now = timezone.now()
+
+    for url, index in first_index_by_url.items():
+        product_data = rows[index]
+        fingerprint = product_data.get('content_fingerprint') or compute_content_fingerprint(product_data)
+        image_urls = _image_urls(product_data)[:max_images]
+        current = existing.get(url)
+
+        if current is not None and current.content_fingerprint == fingerprint:
+            touched_fields = []
+            if current.search_query != query:
+                current.search_query = query
+                touched_fields.append('search_query')
+
+            scraped = current.scraped_data or {}
+            new_page_fingerprint = product_data.get('page_fingerprint')
+            if new_page_fingerprint and scraped.get('page_fingerprint') != new_page_fingerprint:
+                current.scraped_data = {**scraped, 'page_fingerprint': new_page_fingerprint}
+                touched_fields.append('scraped_data')
+
+            if touched_fields:
+                touched.append(current)
+
+            outcomes[index] = _outcome(
+                index, url, ROW_UNCHANGED, current,
+                changed_fields=touched_fields,
+                # Imagens só são revistas se nunca chegaram a ser salvas
+                image_urls=[] if current.main_image else image_urls
+            )
+            continue
+
+        fields = build_product_fields(product_data, query, extraction_method)
+        row = Product(
+            url=url,
+            site=site,
+            content_fingerprint=fingerprint,
+            status=1,  # Conteúdo novo/alterado: precisa ser sincronizado com o Oracle
+            updated_at=now,
+            **fields
+        )
+        to_upsert.append(row)
+
+        if current is None:
+            outcomes[index] = _outcome(index, url, ROW_CREATED, row, changed_fields=list(fields), image_urls=image_urls)
+        else:
+            changed = changed_fields(current, fields)
+            for name, value in fields.items():
+                setattr(current, name, value)
+            current.content_fingerprint = fingerprint
+            current.status = 1
+            current.updated_at = now
+            outcomes[index] = _outcome(index, url, ROW_UPDATED, current, changed_fields=changed, image_urls=image_urls)
+
+    with transaction.atomic():
+        if to_upsert:
+            Product.objects.bulk_create(
+                to_upsert,
+                update_conflicts=True,
+                unique_fields=['url', 'site'],
+                update_fields=UPSERT_UPDATE_FIELDS,
+            )
+        if touched:
+            Product.objects.bulk_update(touched, ['search_query', 'scraped_data'])
+
+    # Duplicados apontam para o produto da primeira ocorrência
+    for index, outcome in enumerate(outcomes):
+        if outcome['status'] == ROW_DUPLICATE:
+            outcome['product'] = outcomes[first_index_by_url[outcome['url']]]['product']
+
+    counts = {}
+    for outcome in outcomes:
+        counts[outcome['status']] = counts.get(outcome['status'], 0) + 1
+    print(f"   💾 Upsert em lote: {len(rows)} linhas -> {counts}")
+
+    return outcomes
+
+
+def upsert_scraped_product(
+    product_data: Dict[str, Any],
+    site: Site,
+    query: str,
+    max_images: int,
+    extraction_method: str
+) -> Dict[str, Any]:
+    """Atalho para um único produto (mesmo resultado de upsert_scraped_products)"""
+    return upsert_scraped_products([product_data], site, query, max_images, extraction_method)[0]
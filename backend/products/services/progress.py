@@ -0,0 +1,92 @@
+# products/services/progress.py
+
+"""
+Eventos estruturados de progresso do scraping
+
+O extrator e o serviço de busca chamam progress.emit(tipo, **dados).
+- ProgressReporter: não faz nada (busca síncrona, testes, commands)
+- JobProgressReporter: grava ScrapeJobEvent, lido pelo WebSocket/SSE
+"""
+
+from datetime import timedelta
+from typing import Any, List, Optional, Tuple
+
+from django.utils import timezone
+
+from products.models import ScrapeJob, ScrapeJobEvent
+
+
+# Tipos de evento
+EVENT_JOB_STATUS = 'job_status'
+EVENT_PHASE = 'phase'
+EVENT_PRODUCT_PARSED = 'product_parsed'
+EVENT_PRODUCT_SAVED = 'product_saved'
+EVENT_IMAGE_SAVED = 'image_saved'
+EVENT_ERROR = 'error'
+
+FINISHED_EVENT_GRACE_SECONDS = 5
+
+
+class ProgressReporter:
+    """Reporter padrão: descarta os eventos"""
+
+    def emit(self, event_type: str, **payload: Any):
+        pass
+
+
+class JobProgressReporter(ProgressReporter):
+    """Grava os eventos do job no banco (workers rodam em outro processo)"""
+
+    def __init__(self, job: ScrapeJob):
+        self.job = job
+
+    def emit(self, event_type: str, **payload: Any):
+        try:
+            ScrapeJobEvent.objects.create(job=self.job, event_type=event_type, payload=payload)
+        except Exception as e:
+            # Progresso nunca pode derrubar o scraping
+            print(f"⚠️  Falha ao registrar evento '{event_type}' do job {self.job.id}: {e}")
+
+
+def fetch_job_events(after_id: int = 0, job_id: Optional[int] = None, user=None, limit: int = 200) -> List[ScrapeJobEvent]:
+    """Eventos com id > after_id (de um job ou de todos os jobs do usuário)"""
+    events = ScrapeJobEvent.objects.filter(id__gt=after_id)
+
+    if job_id is not None:
+        events = events.filter(job_id=job_id)
+    elif user is not None:
+        events = events.filter(job__requested_by=user)
+
+    return list(events.order_by('id')[:limit])
+
+
+def last_event_id() -> int:
+    """Último id de evento (novas conexões de /ws/sessions/ começam daqui)"""
+    return ScrapeJobEvent.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def parse_event_id(raw: Optional[str]) -> int:
+    """Last-Event-ID / ?after= vindo do cliente (inválido = desde o início)"""
+    try:
+        return max(int(raw or 0), 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def job_stream_should_close(job_id: int, idle_seconds: float, idle_timeout: float) -> Tuple[bool, str]:
+    """
+    Stream sem eventos novos: encerra se o job já terminou (status no banco,
+    mesmo sem o evento final) ou se está parado há mais de idle_timeout
+    (worker morto: o job fica 'running' até o requeue_stale_jobs)
+    """
+    job = ScrapeJob.objects.filter(id=job_id).values('status', 'finished_at').first()
+    if job is None:
+        return True, 'finished'
+    if job['status'] in (ScrapeJob.STATUS_DONE, ScrapeJob.STATUS_FAILED):
+        # O evento final é gravado logo depois do status: alguns segundos de carência
+        finished_at = job['finished_at']
+        if finished_at is None or timezone.now() - finished_at > timedelta(seconds=FINISHED_EVENT_GRACE_SECONDS):
+            return True, 'finished'
+    if idle_timeout and idle_seconds >= idle_timeout:
+        return True, 'idle_timeout'
+    return False, ''
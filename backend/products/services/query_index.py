@@ -0,0 +1,86 @@
+# products/services/query_index.py
+
+"""
+Índice busca -> produtos (QueryRun / QueryHit)
+
+Product.search_query guarda só a última busca que encontrou o produto e
+search_query__icontains não usa índice. Cada busca executada vira um
+QueryRun (query normalizada + site) com um QueryHit por produto
+encontrado (posição na listagem e quando foi visto). As views resolvem
+"produtos desta busca" por products_for_query: índice (query, site) em
+QueryRun e join pelo id nos hits.
+"""
+
+from typing import Iterable, List, Optional, Union
+
+from django.db.models import Max, Min, QuerySet
+
+from products.models import Product, QueryHit, QueryRun
+from sites.models import Site
+
+
+def normalize_query(query: str) -> str:
+    """Minúsculas e espaços simples (mesma busca escrita de jeitos diferentes)"""
+    return ' '.join((query or '').lower().split())[:200]
+
+
+def start_query_run(site: Site, query: str) -> QueryRun:
+    return QueryRun.objects.create(query=normalize_query(query), raw_query=(query or '')[:200], site=site)
+
+
+def add_query_hits(run: QueryRun, products: Iterable[Product], first_rank: int = 1, ranks: Optional[List[int]] = None):
+    """
+    Registra os produtos encontrados pela busca (em ordem de listagem)
+
+    ranks: posição de cada produto na listagem; sem ela usa a ordem
+    recebida a partir de first_rank. Produto repetido no mesmo run é ignorado.
+    """
+    products = list(products)
+    ranks = ranks or list(range(first_rank, first_rank + len(products)))
+    QueryHit.objects.bulk_create(
+        [QueryHit(run=run, product=product, rank=rank) for product, rank in zip(products, ranks)],
+        ignore_conflicts=True,
+    )
+
+
+def record_query_run(site: Site, query: str, products: Iterable[Union[Product, str]]) -> Optional[QueryRun]:
+    """
+    QueryRun completo de uma vez (scrapers que devolvem a lista inteira)
+
+    products: Product ou URLs (resolvidas no site; URLs não salvas são puladas)
+    """
+    products = [product for product in products if product]
+    urls = [product for product in products if isinstance(product, str)]
+
+    if urls:
+        # url não é unique (in_bulk não serve): com duplicados fica o último
+        by_url = {product.url: product for product in Product.objects.filter(site=site, url__in=urls).order_by('id')}
+        products = [by_url.get(product) if isinstance(product, str) else product for product in products]
+        products = [product for product in products if product is not None]
+
+    if not products:
+        return None
+
+    run = start_query_run(site, query)
+    add_query_hits(run, products)
+    return run
+
+
+def products_for_query(query: str, site: Optional[Site] = None) -> QuerySet:
+    """
+    Produtos já encontrados pela busca (em qualquer execução), mais recentes primeiro
+
+    Ordena pela última vez em que a busca viu o produto e, empatado, pela
+    melhor posição na listagem.
+    """
+    filters = {'query_hits__run__query': normalize_query(query)}
+    if site is not None:
+        filters['query_hits__run__site'] = site
+
+    # filter() antes de annotate(): Max/Min só consideram os hits desta busca
+    return (
+        Product.objects
+        .filter(**filters)
+        .annotate(last_seen_at=Max('query_hits__seen_at'), best_rank=Min('query_hits__rank'))
+        .order_by('-last_seen_at', 'best_rank')
+    )
@@ -0,0 +1,486 @@
+# products/services/rate_limiter.py
+
+"""
+Rate limiter adaptativo por host (token bucket + AIMD)
+
+Substitui os time.sleep() fixos entre produtos e imagens: cada host tem
+um balde de tokens (ritmo) e um limite de requisições simultâneas
+(concorrência). Os dois se ajustam sozinhos pelo que o site responde:
+
+- Aumento aditivo: respostas rápidas (latência média abaixo de
+  SCRAPE_LATENCY_TARGET_MS) sobem o ritmo um pouco a cada sucesso e a
+  concorrência em ~1 a cada "janela" de requisições
+- Redução multiplicativa: 429/503/5xx, erros de conexão ou latência
+  acima do alvo cortam ritmo e concorrência (no máximo uma vez por
+  segundo, para uma rajada de erros não zerar tudo)
+- Retry-After: o host fica pausado pelo tempo pedido pelo site
+
+Requisições concorrentes consomem o mesmo balde, então o ritmo total
+respeita o site independente de quantos workers estão rodando.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+from urllib.parse import urlparse
+
+import requests
+from django.conf import settings
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+
+from products.services.circuit_breaker import CircuitBreakerRegistry, get_circuit_breakers
+
+
+THROTTLE_STATUSES = {429, 503}
+
+MAX_RETRY_AFTER = 120  # Segundos; Retry-After maior que isso é limitado
+DECREASE_FACTOR = 0.5
+SLOW_DECREASE_FACTOR = 0.9  # Latência acima do alvo (sem erro)
+DECREASE_COOLDOWN = 1.0  # Segundos entre reduções do mesmo host
+LATENCY_EWMA_ALPHA = 0.2
+RATE_INCREASE_STEP = 0.05  # Requisições/segundo a mais por resposta rápida
+
+
+class SlotTimeout(requests.Timeout):
+    """Nenhuma vaga do host liberou dentro do tempo da requisição (não é falha do host)"""
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After em segundos (aceita número ou data HTTP)"""
+    if not value:
+        return None
+    value = str(value).strip()
+    if value.isdigit():
+        return min(float(value), MAX_RETRY_AFTER)
+    try:
+        delta = (parsedate_to_datetime(value) - timezone.now()).total_seconds()
+    except (TypeError, ValueError):
+        return None
+    return min(max(delta, 0.0), MAX_RETRY_AFTER)
+
+
+class TokenBucket:
+    """Balde de tokens thread-safe (rate pode mudar em tempo de execução)"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate  # Tokens por segundo
+        self.capacity = capacity  # Rajada máxima
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+        # Métricas
+        self.acquired = 0
+        self.waited_seconds = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def set_rate(self, rate: float):
+        with self._lock:
+            self._refill()
+            self.rate = rate
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """
+        Bloqueia até haver tokens disponíveis.
+
+        Returns:
+            Segundos esperados
+        """
+        waited = 0.0
+
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    self.acquired += 1
+                    self.waited_seconds += waited
+                    return waited
+                # Espera curta: o rate pode subir/cair enquanto isso
+                wait = min((tokens - self.tokens) / self.rate, 1.0)
+
+            time.sleep(wait)
+            waited += wait
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._refill()
+            return {
+                'rate_per_second': round(self.rate, 3),
+                'burst': self.capacity,
+                'tokens_available': round(self.tokens, 2),
+                'acquired': self.acquired,
+                'waited_seconds': round(self.waited_seconds, 2),
+            }
+
+
+class HostState:
+    """Ritmo, concorrência e sinais observados de um host"""
+
+    def __init__(
+        self,
+        rate: float,
+        burst: float,
+        min_rate: float,
+        max_rate: float,
+        concurrency: int,
+        max_concurrency: int,
+        latency_target: float
+    ):
+        self.bucket = TokenBucket(rate, burst)
+        self.min_rate = min_rate
+        self.max_rate = max(max_rate, rate)
+        self.concurrency_limit = float(max(concurrency, 1))
+        self.max_concurrency = max(max_concurrency, concurrency, 1)
+        self.latency_target = latency_target
+
+        self.in_flight = 0
+        self.paused_until = 0.0  # monotonic (Retry-After)
+        self.latency_ewma: Optional[float] = None
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+        # Métricas
+        self.successes = 0
+        self.throttled = 0
+        self.errors = 0
+        self.decreases = 0
+        self.slot_waited_seconds = 0.0
+
+    # ------------------------------------------------------------------
+    # Espera (ritmo + pausa do Retry-After + vaga de concorrência)
+    # ------------------------------------------------------------------
+
+    def _wait_pause(self) -> float:
+        waited = 0.0
+        while True:
+            with self._cond:
+                remaining = self.paused_until - time.monotonic()
+            if remaining <= 0:
+                return waited
+            time.sleep(min(remaining, 1.0))
+            waited += min(remaining, 1.0)
+
+    def wait(self) -> float:
+        """Só o ritmo (sem ocupar vaga de concorrência)"""
+        return self._wait_pause() + self.bucket.acquire()
+
+    def acquire(self, timeout: Optional[float] = None) -> float:
+        """
+        Ocupa uma vaga de concorrência e um token; devolver com release()
+
+        timeout: espera máxima pela vaga (prazo da busca / timeout da
+        requisição); esgotado, levanta SlotTimeout sem ocupar a vaga
+        """
+        waited = self._wait_pause()
+
+        start = time.monotonic()
+        with self._cond:
+            while self.in_flight >= int(self.concurrency_limit):
+                remaining = start + timeout - time.monotonic() if timeout is not None else 1.0
+                if remaining <= 0:
+                    raise SlotTimeout(f"Sem vaga de concorrência para o host em {timeout:.1f}s")
+                self._cond.wait(timeout=min(remaining, 1.0))
+            self.in_flight += 1
+            self.slot_waited_seconds += time.monotonic() - start
+        waited += time.monotonic() - start
+
+        try:
+            return waited + self.bucket.acquire()
+        except BaseException:
+            self.release()
+            raise
+
+    def release(self):
+        with self._cond:
+            self.in_flight = max(self.in_flight - 1, 0)
+            self._cond.notify_all()
+
+    # ------------------------------------------------------------------
+    # AIMD
+    # ------------------------------------------------------------------
+
+    def _decrease(self, factor: float):
+        """Redução multiplicativa (no máximo uma por DECREASE_COOLDOWN)"""
+        now = time.monotonic()
+        if now - self._last_decrease < DECREASE_COOLDOWN:
+            return
+        self._last_decrease = now
+        self.decreases += 1
+        self.concurrency_limit = max(1.0, self.concurrency_limit * factor)
+        self.bucket.set_rate(max(self.min_rate, self.bucket.rate * factor))
+
+    def _increase(self):
+        """Aumento aditivo: +1 de concorrência por janela, +RATE_INCREASE_STEP de ritmo por sucesso"""
+        self.concurrency_limit = min(float(self.max_concurrency), self.concurrency_limit + 1.0 / self.concurrency_limit)
+        self.bucket.set_rate(min(self.max_rate, self.bucket.rate + RATE_INCREASE_STEP))
+
+    def record(
+        self,
+        status_code: Optional[int] = None,
+        latency: Optional[float] = None,
+        retry_after: Optional[float] = None,
+        error: bool = False
+    ):
+        with self._cond:
+            if retry_after:
+                self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+
+            if error or status_code in THROTTLE_STATUSES or (status_code is not None and status_code >= 500):
+                if status_code in THROTTLE_STATUSES:
+                    self.throttled += 1
+                else:
+                    self.errors += 1
+                self._decrease(DECREASE_FACTOR)
+                return
+
+            if latency is not None:
+                self.latency_ewma = latency if self.latency_ewma is None else (
+                    LATENCY_EWMA_ALPHA * latency + (1 - LATENCY_EWMA_ALPHA) * self.latency_ewma
+                )
+
+            self.successes += 1
+            if self.latency_ewma is not None and self.latency_ewma > self.latency_target:
+                self._decrease(SLOW_DECREASE_FACTOR)
+            else:
+                self._increase()
+
+            self._cond.notify_all()  # Limite pode ter subido
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            stats = {
+                'concurrency_limit': int(self.concurrency_limit),
+                'max_concurrency': self.max_concurrency,
+                'in_flight': self.in_flight,
+                'latency_ewma_ms': round(self.latency_ewma * 1000, 1) if self.latency_ewma is not None else None,
+                'latency_target_ms': round(self.latency_target * 1000, 1),
+                'paused_for_seconds': round(max(self.paused_until - time.monotonic(), 0.0), 2),
+                'successes': self.successes,
+                'throttled': self.throttled,
+                'errors': self.errors,
+                'decreases': self.decreases,
+                'slot_waited_seconds': round(self.slot_waited_seconds, 2),
+            }
+        stats.update(self.bucket.stats())
+        stats['min_rate'] = self.min_rate
+        stats['max_rate'] = self.max_rate
+        return stats
+
+
+class RequestSlot:
+    """Vaga emprestada por HostRateLimiter.slot(); record() informa o resultado"""
+
+    def __init__(self, limiter: 'HostRateLimiter', url: str):
+        self.limiter = limiter
+        self.url = url
+        self.started_at = time.monotonic()
+        self.recorded = False
+
+    def record(self, status_code: Optional[int] = None, retry_after: Optional[str] = None, error: bool = False):
+        self.recorded = True
+        self.limiter.record(
+            self.url,
+            status_code=status_code,
+            latency=time.monotonic() - self.started_at,
+            retry_after=parse_retry_after(retry_after),
+            error=error
+        )
+
+
+class HostRateLimiter:
+    """
+    Um HostState por host.
+
+    Uso (ritmo + concorrência + feedback):
+        limiter = get_rate_limiter()
+        with limiter.slot(url) as slot:
+            response = session.get(url)
+            slot.record(response.status_code, response.headers.get('Retry-After'))
+
+    Uso só de ritmo:
+        limiter.wait(url)  # antes de cada requisição
+        limiter.record(url, status_code=..., latency=...)  # opcional
+    """
+
+    def __init__(
+        self,
+        rate_per_host: float = 2.0,
+        burst: float = 4.0,
+        min_rate: float = 0.2,
+        max_rate: float = 10.0,
+        concurrency: int = 4,
+        max_concurrency: int = 12,
+        latency_target: float = 1.5
+    ):
+        self.rate_per_host = rate_per_host
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.concurrency = concurrency
+        self.max_concurrency = max_concurrency
+        self.latency_target = latency_target
+        self._hosts: Dict[str, HostState] = {}
+        self._lock = threading.Lock()
+
+    def host_for(self, url: str) -> HostState:
+        host = urlparse(url).netloc or url
+
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is None:
+                state = HostState(
+                    rate=self.rate_per_host,
+                    burst=self.burst,
+                    min_rate=self.min_rate,
+                    max_rate=self.max_rate,
+                    concurrency=self.concurrency,
+                    max_concurrency=self.max_concurrency,
+                    latency_target=self.latency_target,
+                )
+                self._hosts[host] = state
+            return state
+
+    def bucket_for(self, url: str) -> TokenBucket:
+        return self.host_for(url).bucket
+
+    def wait(self, url: str) -> float:
+        """Aguarda a vez do host da URL. Retorna segundos esperados."""
+        return self.host_for(url).wait()
+
+    def acquire(self, url: str, timeout: Optional[float] = None) -> float:
+        return self.host_for(url).acquire(timeout)
+
+    def release(self, url: str):
+        self.host_for(url).release()
+
+    def record(
+        self,
+        url: str,
+        status_code: Optional[int] = None,
+        latency: Optional[float] = None,
+        retry_after: Optional[float] = None,
+        error: bool = False
+    ):
+        """Informa o resultado de uma requisição (ajusta ritmo/concorrência do host)"""
+        self.host_for(url).record(status_code=status_code, latency=latency, retry_after=retry_after, error=error)
+
+    @contextmanager
+    def slot(self, url: str, timeout: Optional[float] = None):
+        """Vaga de concorrência + token; exceção sem record() conta como erro"""
+        self.acquire(url, timeout)
+        slot = RequestSlot(self, url)
+        try:
+            yield slot
+        except Exception:
+            if not slot.recorded:
+                slot.record(error=True)
+            raise
+        finally:
+            self.release(url)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hosts = dict(self._hosts)
+        return {host: state.stats() for host, state in hosts.items()}
+
+
+class RateLimitedAdapter(HTTPAdapter):
+    """
+    HTTPAdapter que passa cada requisição pelo circuit breaker do host
+    (falha imediata com o circuito aberto) e pelo rate limiter (vaga +
+    token), devolvendo status/latência/Retry-After como feedback
+    """
+
+    def __init__(
+        self,
+        rate_limiter: Optional[HostRateLimiter] = None,
+        circuit_breakers: Optional[CircuitBreakerRegistry] = None,
+        **kwargs
+    ):
+        self.rate_limiter = rate_limiter
+        self.circuit_breakers = circuit_breakers
+        super().__init__(**kwargs)
+
+    def _limited_send(self, request, **kwargs):
+        if self.rate_limiter is None:
+            return super().send(request, **kwargs)
+
+        # Espera pela vaga limitada ao timeout de conexão da requisição
+        # (que já vem cortado pelo prazo da busca)
+        timeout = kwargs.get('timeout')
+        if isinstance(timeout, tuple):
+            timeout = timeout[0]
+
+        with self.rate_limiter.slot(request.url, timeout if isinstance(timeout, (int, float)) else None) as slot:
+            response = super().send(request, **kwargs)
+            slot.record(response.status_code, response.headers.get('Retry-After'))
+            return response
+
+    def _network_send(self, request, **kwargs):
+        breakers = self.circuit_breakers
+        if breakers is None:
+            return self._limited_send(request, **kwargs)
+
+        breakers.before_request(request.url)
+        try:
+            response = self._limited_send(request, **kwargs)
+        except SlotTimeout:
+            breakers.breaker_for(request.url).release_probe()
+            raise
+        except Exception as e:
+            breakers.record(request.url, error=f"{type(e).__name__}: {e}")
+            raise
+        breakers.record(request.url, status_code=response.status_code)
+        return response
+
+    def send(self, request, **kwargs):
+        return self._network_send(request, **kwargs)
+
+
+def mount_rate_limiter(
+    session,
+    rate_limiter: Optional[HostRateLimiter] = None,
+    circuit_breakers: Optional[CircuitBreakerRegistry] = None,
+    **adapter_kwargs
+) -> RateLimitedAdapter:
+    """Monta o RateLimitedAdapter na sessão (limiter e circuitos do processo por padrão)"""
+    adapter = RateLimitedAdapter(
+        rate_limiter or get_rate_limiter(),
+        circuit_breakers=circuit_breakers or get_circuit_breakers(),
+        **adapter_kwargs
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return adapter
+
+
+_limiter: Optional[HostRateLimiter] = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> HostRateLimiter:
+    """Rate limiter do processo (compartilhado por todos os scrapers)"""
+    global _limiter
+
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = HostRateLimiter(
+                    rate_per_host=getattr(settings, 'SCRAPE_RATE_PER_HOST', 2.0),
+                    burst=getattr(settings, 'SCRAPE_RATE_BURST', 4.0),
+                    min_rate=getattr(settings, 'SCRAPE_RATE_MIN', 0.2),
+                    max_rate=getattr(settings, 'SCRAPE_RATE_MAX', 10.0),
+                    concurrency=getattr(settings, 'SCRAPE_CONCURRENCY_PER_HOST', 4),
+                    max_concurrency=getattr(settings, 'SCRAPE_CONCURRENCY_MAX', 12),
+                    latency_target=getattr(settings, 'SCRAPE_LATENCY_TARGET_MS', 1500) / 1000,
+                )
+
+    return _limiter
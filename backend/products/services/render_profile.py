@@ -0,0 +1,161 @@
+# products/services/render_profile.py
+
+"""
+Perfil de renderização das páginas de galeria (Playwright)
+
+- Bloqueio de requisições: tipos de recurso desnecessários (imagens,
+  fontes, CSS, mídia) e qualquer host fora dos permitidos (analytics,
+  chat, pixels) são abortados antes de sair para a rede
+- goto com wait_until='domcontentloaded' (não espera a rede ficar ociosa)
+- Uma única espera combinada pela galeria (instância Fotorama com dados
+  ou miniaturas no DOM), no lugar de vários seletores em série e do
+  wait_for_timeout fixo
+- Tempo de cada etapa medido por página (RenderTiming)
+
+As URLs das imagens vêm dos atributos/dados da galeria, então abortar o
+download das imagens não muda o resultado.
+"""
+
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from django.conf import settings
+from playwright.sync_api import Error as PlaywrightError
+from playwright.sync_api import Page
+
+from products.services.deadline import NO_DEADLINE, Deadline
+
+
+DEFAULT_BLOCKED_RESOURCE_TYPES = ('image', 'media', 'font', 'stylesheet')
+
+# Verdadeiro quando a galeria já tem as URLs (executado dentro da página)
+GALLERY_READY_CONDITION = """
+() => {
+    try {
+        const gallery = document.querySelector('[data-gallery-role="gallery"], .fotorama');
+        if (gallery && window.jQuery) {
+            const fotorama = window.jQuery(gallery).data('fotorama');
+            if (fotorama && fotorama.data && fotorama.data.length) {
+                return true;
+            }
+        }
+    } catch (e) {}
+
+    return document.querySelectorAll(
+        '[data-gallery-role="nav-frame"] img[src], .fotorama__nav__frame img[src], .fotorama__stage img[src]'
+    ).length > 0;
+}
+"""
+
+
+@dataclass
+class RenderTiming:
+    """Tempos (ms) de uma página renderizada"""
+    url: str
+    goto_ms: float = 0.0
+    gallery_wait_ms: float = 0.0
+    extract_ms: float = 0.0
+    total_ms: float = 0.0
+    gallery_ready: bool = False
+    blocked_requests: int = 0
+    allowed_requests: int = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'url': self.url,
+            'goto_ms': round(self.goto_ms, 1),
+            'gallery_wait_ms': round(self.gallery_wait_ms, 1),
+            'extract_ms': round(self.extract_ms, 1),
+            'total_ms': round(self.total_ms, 1),
+            'gallery_ready': self.gallery_ready,
+            'blocked_requests': self.blocked_requests,
+            'allowed_requests': self.allowed_requests,
+        }
+
+
+@dataclass
+class RenderProfile:
+    blocked_resource_types: Tuple[str, ...] = DEFAULT_BLOCKED_RESOURCE_TYPES
+    allowed_hosts: Tuple[str, ...] = ('nissei.com',)  # Domínio e subdomínios; vazio = qualquer host
+    wait_until: str = 'domcontentloaded'
+    goto_timeout_ms: int = 20000
+    gallery_timeout_ms: int = 5000
+    block_requests: bool = True
+
+    def host_allowed(self, url: str) -> bool:
+        if not self.allowed_hosts:
+            return True
+        host = (urlparse(url).hostname or '').lower()
+        return any(host == allowed or host.endswith('.' + allowed) for allowed in self.allowed_hosts)
+
+    def should_block(self, resource_type: str, url: str) -> bool:
+        if url.startswith('data:'):
+            return False
+        return resource_type in self.blocked_resource_types or not self.host_allowed(url)
+
+    def install(self, page: Page, timing: RenderTiming):
+        """Intercepta as requisições da página (roda na thread do browser)"""
+        if not self.block_requests:
+            return
+
+        def handle(route):
+            request = route.request
+            try:
+                if self.should_block(request.resource_type, request.url):
+                    timing.blocked_requests += 1
+                    route.abort()
+                else:
+                    timing.allowed_requests += 1
+                    route.continue_()
+            except PlaywrightError:
+                # Página fechada no meio da requisição
+                pass
+
+        page.route('**/*', handle)
+
+    def render(self, page: Page, url: str, extract_script: str, deadline: Deadline = NO_DEADLINE) -> Tuple[List[str], RenderTiming]:
+        """
+        Carrega a página com o perfil, espera a galeria e executa extract_script
+        (timeouts limitados ao prazo restante da busca)
+
+        Returns:
+            (resultado do script, RenderTiming)
+        """
+        timing = RenderTiming(url=url)
+        start = time.time()
+        self.install(page, timing)
+
+        page.goto(url, wait_until=self.wait_until, timeout=deadline.timeout(self.goto_timeout_ms / 1000) * 1000)
+        after_goto = time.time()
+        timing.goto_ms = (after_goto - start) * 1000
+
+        try:
+            page.wait_for_function(GALLERY_READY_CONDITION, timeout=deadline.timeout(self.gallery_timeout_ms / 1000) * 1000)
+            timing.gallery_ready = True
+        except PlaywrightError:
+            # Sem galeria JS: o script ainda tenta as imagens estáticas do HTML
+            pass
+        after_wait = time.time()
+        timing.gallery_wait_ms = (after_wait - after_goto) * 1000
+
+        result = page.evaluate(extract_script)
+        timing.extract_ms = (time.time() - after_wait) * 1000
+        timing.total_ms = (time.time() - start) * 1000
+
+        return result, timing
+
+
+def get_render_profile(overrides: Optional[Dict[str, Any]] = None) -> RenderProfile:
+    """Perfil do settings.py (overrides substitui campos pontuais)"""
+    values = {
+        'blocked_resource_types': tuple(getattr(settings, 'RENDER_BLOCK_RESOURCE_TYPES', DEFAULT_BLOCKED_RESOURCE_TYPES)),
+        'allowed_hosts': tuple(getattr(settings, 'RENDER_ALLOWED_HOSTS', ('nissei.com',))),
+        'wait_until': getattr(settings, 'RENDER_WAIT_UNTIL', 'domcontentloaded'),
+        'goto_timeout_ms': getattr(settings, 'RENDER_GOTO_TIMEOUT_MS', 20000),
+        'gallery_timeout_ms': getattr(settings, 'RENDER_GALLERY_TIMEOUT_MS', 5000),
+        'block_requests': getattr(settings, 'RENDER_BLOCK_REQUESTS', True),
+    }
+    values.update(overrides or {})
+    return RenderProfile(**values)
@@ -0,0 +1,355 @@
+# products/services/scrape_jobs.py
+
+"""
+Fila de ScrapeJobs no próprio Postgres (sem broker externo)
+
+- enqueue_scrape_job: cria o job e retorna na hora (ou devolve o job
+  idêntico já em andamento)
+- run_coalesced_search: busca síncrona com single-flight; chamadas iguais
+  e simultâneas esperam o mesmo job em vez de raspar de novo
+- claim_next_job: worker pega o próximo job com SELECT ... FOR UPDATE SKIP LOCKED
+  (vários workers/processos nunca pegam o mesmo job)
+- execute_job: roda a busca detalhada e guarda o resumo em job.result,
+  renovando job.heartbeat_at enquanto roda (lease)
+- requeue_stale_jobs: devolve para a fila jobs cujo dono parou de renovar
+  o heartbeat (worker ou requisição que morreu)
+"""
+
+import hashlib
+import json
+import os
+import socket
+import threading
+import time
+import traceback
+from datetime import timedelta
+from typing import Any, Dict, Optional, Tuple
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from products.models import ScrapeJob
+from products.services.nissei_search_service import run_nissei_search, summarize_search_outcome
+from products.services.progress import EVENT_JOB_STATUS, JobProgressReporter
+
+
+def search_dedupe_key(params: Dict[str, Any]) -> str:
+    """
+    Identidade da busca: hash dos parâmetros normalizados
+    (normalize_search_params), com a query sem diferença de maiúsculas/espaços
+    """
+    identity = {**params, 'query': ' '.join(params['query'].lower().split())}
+    return hashlib.sha256(json.dumps(identity, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def lease_seconds() -> int:
+    return getattr(settings, 'SCRAPE_JOB_LEASE_SECONDS', 60)
+
+
+def lease_expired(job: ScrapeJob) -> bool:
+    """Job 'running' cujo dono parou de renovar o heartbeat (processo morreu)"""
+    if job.status != ScrapeJob.STATUS_RUNNING:
+        return False
+    last_seen = job.heartbeat_at or job.started_at or job.created_at
+    return timezone.now() - last_seen > timedelta(seconds=lease_seconds())
+
+
+def _recover_expired(job: ScrapeJob) -> ScrapeJob:
+    """
+    Job com lease vencido volta para a fila (ou falha após
+    SCRAPE_JOB_MAX_ATTEMPTS); o UPDATE condicional garante que só um
+    processo faz a recuperação
+
+    Returns:
+        O job recarregado
+    """
+    if not lease_expired(job):
+        return job
+
+    owned = ScrapeJob.objects.filter(id=job.id, status=ScrapeJob.STATUS_RUNNING, heartbeat_at=job.heartbeat_at)
+    if job.attempts >= getattr(settings, 'SCRAPE_JOB_MAX_ATTEMPTS', 2):
+        recovered = owned.update(
+            status=ScrapeJob.STATUS_FAILED,
+            error='Worker interrompido (tentativas esgotadas)',
+            finished_at=timezone.now(),
+        )
+    else:
+        recovered = owned.update(status=ScrapeJob.STATUS_QUEUED, worker=None)
+
+    if recovered:
+        print(f"♻️  ScrapeJob {job.id} sem heartbeat de {job.worker}: dono considerado morto")
+    job.refresh_from_db()
+    return job
+
+
+class JobHeartbeat:
+    """Renova job.heartbeat_at em uma thread enquanto o job roda"""
+
+    def __init__(self, job: ScrapeJob):
+        self.job_id = job.id
+        self.interval = max(lease_seconds() / 3, 1.0)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"heartbeat-job-{job.id}", daemon=True)
+
+    def _run(self):
+        try:
+            while not self._stop.wait(self.interval):
+                ScrapeJob.objects.filter(id=self.job_id, status=ScrapeJob.STATUS_RUNNING).update(
+                    heartbeat_at=timezone.now()
+                )
+        except Exception as e:
+            print(f"⚠️  Heartbeat do ScrapeJob {self.job_id} falhou: {e}")
+        finally:
+            connection.close()  # Conexão própria da thread
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+
+def _create_or_attach(params: Dict[str, Any], user=None, **fields: Any) -> Tuple[ScrapeJob, bool]:
+    """
+    Cria o job da busca ou devolve o job ativo com a mesma dedupe_key
+
+    O índice único parcial (dedupe_key com status queued/running) decide quem
+    cria: o INSERT concorrente falha e o perdedor se anexa ao vencedor, mesmo
+    entre processos diferentes.
+
+    Returns:
+        (job, created)
+    """
+    dedupe_key = search_dedupe_key(params)
+
+    for _ in range(3):
+        try:
+            with transaction.atomic():
+                job = ScrapeJob.objects.create(
+                    query=params['query'],
+                    parameters=params,
+                    dedupe_key=dedupe_key,
+                    requested_by=user if user is not None and user.is_authenticated else None,
+                    **fields
+                )
+            return job, True
+        except IntegrityError:
+            job = (
+                ScrapeJob.objects
+                .filter(dedupe_key=dedupe_key, status__in=ScrapeJob.ACTIVE_STATUSES)
+                .first()
+            )
+            if job is not None:
+                # Dono morto: o job volta para a fila (quem chamou pode assumir)
+                job = _recover_expired(job)
+                if job.status in ScrapeJob.ACTIVE_STATUSES:
+                    return job, False
+            # O job ativo terminou (ou falhou por lease vencido) entre o INSERT
+            # e o SELECT: tenta criar de novo
+
+    raise RuntimeError(f"Não foi possível criar nem encontrar o job da busca '{params['query']}'")
+
+
+def enqueue_scrape_job(params: Dict[str, Any], user=None) -> Tuple[ScrapeJob, bool]:
+    """
+    Coloca uma busca na fila (params já normalizados)
+
+    Returns:
+        (job, created): created=False quando a mesma busca já estava na
+        fila/executando e o job existente foi devolvido
+    """
+    job, created = _create_or_attach(params, user)
+    if created:
+        print(f"📥 ScrapeJob {job.id} enfileirado: '{job.query}'")
+    else:
+        print(f"🔗 Busca '{job.query}' já em andamento: anexada ao ScrapeJob {job.id}")
+    return job, created
+
+
+def wait_for_job(job: ScrapeJob, timeout: Optional[float] = None) -> ScrapeJob:
+    """
+    Espera o job terminar (done/failed) consultando o banco
+
+    Returns:
+        O job recarregado (ainda ativo se o timeout acabou antes ou se o
+        dono parou de renovar o heartbeat: veja lease_expired)
+    """
+    timeout = timeout if timeout is not None else getattr(settings, 'SCRAPE_COALESCE_WAIT_SECONDS', 600)
+    poll_interval = getattr(settings, 'SCRAPE_COALESCE_POLL_INTERVAL', 0.5)
+    give_up_at = time.monotonic() + timeout
+
+    while True:
+        job.refresh_from_db(fields=[
+            'status', 'result', 'error', 'worker', 'attempts', 'started_at', 'heartbeat_at', 'finished_at'
+        ])
+        if job.status not in ScrapeJob.ACTIVE_STATUSES or lease_expired(job) or time.monotonic() >= give_up_at:
+            return job
+        time.sleep(poll_interval)
+
+
+def run_coalesced_search(params: Dict[str, Any], user=None) -> Tuple[ScrapeJob, bool]:
+    """
+    Busca síncrona com single-flight
+
+    A primeira chamada cria o job já como 'running' (ou assume o job
+    idêntico que ainda estava na fila) e executa a busca no próprio processo
+    (eventos de progresso gravados como em um job da fila).
+    Chamadas idênticas enquanto ela roda se anexam ao mesmo job e esperam o
+    resultado; o progresso pode ser acompanhado pelo SSE/WebSocket do job.
+    Se o processo líder morre (heartbeat parado por SCRAPE_JOB_LEASE_SECONDS),
+    quem espera devolve o job à fila e assume a busca.
+
+    Returns:
+        (job, leader): leader=False quando a chamada reaproveitou uma busca
+        em andamento. O job pode seguir ativo se a espera passou de
+        SCRAPE_COALESCE_WAIT_SECONDS.
+    """
+    worker_name = f"sync:{socket.gethostname()}:{os.getpid()}"
+    now = timezone.now()
+    job, created = _create_or_attach(
+        params,
+        user,
+        status=ScrapeJob.STATUS_RUNNING,
+        worker=worker_name,
+        attempts=1,
+        started_at=now,
+        heartbeat_at=now,
+    )
+
+    if created:
+        return execute_job(job), True
+
+    give_up_at = time.monotonic() + getattr(settings, 'SCRAPE_COALESCE_WAIT_SECONDS', 600)
+
+    while True:
+        # Job idêntico na fila (ou devolvido a ela porque o dono morreu):
+        # executa aqui em vez de esperar um worker
+        if claim_queued_job(job, worker_name):
+            print(f"🔗 Busca '{job.query}' estava na fila (ScrapeJob {job.id}): executando nesta requisição")
+            return execute_job(job), True
+
+        print(f"🔗 Busca '{job.query}' já em andamento (ScrapeJob {job.id}): aguardando resultado")
+        job = wait_for_job(job, timeout=max(give_up_at - time.monotonic(), 0))
+
+        if not lease_expired(job):
+            return job, False
+
+        job = _recover_expired(job)
+        if job.status not in ScrapeJob.ACTIVE_STATUSES:
+            return job, False
+
+
+def claim_queued_job(job: ScrapeJob, worker_name: str) -> bool:
+    """Assume um job específico se ele ainda está na fila (False: outro dono pegou antes)"""
+    now = timezone.now()
+    claimed = ScrapeJob.objects.filter(id=job.id, status=ScrapeJob.STATUS_QUEUED).update(
+        status=ScrapeJob.STATUS_RUNNING,
+        worker=worker_name,
+        attempts=F('attempts') + 1,
+        started_at=now,
+        heartbeat_at=now,
+    )
+    if claimed:
+        job.refresh_from_db()
+    return bool(claimed)
+
+
+def workers_available() -> bool:
+    """
+    Há workers consumindo a fila: SCRAPE_WORKERS_ENABLED e nenhum job parado
+    na fila há mais de SCRAPE_WORKER_PICKUP_SECONDS (workers fora do ar ou
+    todos ocupados)
+    """
+    if not getattr(settings, 'SCRAPE_WORKERS_ENABLED', True):
+        return False
+    stuck_before = timezone.now() - timedelta(seconds=getattr(settings, 'SCRAPE_WORKER_PICKUP_SECONDS', 30))
+    return not ScrapeJob.objects.filter(status=ScrapeJob.STATUS_QUEUED, created_at__lt=stuck_before).exists()
+
+
+def claim_next_job(worker_name: str) -> Optional[ScrapeJob]:
+    """Reserva o job mais antigo da fila para este worker"""
+    with transaction.atomic():
+        job = (
+            ScrapeJob.objects
+            .select_for_update(skip_locked=True)
+            .filter(status=ScrapeJob.STATUS_QUEUED)
+            .order_by('created_at')
+            .first()
+        )
+
+        if job is None:
+            return None
+
+        job.status = ScrapeJob.STATUS_RUNNING
+        job.worker = worker_name
+        job.attempts += 1
+        job.started_at = timezone.now()
+        job.heartbeat_at = job.started_at
+        job.save(update_fields=['status', 'worker', 'attempts', 'started_at', 'heartbeat_at'])
+
+    return job
+
+
+def execute_job(job: ScrapeJob) -> ScrapeJob:
+    """Executa a busca do job e registra resultado ou erro"""
+    print(f"🚀 [{job.worker}] Executando ScrapeJob {job.id}: '{job.query}'")
+    progress = JobProgressReporter(job)
+    progress.emit(EVENT_JOB_STATUS, status=ScrapeJob.STATUS_RUNNING, worker=job.worker)
+
+    try:
+        with JobHeartbeat(job):
+            outcome = run_nissei_search(job.parameters, progress=progress)
+        job.result = summarize_search_outcome(outcome)
+        job.status = ScrapeJob.STATUS_DONE
+        job.error = None
+        print(f"✅ [{job.worker}] ScrapeJob {job.id} concluído "
+              f"({len(job.result['saved_product_ids'])} produtos salvos)")
+
+    except Exception as e:
+        job.status = ScrapeJob.STATUS_FAILED
+        job.error = f"{e}\n{traceback.format_exc()}"
+        print(f"❌ [{job.worker}] ScrapeJob {job.id} falhou: {e}")
+
+    job.finished_at = timezone.now()
+    job.save(update_fields=['result', 'status', 'error', 'finished_at'])
+
+    progress.emit(
+        EVENT_JOB_STATUS,
+        status=job.status,
+        result=job.result,
+        error=(job.error or '').split('\n')[0] or None
+    )
+    return job
+
+
+def requeue_stale_jobs() -> int:
+    """
+    Jobs 'running' sem heartbeat há mais que SCRAPE_JOB_LEASE_SECONDS
+    pertencem a workers/requisições que morreram: voltam para a fila (ou
+    falham após SCRAPE_JOB_MAX_ATTEMPTS)
+    """
+    stale_before = timezone.now() - timedelta(seconds=lease_seconds())
+    max_attempts = getattr(settings, 'SCRAPE_JOB_MAX_ATTEMPTS', 2)
+
+    stale = ScrapeJob.objects.filter(status=ScrapeJob.STATUS_RUNNING).filter(
+        Q(heartbeat_at__lt=stale_before) | Q(heartbeat_at__isnull=True, started_at__lt=stale_before)
+    )
+
+    failed = stale.filter(attempts__gte=max_attempts).update(
+        status=ScrapeJob.STATUS_FAILED,
+        error='Worker interrompido (tentativas esgotadas)',
+        finished_at=timezone.now(),
+    )
+    requeued = stale.filter(attempts__lt=max_attempts).update(
+        status=ScrapeJob.STATUS_QUEUED,
+        worker=None,
+    )
+
+    if failed or requeued:
+        print(f"♻️  Jobs órfãos: {requeued} reenfileirados, {failed} marcados como falha")
+
+    return requeued
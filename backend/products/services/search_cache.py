@@ -0,0 +1,202 @@
+# products/services/search_cache.py
+
+"""
+Cache de resultado por busca (stale-while-revalidate) sobre os ScrapeJobs
+
+O resultado de uma busca concluída já está no banco (ScrapeJob.result +
+produtos salvos). Uma busca idêntica (mesma dedupe_key) reaproveita o
+último job concluído conforme a idade dele:
+
+- até SEARCH_CACHE_FRESH_SECONDS: fresco, servido direto do banco
+- até SEARCH_CACHE_FRESH_SECONDS + SEARCH_CACHE_STALE_SECONDS: servido na
+  hora e uma atualização é enfileirada para os workers (enqueue_scrape_job
+  já coalesce: no máximo uma atualização por busca). Sem workers consumindo
+  a fila (workers_available), a atualização roda numa thread do próprio
+  processo, no máximo SEARCH_CACHE_LOCAL_REFRESHES ao mesmo tempo; acima
+  disso fica na fila
+- mais velho que isso (ou sem job): miss, a busca roda normalmente
+
+Resultados parciais (prazo esgotado) nunca contam como frescos.
+Os contadores de hit/miss são do processo.
+"""
+
+import os
+import socket
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from products.models import ScrapeJob
+from products.services.scrape_jobs import (
+    claim_queued_job,
+    enqueue_scrape_job,
+    execute_job,
+    search_dedupe_key,
+    workers_available,
+)
+
+
+CACHE_FRESH = 'fresh'
+CACHE_STALE = 'stale'
+CACHE_MISS = 'miss'
+CACHE_BYPASS = 'bypass'
+
+
+@dataclass
+class CachedSearch:
+    job: ScrapeJob
+    state: str
+    age_seconds: float
+    refresh_job_id: Optional[int] = None
+    refresh_local: bool = False
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'status': self.state,
+            'age_seconds': round(self.age_seconds, 1),
+            'job_id': self.job.id,
+            'cached_at': self.job.finished_at.isoformat(),
+            'refresh_job_id': self.refresh_job_id,
+            'refresh_local': self.refresh_local,
+        }
+
+
+class SearchResultCache:
+    def __init__(self, fresh_seconds: float = 300, stale_seconds: float = 3600, local_refreshes: int = 1):
+        self.fresh_seconds = fresh_seconds
+        self.stale_seconds = stale_seconds
+        self.local_refreshes = local_refreshes
+        self._local_slots = threading.BoundedSemaphore(max(local_refreshes, 1))
+
+        self._lock = threading.Lock()
+        self.fresh_hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.refreshes = 0
+        self.local_refreshes_started = 0
+
+    def lookup(self, params: Dict[str, Any], user=None) -> Optional[CachedSearch]:
+        """
+        Último resultado utilizável da busca (params normalizados)
+
+        Stale: enfileira a atualização antes de devolver o resultado antigo
+        (ou a executa numa thread deste processo quando não há workers).
+        """
+        job = (
+            ScrapeJob.objects
+            .filter(dedupe_key=search_dedupe_key(params), status=ScrapeJob.STATUS_DONE, finished_at__isnull=False)
+            .order_by('-finished_at')
+            .first()
+        )
+
+        age = (timezone.now() - job.finished_at).total_seconds() if job is not None else None
+
+        if job is None or age > self.fresh_seconds + self.stale_seconds:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        partial = bool((job.result or {}).get('partial'))
+        if age <= self.fresh_seconds and not partial:
+            with self._lock:
+                self.fresh_hits += 1
+            return CachedSearch(job=job, state=CACHE_FRESH, age_seconds=age)
+
+        refresh_job, created = enqueue_scrape_job(params, user)
+        refresh_local = (
+            refresh_job.status == ScrapeJob.STATUS_QUEUED
+            and not workers_available()
+            and self._start_local_refresh(refresh_job)
+        )
+        with self._lock:
+            self.stale_hits += 1
+            self.refreshes += 1 if created else 0
+        print(f"♻️  Cache da busca '{params['query']}' com {age:.0f}s: servindo resultado antigo, "
+              f"atualização no ScrapeJob {refresh_job.id}{' (neste processo)' if refresh_local else ''}")
+        return CachedSearch(
+            job=job,
+            state=CACHE_STALE,
+            age_seconds=age,
+            refresh_job_id=refresh_job.id,
+            refresh_local=refresh_local,
+        )
+
+    def _start_local_refresh(self, refresh_job: ScrapeJob) -> bool:
+        """
+        Assume o job de atualização e o executa numa thread deste processo
+
+        False quando já há SEARCH_CACHE_LOCAL_REFRESHES rodando ou outro
+        processo assumiu o job antes (ele segue na fila / com o outro dono).
+        """
+        if not self._local_slots.acquire(blocking=False):
+            return False
+
+        worker_name = f"cache:{socket.gethostname()}:{os.getpid()}"
+        if not claim_queued_job(refresh_job, worker_name):
+            self._local_slots.release()
+            return False
+
+        with self._lock:
+            self.local_refreshes_started += 1
+        threading.Thread(
+            target=self._run_local_refresh,
+            args=(refresh_job,),
+            name=f'search-cache-refresh-{refresh_job.id}',
+            daemon=True,
+        ).start()
+        return True
+
+    def _run_local_refresh(self, refresh_job: ScrapeJob):
+        try:
+            execute_job(refresh_job)
+        finally:
+            self._local_slots.release()
+            connection.close()
+
+    def record_bypass(self):
+        with self._lock:
+            self.bypassed += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.fresh_hits + self.stale_hits + self.misses
+            return {
+                'fresh_seconds': self.fresh_seconds,
+                'stale_seconds': self.stale_seconds,
+                'fresh_hits': self.fresh_hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'bypassed': self.bypassed,
+                'refreshes_enqueued': self.refreshes,
+                'refreshes_local': self.local_refreshes_started,
+                'hit_rate': round((self.fresh_hits + self.stale_hits) / lookups, 3) if lookups else None,
+            }
+
+
+_cache: Optional[SearchResultCache] = None
+_cache_lock = threading.Lock()
+
+
+def search_cache_enabled() -> bool:
+    return getattr(settings, 'SEARCH_CACHE_ENABLED', True)
+
+
+def get_search_cache() -> SearchResultCache:
+    """Cache do processo (janelas do settings.py)"""
+    global _cache
+
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SearchResultCache(
+                    fresh_seconds=getattr(settings, 'SEARCH_CACHE_FRESH_SECONDS', 300),
+                    stale_seconds=getattr(settings, 'SEARCH_CACHE_STALE_SECONDS', 3600),
+                    local_refreshes=getattr(settings, 'SEARCH_CACHE_LOCAL_REFRESHES', 1),
+                )
+
+    return _cache
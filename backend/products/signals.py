@@ -0,0 +1,27 @@
+# products/signals.py
+
+"""
+ref_count do image store nas remoções
+
+Qualquer caminho que apague ProductImage ou Product (galeria refeita
+pelos scrapers, admin, exclusão em cascata) solta a referência ao
+StoredImage, para o purge_image_store poder liberar o arquivo.
+"""
+
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from products.models import Product, ProductImage
+from products.services.image_store import release_refs
+
+
+@receiver(post_delete, sender=ProductImage)
+def release_gallery_image(sender, instance, **kwargs):
+    if instance.stored_image_id:
+        release_refs([instance.stored_image_id])
+
+
+@receiver(post_delete, sender=Product)
+def release_main_stored_image(sender, instance, **kwargs):
+    if instance.main_stored_image_id:
+        release_refs([instance.main_stored_image_id])
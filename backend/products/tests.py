@@ -1,3 +1,1174 @@
-from django.test import TestCase
+import asyncio
+import importlib
+import io
+import json
+import os
+import tempfile
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import httpx
+import requests
+from bs4 import BeautifulSoup
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from products.models import OracleSyncOutbox, Product, QueryHit, QueryRun, ScrapeJob
+from products import views
+from products.services import oracle_outbox, scrape_jobs, search_cache
+from products.services.circuit_breaker import (
+    ENDPOINT_PAGE,
+    STATE_CLOSED,
+    STATE_HALF_OPEN,
+    STATE_OPEN,
+    CircuitBreaker,
+    CircuitBreakerRegistry,
+    CircuitOpenError,
+)
+from products.services.deadline import Deadline, DeadlineExceeded
+from products.services.fetch_engine import AsyncFetchEngine
+from products.services.http_cache import CachingHTTPAdapter, DiskHttpCache
+from products.services.magento_gallery import parse_magento_gallery
+from products.services.nissei_extractor_v2 import NisseiExtractorV2
+from products.services.nissei_search_service import normalize_search_params
+from products.services.query_index import products_for_query, record_query_run
+from products.services.rate_limiter import HostRateLimiter, HostState, RateLimitedAdapter, SlotTimeout
+from products.services.product_persistence import (
+    ROW_CREATED,
+    ROW_DUPLICATE,
+    ROW_SKIPPED,
+    ROW_UNCHANGED,
+    ROW_UPDATED,
+    compute_content_fingerprint,
+    load_known_pages,
+    upsert_scraped_products,
+)
+from sites.models import Site
+
+
+@override_settings(ORACLE_OUTBOX_ENABLED=True, ORACLE_OUTBOX_MAX_ATTEMPTS=3, ORACLE_OUTBOX_RETRY_BASE_SECONDS=30)
+class OracleOutboxTests(TestCase):
+    def setUp(self):
+        self.site = Site.objects.create(name='Nissei', url='https://nissei.com')
+        self.product = self._product('SKU1')
+
+    def _product(self, sku_code):
+        return Product.objects.create(
+            name='Produto', url=f"https://nissei.com/p/{Product.objects.count() + 1}",
+            site=self.site, search_query='celular', sku_code=sku_code, status=2
+        )
+
+    def _result(self, errors_by_sku):
+        """Resultado de sync_products_to_oracle: {sku: None | erro}"""
+        errors = [error for error in errors_by_sku.values() if error]
+        return {
+            'success_count': len(errors_by_sku) - len(errors),
+            'error_count': len(errors),
+            'errors': errors,
+            'skus': errors_by_sku,
+        }
+
+    def _process(self, errors_by_sku):
+        entries = oracle_outbox.claim_outbox_batch('test')
+        with mock.patch.object(oracle_outbox, 'sync_products_to_oracle', return_value=self._result(errors_by_sku)) as sync:
+            counts = oracle_outbox.process_outbox_batch(entries)
+        return entries, counts, sync
+
+    def test_repeated_approval_while_pending_creates_one_row(self):
+        oracle_outbox.enqueue_oracle_sync([self.product])
+        oracle_outbox.enqueue_oracle_sync([self.product])
+
+        self.assertEqual(OracleSyncOutbox.objects.filter(status=OracleSyncOutbox.STATUS_PENDING).count(), 1)
+
+    def test_claim_marks_rows_processing_and_skips_rows_not_due(self):
+        oracle_outbox.enqueue_oracle_sync([self.product])
+        later = self._product('SKU2')
+        OracleSyncOutbox.objects.create(product=later, next_attempt_at=timezone.now() + timedelta(hours=1))
+
+        entries = oracle_outbox.claim_outbox_batch('test')
+
+        self.assertEqual([entry.product_id for entry in entries], [self.product.id])
+        entry = OracleSyncOutbox.objects.get(id=entries[0].id)
+        self.assertEqual(entry.status, OracleSyncOutbox.STATUS_PROCESSING)
+        self.assertEqual(entry.attempts, 1)
+        self.assertEqual(entry.worker, 'test')
+        self.assertEqual(oracle_outbox.claim_outbox_batch('other'), [])
+
+    def test_success_marks_done(self):
+        oracle_outbox.enqueue_oracle_sync([self.product])
+
+        _, counts, _ = self._process({'SKU1': None})
+
+        self.assertEqual(counts, {'done': 1, 'retry': 0, 'failed': 0})
+        entry = OracleSyncOutbox.objects.get()
+        self.assertEqual(entry.status, OracleSyncOutbox.STATUS_DONE)
+        self.assertIsNotNone(entry.processed_at)
+
+    def test_failure_is_retried_with_exponential_backoff_then_fails(self):
+        oracle_outbox.enqueue_oracle_sync([self.product])
+
+        self._process({'SKU1': 'ORA-00001'})
+        entry = OracleSyncOutbox.objects.get()
+        self.assertEqual(entry.status, OracleSyncOutbox.STATUS_PENDING)
+        self.assertEqual(entry.last_error, 'ORA-00001')
+        delay = (entry.next_attempt_at - timezone.now()).total_seconds()
+        self.assertTrue(25 < delay <= 30, delay)
+        self.assertEqual(oracle_outbox.retry_delay(2), 60)
+
+        for _ in range(2):
+            OracleSyncOutbox.objects.update(next_attempt_at=timezone.now())
+            self._process({'SKU1': 'ORA-00001'})
+
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, OracleSyncOutbox.STATUS_FAILED)
+        self.assertEqual(entry.attempts, 3)
+
+    def test_same_sku_is_sent_once_per_batch(self):
+        twin = self._product('SKU1')
+        oracle_outbox.enqueue_oracle_sync([self.product, twin])
+
+        _, counts, sync = self._process({'SKU1': None})
+
+        self.assertEqual(sync.call_count, 1)
+        self.assertEqual(len(sync.call_args.args[0]), 1)
+        self.assertEqual(counts['done'], 2)
+
+    def test_product_no_longer_approved_is_skipped(self):
+        oracle_outbox.enqueue_oracle_sync([self.product])
+        Product.objects.filter(id=self.product.id).update(status=1)
+
+        _, counts, sync = self._process({})
+
+        sync.assert_not_called()
+        self.assertEqual(counts['done'], 1)
+
+    def test_failed_retry_is_superseded_by_reapproval_during_send(self):
+        oracle_outbox.enqueue_oracle_sync([self.product])
+        entries = oracle_outbox.claim_outbox_batch('test')
+        # Aprovado de novo enquanto a linha está 'processing'
+        oracle_outbox.enqueue_oracle_sync([self.product])
+
+        with mock.patch.object(oracle_outbox, 'sync_products_to_oracle', return_value=self._result({'SKU1': 'ORA-03113'})):
+            counts = oracle_outbox.process_outbox_batch(entries)
+
+        self.assertEqual(counts, {'done': 1, 'retry': 0, 'failed': 0})
+        statuses = sorted(OracleSyncOutbox.objects.values_list('status', flat=True))
+        self.assertEqual(statuses, [OracleSyncOutbox.STATUS_DONE, OracleSyncOutbox.STATUS_PENDING])
+
+    def test_stale_processing_rows_are_requeued(self):
+        OracleSyncOutbox.objects.create(
+            product=self.product,
+            status=OracleSyncOutbox.STATUS_PROCESSING,
+            locked_at=timezone.now() - timedelta(hours=1),
+        )
+
+        self.assertEqual(oracle_outbox.requeue_stale_outbox(), 1)
+        self.assertEqual(OracleSyncOutbox.objects.get().status, OracleSyncOutbox.STATUS_PENDING)
+
+
+class NormalizeSearchParamsTests(SimpleTestCase):
+    def test_defaults_and_limits(self):
+        params = normalize_search_params({'query': '  celular ', 'max_results': '100', 'max_images': 0})
+
+        self.assertEqual(params['query'], 'celular')
+        self.assertEqual(params['max_results'], 50)
+        self.assertEqual(params['max_detailed'], 5)
+        self.assertEqual(params['max_images'], 1)
+        self.assertEqual(params['ai_config'], 'none')
+        self.assertTrue(params['enhanced_extraction'])
+
+    @override_settings(SCRAPE_DEFAULT_TIMEOUT_MS=0, SCRAPE_MIN_TIMEOUT_MS=2000)
+    def test_timeout_is_optional_and_clamped(self):
+        self.assertIsNone(normalize_search_params({'query': 'celular'})['timeout_ms'])
+        self.assertEqual(normalize_search_params({'query': 'celular', 'timeout_ms': '500'})['timeout_ms'], 2000)
+
+    def test_invalid_input_raises_value_error(self):
+        for data in (
+            {'query': 'a'},
+            {'query': ['celular']},
+            {'query': 'celular', 'max_results': [1]},
+            {'query': 'celular', 'max_detailed': 'dez'},
+            {'query': 'celular', 'timeout_ms': {'ms': 1}},
+            {'query': 'celular', 'ai_config': 1},
+        ):
+            with self.subTest(data=data), self.assertRaises(ValueError):
+                normalize_search_params(data)
+
+    def test_flags_have_a_canonical_form(self):
+        as_text = normalize_search_params({'query': 'celular', 'enhanced_extraction': 'false', 'ai_config': ' Auto '})
+        as_values = normalize_search_params({'query': 'celular', 'enhanced_extraction': False, 'ai_config': 'auto'})
+
+        self.assertEqual(as_text, as_values)
+        self.assertIs(as_text['enhanced_extraction'], False)
+
+
+class HttpCacheRevalidationTests(SimpleTestCase):
+    url = 'https://nissei.com/py/celular-x'
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache = DiskHttpCache(directory.name, max_bytes=1024 * 1024)
+        self.adapter = CachingHTTPAdapter(self.cache)
+        self.session = requests.Session()
+        self.session.mount('https://', self.adapter)
+
+    def _response(self, status_code, body=b'', **headers):
+        def build(request, **kwargs):
+            response = requests.Response()
+            response.status_code = status_code
+            response._content = body
+            response.raw = io.BytesIO(body)
+            response.headers.update(headers)
+            response.url = request.url
+            response.request = request
+            return response
+        return build
+
+    def _get(self, status_code, body=b'', **headers):
+        with mock.patch.object(self.adapter, '_network_send', side_effect=self._response(status_code, body, **headers)) as send:
+            response = self.session.get(self.url)
+        return response, send
+
+    def _expire(self):
+        self.cache.ttls = {key: 0 for key in self.cache.ttls}
+
+    def test_fresh_entry_is_served_without_network(self):
+        self._get(200, b'<html>v1</html>', ETag='"v1"')
+
+        response, send = self._get(500)
+
+        send.assert_not_called()
+        self.assertEqual(response.content, b'<html>v1</html>')
+        self.assertEqual(response.headers['X-From-Cache'], '1')
+        self.assertEqual(self.cache.hits, 1)
+
+    def test_stale_entry_is_revalidated_and_304_reuses_body(self):
+        self._get(200, b'<html>v1</html>', ETag='"v1"', **{'Last-Modified': 'Wed, 01 Oct 2026 10:00:00 GMT'})
+        self._expire()
+
+        response, send = self._get(304)
+
+        request = send.call_args.args[0]
+        self.assertEqual(request.headers['If-None-Match'], '"v1"')
+        self.assertEqual(request.headers['If-Modified-Since'], 'Wed, 01 Oct 2026 10:00:00 GMT')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b'<html>v1</html>')
+        self.assertEqual(self.cache.revalidated, 1)
+
+    def test_changed_page_replaces_entry(self):
+        self._get(200, b'<html>v1</html>', ETag='"v1"')
+        self._expire()
+
+        response, _ = self._get(200, b'<html>v2</html>', ETag='"v2"')
+
+        self.assertEqual(response.content, b'<html>v2</html>')
+        entry = self.cache.get(self.url)
+        self.assertEqual((entry['body'], entry['etag']), (b'<html>v2</html>', '"v2"'))
+
+    def test_no_store_is_not_cached(self):
+        self._get(200, b'<html>v1</html>', **{'Cache-Control': 'no-store'})
+
+        self.assertIsNone(self.cache.get(self.url))
+
+
+class ProductUpsertTests(TestCase):
+    def setUp(self):
+        self.site = Site.objects.create(name='Nissei', url='https://nissei.com')
+
+    def _row(self, **overrides):
+        row = {
+            'url': 'https://nissei.com/p/1',
+            'name': 'Celular X',
+            'price': '1500000',
+            'description': 'Descrição',
+            'sku': 'SKU1',
+            'specifications': {'Cor': 'Preto'},
+            'images': ['https://nissei.com/media/catalog/1.jpg', 'https://nissei.com/media/catalog/2.jpg'],
+            'page_fingerprint': 'page-1',
+        }
+        row.update(overrides)
+        return row
+
+    def _upsert(self, rows, query='celular', max_images=3):
+        return upsert_scraped_products(rows, self.site, query, max_images=max_images, extraction_method='test')
+
+    def test_new_product_is_created(self):
+        outcome, = self._upsert([self._row()])
+
+        self.assertEqual(outcome['status'], ROW_CREATED)
+        product = Product.objects.get()
+        self.assertEqual((product.sku_code, product.search_query, product.status), ('SKU1', 'celular', 1))
+        self.assertEqual(product.content_fingerprint, compute_content_fingerprint(self._row()))
+
+    def test_batch_runs_in_constant_queries(self):
+        rows = [self._row(url=f"https://nissei.com/p/{i}") for i in range(20)]
+
+        # SELECT dos existentes + INSERT ... ON CONFLICT (savepoint da transação incluso)
+        with self.assertNumQueries(4):
+            outcomes = self._upsert(rows)
+
+        self.assertEqual({outcome['status'] for outcome in outcomes}, {ROW_CREATED})
+        self.assertEqual(Product.objects.count(), 20)
+
+    def test_duplicate_rows_in_batch_point_to_first(self):
+        first, duplicate = self._upsert([self._row(), self._row(name='Outro')])
+
+        self.assertEqual(duplicate['status'], ROW_DUPLICATE)
+        self.assertEqual(duplicate['product'].url, first['product'].url)
+        self.assertEqual(Product.objects.get().name, 'Celular X')
+
+    def test_row_without_url_is_skipped(self):
+        skipped, created = self._upsert([self._row(url=''), self._row()])
+
+        self.assertEqual((skipped['status'], skipped['error']), (ROW_SKIPPED, 'URL vazia'))
+        self.assertEqual(created['status'], ROW_CREATED)
+
+    def test_new_search_query_is_recorded_on_unchanged_product(self):
+        self._upsert([self._row()])
+
+        outcome, = self._upsert([self._row(page_fingerprint='page-2')], query='samsung')
+
+        self.assertEqual(outcome['status'], ROW_UNCHANGED)
+        self.assertEqual(outcome['changed_fields'], ['search_query', 'scraped_data'])
+        product = Product.objects.get()
+        self.assertEqual(product.search_query, 'samsung')
+        self.assertEqual(product.scraped_data['page_fingerprint'], 'page-2')
+
+    def test_same_content_is_unchanged_and_keeps_status(self):
+        self._upsert([self._row()])
+        Product.objects.update(status=2)
+
+        # Só formatação diferente: mesmo fingerprint
+        outcome, = self._upsert([self._row(name='  Celular   X ', price='1500000.00')])
+
+        self.assertEqual(outcome['status'], ROW_UNCHANGED)
+        self.assertEqual(Product.objects.get().status, 2)
+
+    def test_image_limit_of_the_search_is_not_a_content_change(self):
+        self._upsert([self._row()])
+        Product.objects.update(status=2)
+
+        outcome, = self._upsert([self._row(images=self._row()['images'][:1])], max_images=1)
+
+        self.assertEqual(outcome['status'], ROW_UNCHANGED)
+        self.assertEqual(Product.objects.get().status, 2)
+
+    def test_changed_content_updates_and_resets_status(self):
+        self._upsert([self._row()])
+        Product.objects.update(status=2)
+
+        outcome, = self._upsert([self._row(price='1400000')])
+
+        self.assertEqual(outcome['status'], ROW_UPDATED)
+        self.assertEqual(outcome['changed_fields'], ['price'])
+        product = Product.objects.get()
+        self.assertEqual(product.status, 1)
+        self.assertEqual(str(product.price), '1400000.00')
+
+    def test_known_pages_snapshot_allows_skipping_parse(self):
+        self._upsert([self._row()])
+
+        known = load_known_pages(self.site, ['https://nissei.com/p/1', 'https://nissei.com/p/2'])
+
+        self.assertEqual(list(known), ['https://nissei.com/p/1'])
+        self.assertEqual(known['https://nissei.com/p/1']['page_fingerprint'], 'page-1')
+        snapshot = known['https://nissei.com/p/1']['snapshot']
+        self.assertTrue(snapshot['unchanged_page'])
+        self.assertEqual(snapshot['content_fingerprint'], Product.objects.get().content_fingerprint)
+
+    def test_unchanged_snapshot_upserts_as_unchanged(self):
+        self._upsert([self._row()])
+        snapshot = load_known_pages(self.site, ['https://nissei.com/p/1'])['https://nissei.com/p/1']['snapshot']
+
+        outcome, = self._upsert([snapshot])
+
+        self.assertEqual(outcome['status'], ROW_UNCHANGED)
+
+    def test_migration_recomputes_fingerprints_like_the_service(self):
+        self._upsert([self._row()])
+        Product.objects.update(content_fingerprint='antigo')
+        migration = importlib.import_module('products.migrations.0011_content_fingerprint_without_images')
+
+        migration.recompute_content_fingerprints(apps, None)
+
+        self.assertEqual(Product.objects.get().content_fingerprint, compute_content_fingerprint(self._row()))
+
+
+class MagentoGalleryTests(SimpleTestCase):
+    def _soup(self, data, extra_scripts=''):
+        config = {'[data-gallery-role=gallery-placeholder]': {'mage/gallery/gallery': {'data': data}}}
+        return BeautifulSoup(
+            f'{extra_scripts}<script type="text/x-magento-init">{json.dumps(config)}</script>',
+            'html.parser'
+        )
+
+    def test_images_are_ordered_by_position_with_largest_url(self):
+        gallery = parse_magento_gallery(self._soup([
+            {'thumb': '/t/2.jpg', 'img': '/i/2.jpg', 'full': '/f/2.jpg', 'position': '2'},
+            {'thumb': '/t/1.jpg', 'img': '/i/1.jpg', 'position': '1', 'isMain': True},
+            {'type': 'video', 'img': '/i/video.jpg', 'position': '0'},
+        ]), base_url='https://nissei.com')
+
+        self.assertEqual(gallery.urls(), ['https://nissei.com/i/1.jpg', 'https://nissei.com/f/2.jpg'])
+        self.assertTrue(gallery.images[0].is_main)
+        self.assertTrue(gallery.complete)
+
+    def test_main_image_wins_position_ties(self):
+        gallery = parse_magento_gallery(self._soup([
+            {'img': 'https://nissei.com/a.jpg', 'position': '1'},
+            {'img': 'https://nissei.com/b.jpg', 'position': '1', 'isMain': True},
+        ]))
+
+        self.assertEqual(gallery.urls()[0], 'https://nissei.com/b.jpg')
+
+    def test_gallery_with_missing_urls_is_incomplete(self):
+        only_thumb = parse_magento_gallery(self._soup([{'thumb': 'https://nissei.com/t.jpg', 'position': '1'}]))
+        without_urls = parse_magento_gallery(self._soup([{'img': 'https://nissei.com/a.jpg'}, {'caption': 'x'}]))
+
+        self.assertFalse(only_thumb.complete)
+        self.assertEqual(without_urls.skipped, 1)
+        self.assertFalse(without_urls.complete)
+        self.assertFalse(parse_magento_gallery(self._soup([])).complete)
+
+    def test_other_widgets_and_invalid_json_are_ignored(self):
+        other = '<script type="text/x-magento-init">{"*": {"Magento_Ui/js/core/app": {}}}</script>'
+        broken = '<script type="text/x-magento-init">{"mage/gallery/gallery": </script>'
+
+        gallery = parse_magento_gallery(self._soup([{'img': 'https://nissei.com/a.jpg'}], other + broken))
+
+        self.assertEqual(gallery.urls(), ['https://nissei.com/a.jpg'])
+        self.assertIsNone(parse_magento_gallery(BeautifulSoup(other, 'html.parser')))
+
+
+class HostRateLimiterTests(SimpleTestCase):
+    url = 'https://nissei.com/p/1'
+
+    def _state(self, **overrides):
+        params = dict(rate=100.0, burst=10.0, min_rate=0.5, max_rate=200.0, concurrency=4, max_concurrency=8, latency_target=1.0)
+        params.update(overrides)
+        return HostState(**params)
+
+    def test_acquire_and_release_balance_in_flight(self):
+        state = self._state()
+        state.acquire()
+        state.acquire()
+        self.assertEqual(state.in_flight, 2)
+
+        state.release()
+        state.release()
+        state.release()  # Release a mais não fica negativo
+        self.assertEqual(state.in_flight, 0)
+
+    def test_acquire_gives_up_after_timeout_without_taking_slot(self):
+        state = self._state(concurrency=1, max_concurrency=1)
+        state.acquire()
+
+        with self.assertRaises(SlotTimeout):
+            state.acquire(timeout=0.05)
+
+        self.assertEqual(state.in_flight, 1)
+
+    def test_slot_releases_and_records_error_on_exception(self):
+        limiter = HostRateLimiter(rate_per_host=100.0, burst=10.0)
+
+        with self.assertRaises(RuntimeError):
+            with limiter.slot(self.url):
+                raise RuntimeError('falhou')
+
+        state = limiter.host_for(self.url)
+        self.assertEqual(state.in_flight, 0)
+        self.assertEqual(state.errors, 1)
+
+    def test_throttle_halves_concurrency_and_rate_once_per_cooldown(self):
+        state = self._state()
+
+        state.record(status_code=429)
+        state.record(status_code=503)  # Dentro do cooldown: sem segunda redução
+
+        self.assertEqual(state.concurrency_limit, 2.0)
+        self.assertEqual(state.bucket.rate, 50.0)
+        self.assertEqual(state.throttled, 2)
+        self.assertEqual(state.decreases, 1)
+
+    def test_fast_success_increases_additively(self):
+        state = self._state()
+
+        state.record(status_code=200, latency=0.1)
+
+        self.assertAlmostEqual(state.concurrency_limit, 4.25)
+        self.assertGreater(state.bucket.rate, 100.0)
+
+    def test_retry_after_pauses_host(self):
+        state = self._state()
+
+        state.record(status_code=429, retry_after=30)
+
+        self.assertGreater(state.stats()['paused_for_seconds'], 29)
+
+    def test_mounted_adapter_feeds_responses_back(self):
+        limiter = HostRateLimiter(rate_per_host=100.0, burst=10.0, concurrency=4)
+        session = requests.Session()
+        session.mount('https://', RateLimitedAdapter(limiter))
+
+        response = requests.Response()
+        response.status_code = 429
+        with mock.patch('requests.adapters.HTTPAdapter.send', return_value=response):
+            session.get(self.url, timeout=5)
+
+        state = limiter.host_for(self.url)
+        self.assertEqual((state.throttled, state.in_flight), (1, 0))
+        self.assertEqual(state.concurrency_limit, 2.0)
+
+
+class AsyncFetchEngineTests(SimpleTestCase):
+    url = 'https://nissei.com/p/1'
+
+    def setUp(self):
+        self.limiter = HostRateLimiter(rate_per_host=100.0, burst=10.0, concurrency=1, max_concurrency=1)
+        self.state = self.limiter.host_for(self.url)
+
+    def _engine(self, handler):
+        engine = AsyncFetchEngine(rate_limiter=self.limiter, retries=1, backoff_base=0.01)
+        engine._client = httpx.AsyncClient(transport=httpx.MockTransport(handler), follow_redirects=True)
+        return engine
+
+    def _fetch(self, handler, url=None):
+        async def run():
+            engine = self._engine(handler)
+            try:
+                return await engine.fetch(url or self.url)
+            finally:
+                await engine.aclose()
+
+        return asyncio.run(run())
+
+    def test_success_releases_slot(self):
+        result = self._fetch(lambda request: httpx.Response(200, content=b'ok'))
+
+        self.assertTrue(result.ok)
+        self.assertEqual(result.content, b'ok')
+        self.assertEqual(self.state.in_flight, 0)
+
+    def test_redirect_loop_becomes_result_error_and_releases_slot(self):
+        result = self._fetch(lambda request: httpx.Response(302, headers={'Location': '/loop'}))
+
+        self.assertFalse(result.ok)
+        self.assertTrue(result.error.startswith('TooManyRedirects'))
+        self.assertEqual(result.attempts, 1)
+        self.assertEqual(self.state.in_flight, 0)
+
+    def test_transport_error_is_retried_and_releases_slot(self):
+        def handler(request):
+            raise httpx.ConnectError('recusado', request=request)
+
+        result = self._fetch(handler)
+
+        self.assertTrue(result.error.startswith('ConnectError'))
+        self.assertEqual(result.attempts, 2)
+        self.assertEqual(self.state.in_flight, 0)
+
+    def test_cancelled_while_waiting_for_slot_does_not_leak_it(self):
+        async def run():
+            engine = self._engine(lambda request: httpx.Response(200))
+            self.limiter.acquire(self.url)  # Host sem vaga: fetch fica esperando na thread
+
+            task = asyncio.ensure_future(engine.fetch(self.url))
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+            # A thread ainda pega a vaga liberada e a devolve sozinha
+            self.limiter.release(self.url)
+            for _ in range(50):
+                await asyncio.sleep(0.02)
+                if self.state.in_flight == 0:
+                    break
+            await engine.aclose()
+
+        asyncio.run(run())
+
+        self.assertEqual(self.state.in_flight, 0)
+
+    def test_slot_wait_is_bounded_by_the_deadline(self):
+        async def run():
+            engine = self._engine(lambda request: httpx.Response(200))
+            try:
+                return await engine.fetch(self.url, deadline=Deadline(0.7))
+            finally:
+                await engine.aclose()
+
+        self.limiter.acquire(self.url)  # Host sem vaga até o fim do prazo
+        result = asyncio.run(run())
+
+        self.assertTrue(result.error.startswith('SlotTimeout'))
+        self.assertEqual(self.state.in_flight, 1)
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def _open_breaker(self):
+        breaker = CircuitBreaker(failure_threshold=2, open_seconds=30, open_max_seconds=100)
+        breaker.record_failure('timeout')
+        breaker.record_failure('timeout')
+        return breaker
+
+    def _expire(self, breaker):
+        breaker.opened_at -= breaker.open_seconds + 1
+
+    def test_opens_after_consecutive_failures(self):
+        breaker = CircuitBreaker(failure_threshold=2, open_seconds=30)
+        breaker.record_failure('timeout')
+        self.assertEqual(breaker.state, STATE_CLOSED)
+
+        breaker.record_failure('timeout')
+        self.assertEqual(breaker.state, STATE_OPEN)
+        allowed, retry_in = breaker.allow()
+        self.assertFalse(allowed)
+        self.assertGreater(retry_in, 29)
+
+    def test_success_resets_consecutive_failures(self):
+        breaker = CircuitBreaker(failure_threshold=2)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+
+        self.assertEqual(breaker.state, STATE_CLOSED)
+
+    def test_half_open_allows_single_probe(self):
+        breaker = self._open_breaker()
+        self._expire(breaker)
+
+        self.assertEqual(breaker.allow(), (True, 0.0))
+        self.assertEqual(breaker.state, STATE_HALF_OPEN)
+        self.assertFalse(breaker.allow()[0])
+
+    def test_probe_success_closes(self):
+        breaker = self._open_breaker()
+        self._expire(breaker)
+        breaker.allow()
+
+        breaker.record_success()
+
+        self.assertEqual(breaker.state, STATE_CLOSED)
+        self.assertEqual(breaker.open_seconds, 30)
+
+    def test_probe_failure_reopens_for_longer(self):
+        breaker = self._open_breaker()
+        self._expire(breaker)
+        breaker.allow()
+
+        breaker.record_failure('timeout')
+
+        self.assertEqual(breaker.state, STATE_OPEN)
+        self.assertEqual(breaker.open_seconds, 60)
+        self.assertEqual(breaker.times_opened, 2)
+
+    def test_released_probe_frees_the_slot(self):
+        breaker = self._open_breaker()
+        self._expire(breaker)
+        breaker.allow()
+
+        breaker.release_probe()
+
+        self.assertTrue(breaker.allow()[0])
+
+
+class CircuitBreakerRegistryTests(SimpleTestCase):
+    page = 'https://nissei.com/py/celular-x'
+    image = 'https://nissei.com/media/catalog/product/1.jpg'
+
+    def setUp(self):
+        self.breakers = CircuitBreakerRegistry(failure_threshold=2, open_seconds=30)
+
+    def test_open_circuit_fails_fast(self):
+        self.breakers.record(self.page, status_code=503)
+        self.breakers.record(self.page, error='ReadTimeout')
+
+        with self.assertRaises(CircuitOpenError) as raised:
+            self.breakers.before_request(self.page)
+        self.assertEqual((raised.exception.host, raised.exception.endpoint), ('nissei.com', ENDPOINT_PAGE))
+
+    def test_images_and_pages_have_separate_circuits(self):
+        for _ in range(2):
+            self.breakers.record(self.image, status_code=500)
+
+        self.breakers.before_request(self.page)
+        with self.assertRaises(CircuitOpenError):
+            self.breakers.before_request(self.image)
+
+    def test_stats_are_scoped_to_the_process(self):
+        self.breakers.record(self.page, status_code=200)
+
+        stats = self.breakers.stats()
+
+        self.assertEqual(stats['scope'], 'process')
+        self.assertIn(str(os.getpid()), stats['process'])
+        self.assertEqual(stats['hosts']['nissei.com'][ENDPOINT_PAGE]['state'], STATE_CLOSED)
+
+
+class DeadlineTests(SimpleTestCase):
+    def test_unlimited_deadline_keeps_default_timeouts(self):
+        deadline = Deadline.from_ms(None)
+
+        self.assertFalse(deadline.limited)
+        self.assertEqual(deadline.timeout(15), 15)
+        deadline.check('página')
+
+    def test_request_timeouts_are_capped_by_remaining_time(self):
+        deadline = Deadline.from_ms(2000)
+
+        self.assertLessEqual(deadline.timeout(15), 2)
+        self.assertEqual(Deadline(0).timeout(15), 0.5)
+
+    def test_check_raises_when_expired(self):
+        with self.assertRaises(DeadlineExceeded) as raised:
+            Deadline(0).check('imagens')
+
+        self.assertEqual(raised.exception.stage, 'imagens')
+
+
+@override_settings(HTTP_CACHE_ENABLED=False, SCRAPE_DETAIL_WORKERS=3)
+class ExtractorDeadlineTests(SimpleTestCase):
+    def setUp(self):
+        self.extractor = NisseiExtractorV2(Site(name='Nissei', url='https://nissei.com'), None)
+        self.products = [{'name': f"Produto {i}", 'url': f"https://nissei.com/p/{i}"} for i in range(3)]
+
+    def _run(self, process, deadline):
+        self.extractor.deadline = deadline
+        with mock.patch.object(self.extractor, '_process_product_complete', side_effect=process):
+            return dict(self.extractor._iter_products_concurrently(self.products))
+
+    def test_products_finished_before_deadline_are_returned(self):
+        def process(product):
+            if product['url'].endswith('/2'):
+                time.sleep(3)  # Não cabe no prazo
+            return {'url': product['url'], 'name': product['name'], 'images': []}
+
+        start = time.monotonic()
+        results = self._run(process, Deadline(1.0))
+
+        self.assertLess(time.monotonic() - start, 2.5)
+        self.assertEqual(sorted(results), [0, 1])
+        self.assertEqual(self.extractor.cancelled_products, 1)
+
+    def test_stage_cancelled_by_deadline_counts_as_cancelled(self):
+        def process(product):
+            if product['url'].endswith('/0'):
+                raise DeadlineExceeded('página do produto')
+            return {'url': product['url'], 'images': []}
+
+        results = self._run(process, Deadline(5.0))
+
+        self.assertEqual(sorted(results), [1, 2])
+        self.assertEqual(self.extractor.cancelled_products, 1)
+
+
+class CoalescedSearchTests(TestCase):
+    params = {'query': 'Celular Samsung', 'max_results': 10, 'max_detailed': 5, 'max_images': 3, 'timeout_ms': 0}
+
+    def setUp(self):
+        patcher = mock.patch.multiple(
+            scrape_jobs,
+            run_nissei_search=mock.DEFAULT,
+            summarize_search_outcome=mock.Mock(return_value={'saved_product_ids': []}),
+        )
+        self.mocks = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_dedupe_key_ignores_case_and_spacing(self):
+        self.assertEqual(
+            scrape_jobs.search_dedupe_key(self.params),
+            scrape_jobs.search_dedupe_key({**self.params, 'query': '  celular   SAMSUNG '})
+        )
+
+    def test_first_call_leads_and_runs_the_search(self):
+        job, leader = scrape_jobs.run_coalesced_search(self.params)
+
+        self.assertTrue(leader)
+        self.assertEqual(job.status, ScrapeJob.STATUS_DONE)
+        self.mocks['run_nissei_search'].assert_called_once()
+
+    def _running_job(self, heartbeat_age=0, attempts=1, params=None):
+        params = params or self.params
+        heartbeat_at = timezone.now() - timedelta(seconds=heartbeat_age)
+        return ScrapeJob.objects.create(
+            query=params['query'],
+            parameters=params,
+            dedupe_key=scrape_jobs.search_dedupe_key(params),
+            status=ScrapeJob.STATUS_RUNNING,
+            worker='sync:morto:1',
+            attempts=attempts,
+            started_at=heartbeat_at,
+            heartbeat_at=heartbeat_at,
+        )
+
+    def test_identical_call_attaches_to_running_job(self):
+        running = self._running_job()
+
+        def finish(job, timeout=None):
+            ScrapeJob.objects.filter(id=job.id).update(status=ScrapeJob.STATUS_DONE, result={'saved_product_ids': [1]})
+            job.refresh_from_db()
+            return job
+
+        with mock.patch.object(scrape_jobs, 'wait_for_job', side_effect=finish):
+            job, leader = scrape_jobs.run_coalesced_search({**self.params, 'query': 'celular samsung'})
+
+        self.assertFalse(leader)
+        self.assertEqual(job.id, running.id)
+        self.assertEqual(job.result, {'saved_product_ids': [1]})
+        self.assertEqual(ScrapeJob.objects.count(), 1)
+        self.mocks['run_nissei_search'].assert_not_called()
+
+    def test_identical_queued_job_is_claimed_and_run_inline(self):
+        queued, created = scrape_jobs.enqueue_scrape_job(self.params)
+        self.assertTrue(created)
+
+        job, leader = scrape_jobs.run_coalesced_search(self.params)
+
+        self.assertTrue(leader)
+        self.assertEqual(job.id, queued.id)
+        self.assertEqual(job.status, ScrapeJob.STATUS_DONE)
+        self.assertEqual(job.attempts, 1)
+
+    def test_enqueue_returns_active_job(self):
+        first, created = scrape_jobs.enqueue_scrape_job(self.params)
+        second, created_again = scrape_jobs.enqueue_scrape_job(self.params)
+
+        self.assertTrue(created)
+        self.assertFalse(created_again)
+        self.assertEqual(first.id, second.id)
+
+    @override_settings(SCRAPE_JOB_LEASE_SECONDS=60)
+    def test_job_of_dead_leader_is_taken_over(self):
+        dead = self._running_job(heartbeat_age=300)
+
+        job, leader = scrape_jobs.run_coalesced_search(self.params)
+
+        self.assertTrue(leader)
+        self.assertEqual(job.id, dead.id)
+        self.assertEqual((job.status, job.attempts), (ScrapeJob.STATUS_DONE, 2))
+        self.assertTrue(job.worker.startswith('sync:'))
+        self.mocks['run_nissei_search'].assert_called_once()
+
+    @override_settings(SCRAPE_JOB_LEASE_SECONDS=60, SCRAPE_JOB_MAX_ATTEMPTS=2)
+    def test_dead_job_out_of_attempts_fails_and_a_new_one_leads(self):
+        dead = self._running_job(heartbeat_age=300, attempts=2)
+
+        job, leader = scrape_jobs.run_coalesced_search(self.params)
+
+        self.assertTrue(leader)
+        self.assertNotEqual(job.id, dead.id)
+        dead.refresh_from_db()
+        self.assertEqual(dead.status, ScrapeJob.STATUS_FAILED)
+
+    @override_settings(SCRAPE_JOB_LEASE_SECONDS=60)
+    def test_follower_takes_over_when_leader_dies_while_waiting(self):
+        running = self._running_job()
+
+        def leader_dies(job, timeout=None):
+            ScrapeJob.objects.filter(id=job.id).update(heartbeat_at=timezone.now() - timedelta(minutes=5))
+            job.refresh_from_db()
+            return job
+
+        with mock.patch.object(scrape_jobs, 'wait_for_job', side_effect=leader_dies):
+            job, leader = scrape_jobs.run_coalesced_search(self.params)
+
+        self.assertTrue(leader)
+        self.assertEqual(job.id, running.id)
+        self.assertEqual(job.status, ScrapeJob.STATUS_DONE)
+
+    @override_settings(SCRAPE_JOB_LEASE_SECONDS=60)
+    def test_wait_returns_early_when_lease_expires(self):
+        running = self._running_job(heartbeat_age=300)
+
+        job = scrape_jobs.wait_for_job(running, timeout=30)
+
+        self.assertEqual(job.status, ScrapeJob.STATUS_RUNNING)
+        self.assertTrue(scrape_jobs.lease_expired(job))
+
+    @override_settings(SCRAPE_JOB_LEASE_SECONDS=60)
+    def test_requeue_uses_the_heartbeat(self):
+        dead = self._running_job(heartbeat_age=300)
+        alive = self._running_job(params={**self.params, 'query': 'notebook'})
+        ScrapeJob.objects.filter(id=alive.id).update(started_at=timezone.now() - timedelta(hours=2))
+
+        self.assertEqual(scrape_jobs.requeue_stale_jobs(), 1)
+        dead.refresh_from_db()
+        alive.refresh_from_db()
+        self.assertEqual((dead.status, dead.worker), (ScrapeJob.STATUS_QUEUED, None))
+        self.assertEqual(alive.status, ScrapeJob.STATUS_RUNNING)
+
+
+class SearchResultCacheTests(TestCase):
+    params = {'query': 'Notebook Lenovo', 'max_results': 10, 'max_detailed': 5, 'max_images': 3, 'timeout_ms': 0}
+
+    def setUp(self):
+        self.cache = search_cache.SearchResultCache(fresh_seconds=300, stale_seconds=3600)
+
+    def _done_job(self, age_seconds, partial=False):
+        return ScrapeJob.objects.create(
+            query=self.params['query'],
+            parameters=self.params,
+            dedupe_key=scrape_jobs.search_dedupe_key(self.params),
+            status=ScrapeJob.STATUS_DONE,
+            result={'saved_product_ids': [1], 'partial': partial},
+            finished_at=timezone.now() - timedelta(seconds=age_seconds),
+        )
+
+    def test_miss_without_finished_job(self):
+        self.assertIsNone(self.cache.lookup(self.params))
+        self.assertEqual(self.cache.stats()['misses'], 1)
+
+    def test_fresh_hit_does_not_enqueue(self):
+        job = self._done_job(age_seconds=60)
+
+        cached = self.cache.lookup({**self.params, 'query': 'notebook  lenovo'})
+
+        self.assertEqual((cached.state, cached.job.id), (search_cache.CACHE_FRESH, job.id))
+        self.assertIsNone(cached.refresh_job_id)
+        self.assertFalse(ScrapeJob.objects.filter(status=ScrapeJob.STATUS_QUEUED).exists())
+
+    def test_too_old_result_is_a_miss(self):
+        self._done_job(age_seconds=300 + 3600 + 1)
+
+        self.assertIsNone(self.cache.lookup(self.params))
+
+    def test_stale_hit_enqueues_one_refresh_for_the_workers(self):
+        job = self._done_job(age_seconds=600)
+
+        first = self.cache.lookup(self.params)
+        second = self.cache.lookup(self.params)
+
+        self.assertEqual((first.state, first.job.id), (search_cache.CACHE_STALE, job.id))
+        self.assertEqual(first.refresh_job_id, second.refresh_job_id)
+        self.assertFalse(first.refresh_local)
+        refresh = ScrapeJob.objects.get(id=first.refresh_job_id)
+        self.assertEqual(refresh.status, ScrapeJob.STATUS_QUEUED)
+        stats = self.cache.stats()
+        self.assertEqual((stats['stale_hits'], stats['refreshes_enqueued'], stats['refreshes_local']), (2, 1, 0))
+
+    def test_partial_result_is_never_fresh(self):
+        self._done_job(age_seconds=10, partial=True)
+
+        cached = self.cache.lookup(self.params)
+
+        self.assertEqual(cached.state, search_cache.CACHE_STALE)
+        self.assertIsNotNone(cached.refresh_job_id)
+
+    def _lookup_without_workers(self):
+        with mock.patch.object(search_cache.threading, 'Thread') as thread_class:
+            cached = self.cache.lookup(self.params)
+        return cached, thread_class
+
+    @override_settings(SCRAPE_WORKERS_ENABLED=False)
+    def test_stale_hit_refreshes_in_process_without_workers(self):
+        self._done_job(age_seconds=600)
+
+        cached, thread_class = self._lookup_without_workers()
+
+        self.assertTrue(cached.refresh_local)
+        refresh = ScrapeJob.objects.get(id=cached.refresh_job_id)
+        self.assertEqual(refresh.status, ScrapeJob.STATUS_RUNNING)
+        self.assertTrue(refresh.worker.startswith('cache:'))
+        thread_class.return_value.start.assert_called_once()
+
+        # Corpo da thread: executa o job e devolve a vaga
+        target = thread_class.call_args.kwargs['target']
+        with mock.patch.object(search_cache, 'execute_job') as execute_job, \
+                mock.patch.object(search_cache, 'connection'):
+            target(*thread_class.call_args.kwargs['args'])
+        execute_job.assert_called_once()
+        self.assertEqual(self.cache.stats()['refreshes_local'], 1)
+        self.assertTrue(self.cache._local_slots.acquire(blocking=False))
+
+    @override_settings(SCRAPE_WORKER_PICKUP_SECONDS=30)
+    def test_job_stuck_in_queue_means_no_workers(self):
+        self.assertTrue(scrape_jobs.workers_available())
+
+        stuck, _ = scrape_jobs.enqueue_scrape_job({**self.params, 'query': 'monitor'})
+        ScrapeJob.objects.filter(id=stuck.id).update(created_at=timezone.now() - timedelta(minutes=5))
+
+        self.assertFalse(scrape_jobs.workers_available())
+
+    @override_settings(SCRAPE_WORKERS_ENABLED=False)
+    def test_local_refreshes_are_bounded(self):
+        self._done_job(age_seconds=600)
+        self.assertTrue(self.cache._local_slots.acquire(blocking=False))
+
+        cached, thread_class = self._lookup_without_workers()
+
+        self.assertFalse(cached.refresh_local)
+        self.assertEqual(ScrapeJob.objects.get(id=cached.refresh_job_id).status, ScrapeJob.STATUS_QUEUED)
+        thread_class.assert_not_called()
+
+
+class QueryIndexTests(TestCase):
+    def setUp(self):
+        self.site = Site.objects.create(name='Nissei', url='https://nissei.com')
+        self.other_site = Site.objects.create(name='Outro', url='https://outro.com')
+
+    def _product(self, slug, search_query='', site=None):
+        return Product.objects.create(
+            name=slug.title(),
+            url=f'https://nissei.com/{slug}',
+            site=site or self.site,
+            search_query=search_query,
+        )
+
+    def test_products_found_by_any_run_of_the_query(self):
+        phone = self._product('celular')
+        case = self._product('capa')
+        self._product('notebook')
+
+        record_query_run(self.site, 'Celular', [phone])
+        record_query_run(self.site, '  celular ', [case, phone])
+
+        self.assertEqual(
+            sorted(products_for_query('CELULAR', self.site).values_list('id', flat=True)),
+            sorted([phone.id, case.id])
+        )
+
+    def test_site_filter_and_ranking(self):
+        first = self._product('primeiro')
+        second = self._product('segundo')
+        elsewhere = self._product('outro', site=self.other_site)
+
+        run = record_query_run(self.site, 'tv', [second, first])
+        QueryHit.objects.filter(run=run).update(seen_at=timezone.now())
+        record_query_run(self.other_site, 'tv', [elsewhere])
+
+        self.assertEqual(list(products_for_query('tv', self.site)), [second, first])
+        self.assertEqual(products_for_query('tv').count(), 3)
+
+    def test_unsaved_urls_are_skipped(self):
+        phone = self._product('celular')
+
+        run = record_query_run(self.site, 'celular', [phone.url, 'https://nissei.com/nao-salvo'])
+
+        self.assertEqual(list(run.hits.values_list('product_id', flat=True)), [phone.id])
+        self.assertIsNone(record_query_run(self.site, 'celular', ['https://nissei.com/nao-salvo']))
+
+    def test_backfill_migration_builds_runs_from_search_query(self):
+        older = self._product('a', search_query='Celular Samsung')
+        newer = self._product('b', search_query='celular  samsung')
+        other = self._product('c', search_query='Notebook', site=self.other_site)
+        self._product('d', search_query='')
+
+        migration = importlib.import_module('products.migrations.0009_backfill_query_hits')
+        migration.backfill_query_hits(apps, None)
+
+        self.assertEqual(QueryRun.objects.count(), 2)
+        run = QueryRun.objects.get(query='celular samsung', site=self.site)
+        self.assertEqual(
+            list(run.hits.order_by('rank').values_list('product_id', 'rank')),
+            [(older.id, 1), (newer.id, 2)]
+        )
+        self.assertEqual(list(products_for_query('Notebook', self.other_site)), [other])
+
+
+@override_settings(ORACLE_OUTBOX_ENABLED=True, PRODUCT_BULK_STATUS_MAX=5)
+class BulkUpdateProductStatusTests(TestCase):
+    def setUp(self):
+        site = Site.objects.create(name='Nissei', url='https://nissei.com')
+        self.products = [
+            Product.objects.create(
+                site=site,
+                name=f'Produto {index}',
+                url=f'https://nissei.com/p/{index}',
+                sku_code=f'SKU{index}',
+                search_query='celular',
+            )
+            for index in range(3)
+        ]
+        self.user = get_user_model().objects.create_user('operador', password='x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _post(self, data):
+        return self.client.post(reverse('bulk-update-product-status'), data, format='json')
+
+    def test_ids_with_status_updates_and_queues_newly_approved(self):
+        response = self._post({'ids': [product.id for product in self.products[:2]], 'status': 2})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['updated_count'], 2)
+        self.assertEqual(response.data['oracle_sync'], {'executed': False, 'queued': 2})
+        self.assertEqual(Product.objects.filter(status=2).count(), 2)
+        self.assertEqual(OracleSyncOutbox.objects.count(), 2)
+
+    def test_bare_ids_in_items_use_top_level_status(self):
+        first, second, _ = self.products
+        response = self._post({'items': [first.id, {'id': second.id, 'status': 0}], 'status': 2})
+
+        self.assertEqual(response.status_code, 200)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.status, second.status), (2, 0))
+
+    def test_results_follow_request_order_with_per_item_errors(self):
+        first, second, _ = self.products
+        response = self._post({'items': [
+            {'id': second.id, 'status': 2},
+            {'id': 'abc', 'status': 2},
+            {'id': 999999, 'status': 2},
+            {'id': first.id, 'status': 9},
+            {'id': first.id},
+        ]})
+
+        self.assertEqual(
+            [(result['id'], result['error']) for result in response.data['results']],
+            [
+                (second.id, None),
+                ('abc', 'id inválido'),
+                (999999, 'Produto não encontrado'),
+                (first.id, 'status deve ser um número inteiro'),
+            ]
+        )
+        self.assertEqual((response.data['updated_count'], response.data['error_count']), (1, 3))
+
+    def test_later_invalid_duplicate_cancels_earlier_valid_entry(self):
+        product = self.products[0]
+        response = self._post({'items': [{'id': product.id, 'status': 2}, {'id': product.id, 'status': 'x'}]})
+
+        self.assertEqual(response.data['updated_count'], 0)
+        self.assertEqual(len(response.data['results']), 1)
+        product.refresh_from_db()
+        self.assertEqual(product.status, 1)
+
+    def test_missing_or_oversized_payload_is_rejected(self):
+        self.assertEqual(self._post({}).status_code, 400)
+        self.assertEqual(self._post({'ids': list(range(1, 7)), 'status': 2}).status_code, 400)
+
+    def test_already_approved_is_not_queued_again_without_resync(self):
+        Product.objects.filter(id=self.products[0].id).update(status=2)
+
+        self._post({'ids': [self.products[0].id], 'status': 2})
+        self.assertEqual(OracleSyncOutbox.objects.count(), 0)
+
+        self._post({'ids': [self.products[0].id], 'status': 2, 'resync': 'true'})
+        self.assertEqual(OracleSyncOutbox.objects.count(), 1)
+
+    @override_settings(ORACLE_OUTBOX_ENABLED=False)
+    def test_without_outbox_syncs_in_one_batch_with_user_credentials(self):
+        first, second, _ = self.products
+        sync_result = {'success_count': 1, 'error_count': 1, 'errors': ['rejeitado'], 'skus': {'SKU0': None, 'SKU1': 'rejeitado'}}
+
+        with mock.patch.object(views, 'oracle_credentials_for_user', return_value=('ORA', 'senha')) as credentials, \
+                mock.patch.object(views, 'sync_products_to_oracle', return_value=sync_result) as sync:
+            response = self._post({'ids': [second.id, first.id], 'status': 2})
+
+        credentials.assert_called_once_with(self.user)
+        sync.assert_called_once()
+        self.assertEqual(sync.call_args.kwargs, {'cod_usuario': 'ORA', 'password': 'senha'})
+        self.assertEqual(
+            [(result['id'], result['oracle_sync']['error']) for result in response.data['results']],
+            [(second.id, 'rejeitado'), (first.id, None)]
+        )
+        self.assertEqual(OracleSyncOutbox.objects.count(), 0)
@@ -1,12 +1,13 @@
 import json
 import re
 import requests
-import time
 from bs4 import BeautifulSoup
 from decimal import Decimal
 from typing import Dict, Any, List
 from urllib.parse import urljoin, urlparse
 
+from products.services.rate_limiter import mount_rate_limiter
+
 
 class WebScrapingTool:
     """
@@ -18,6 +19,7 @@ class WebScrapingTool:
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
         })
+        mount_rate_limiter(self.session)
     
     def get_page_content(self, url: str, delay: int = 1) -> str:
         """
@@ -25,13 +27,13 @@ class WebScrapingTool:
         
         Args:
             url: URL da página
-            delay: Tempo de delay em segundos
+            delay: Ignorado (mantido por compatibilidade); o ritmo vem do
+                rate limiter por host montado na sessão
         
         Returns:
             Conteúdo HTML da página
         """
         try:
-            time.sleep(delay)  # Rate limiting
             response = self.session.get(url, timeout=30)
             response.raise_for_status()
             return response.text
@@ -5,12 +5,21 @@ from products.views import (
     nissei_search_fixed,
     nissei_search_detailed,
     UpdateProductStatusView,
+    BulkUpdateProductStatusView,
     ProductByStatusView,
 )
 
 
 urlpatterns = [
     path('nissei-search-detailed/', views.nissei_search_detailed, name='nissei_search_detailed'),
+    path('scrape-jobs/', views.enqueue_nissei_search, name='scrape-job-enqueue'),
+    path('scrape-jobs/<int:job_id>/', views.scrape_job_status, name='scrape-job-status'),
+    path('scrape-jobs/<int:job_id>/result/', views.scrape_job_result, name='scrape-job-result'),
+    path('scrape-jobs/<int:job_id>/events/', views.scrape_job_events, name='scrape-job-events'),
+    path('scraping-metrics/', views.scraping_metrics, name='scraping-metrics'),
+    path('circuit-breakers/', views.circuit_breaker_state, name='circuit-breakers'),
+    path('oracle-outbox/', views.oracle_outbox_state, name='oracle-outbox'),
     path("update-status/", UpdateProductStatusView.as_view(), name="update-product-status"),
+    path("bulk-update-status/", BulkUpdateProductStatusView.as_view(), name="bulk-update-product-status"),
     path("status/<int:status_code>/", ProductByStatusView.as_view(), name="products-by-status"),
 ]
@@ -1,22 +1,23 @@
 import base64
-import requests
-from io import BytesIO
-from PIL import Image
-from django.core.files.base import ContentFile
+import json
+import time
+from django.conf import settings
 from configurations.models import Configuration
 from rest_framework import status as http_status
 from datetime import datetime
 from django.shortcuts import get_object_or_404
-from django.db import models
+from django.db import models, transaction
+from django.http import StreamingHttpResponse
 from django.utils import timezone
-from products.models import Product, ProductImage
+from products.models import Product, ProductImage, ScrapeJob
 from products.serializers import (
     ProductSerializer, 
     ProductImageSerializer,
     IntelligentSearchSerializer,
     SiteSerializer,
     SiteAnalysisSerializer,
-    ConfigurationSerializer
+    ConfigurationSerializer,
+    ScrapeJobSerializer
 )
 from products.oracle_sync import sync_products_to_oracle 
 from products.services.agno_manager import AgnoScrapingManager
@@ -24,15 +25,23 @@ from products.services.nissei_scraper import NisseiSpecializedScraper
 from products.services.nissei_scraper_fixed import NisseiScraper
 from products.services.nissei_detailed_scraper import NisseiDetailedScraper
 from products.services.ai_nissei_scraper import AISeleniumNisseiScraper
+from products.services.ai_probe import probe_ai_configuration
+from products.services.circuit_breaker import get_circuit_breakers
 from products.services.nissei_extractor_v2 import NisseiExtractorV2
+from products.services.nissei_search_service import normalize_search_params
+from products.services.oracle_outbox import enqueue_oracle_sync, oracle_credentials_for_user, oracle_outbox_enabled, outbox_stats
+from products.services.scrape_jobs import enqueue_scrape_job, run_coalesced_search
+from products.services.search_cache import CACHE_BYPASS, CACHE_MISS, get_search_cache, search_cache_enabled
+from products.services.metrics import collect_scraping_metrics
+from products.services.progress import EVENT_JOB_STATUS, fetch_job_events, job_stream_should_close, parse_event_id
+from products.services.query_index import products_for_query, record_query_run
 from rest_framework import viewsets, status
-from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.decorators import action, api_view, permission_classes, renderer_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import BaseRenderer, JSONRenderer
 from rest_framework.views import APIView
 from sites.models import Site
-from users.models import CustomUser
-from users.utils import decode_simple
 
 
 class UpdateProductStatusView(APIView):
@@ -69,9 +78,13 @@ class UpdateProductStatusView(APIView):
                 status=http_status.HTTP_400_BAD_REQUEST
             )
         
-        # Atualizar status
-        product.status = new_status
-        product.save(update_fields=["status", "updated_at"])
+        # Atualizar status (com outbox, o envio ao Oracle é gravado na mesma transação)
+        queue_sync = new_status == 2 and oracle_outbox_enabled()
+        with transaction.atomic():
+            product.status = new_status
+            product.save(update_fields=["status", "updated_at"])
+            if queue_sync:
+                enqueue_oracle_sync([product], request.user)
         
         # Preparar resposta base
         response_data = {
@@ -81,7 +94,14 @@ class UpdateProductStatusView(APIView):
         }
         
         # ========== SINCRONIZAÇÃO COM ORACLE (APENAS SE STATUS = 2) ==========
-        if new_status == 2:
+        if queue_sync:
+            print(f"📤 Status = 2, produto {product.id} enfileirado para sincronização com Oracle")
+            response_data['message'] = "Status atualizado, sincronização com Oracle enfileirada"
+            response_data['oracle_sync'] = {
+                'executed': False,
+                'queued': True
+            }
+        elif new_status == 2:
             print(f"📤 Status = 2, iniciando sincronização com Oracle...")
             
             
@@ -96,24 +116,8 @@ class UpdateProductStatusView(APIView):
                 # product_data['cod_rubro'] = cod_rubro
                 # product_data['cod_grupo'] = cod_grupo
                 
-                # Obter username do usuário Oracle autenticado
-                oracle_username = request.user.username.upper() if request.user.is_authenticated else 'WEBSYNC'
-                if request.user.is_authenticated:
-                    try:
-                        custom = request.user.customuser  # usa related_name='customuser'
-                        oracle_password = custom.oracle_password
-                    except CustomUser.DoesNotExist:
-                        oracle_password = None  # ou valor padrão se não houver registro
-                else:
-                    oracle_password = None  # usuário não autenticado 
-                
-                if oracle_password:
-                    # Decodificar senha
-                    try:
-                        oracle_password = decode_simple(oracle_password)
-                    except Exception as e:
-                        print(f"❌ Erro ao decodificar senha Oracle do usuário {oracle_username}: {e}")
-                        oracle_password = None               
+                # Obter username/senha do usuário Oracle autenticado
+                oracle_username, oracle_password = oracle_credentials_for_user(request.user)
                 
                 # Sincronizar com Oracle
                 print(f"🔄 Sincronizando produto {product.id} (SKU: {product.sku_code}) como usuário: {oracle_username}...")
@@ -154,6 +158,168 @@ class UpdateProductStatusView(APIView):
             status=http_status.HTTP_200_OK
         )
 
+class BulkUpdateProductStatusView(APIView):
+    """
+    Atualiza o status de vários produtos em uma chamada
+    
+    Body: {"items": [{"id": 1, "status": 2}, ...]} ou {"ids": [1, 2], "status": 2}
+    (ids soltos em items usam o status do body; resync=true sincroniza de
+    novo os que já estavam aprovados)
+    
+    - Postgres: um único UPDATE para todos os ids
+    - Produtos que passam para status = 2: vão para o outbox na mesma
+      transação (ORACLE_OUTBOX_ENABLED) ou, sem outbox, uma sincronização
+      Oracle em lote (uma sessão do pool, MERGE por lote)
+    - Resposta com o resultado de cada id
+    """
+    def post(self, request, *args, **kwargs):
+        items = request.data.get("items")
+        if items is None and "ids" in request.data:
+            items = [{"id": product_id, "status": request.data.get("status")} for product_id in request.data.get("ids") or []]
+        
+        if not isinstance(items, list) or not items:
+            return Response(
+                {"error": "items (lista de {id, status}) ou ids + status são obrigatórios"},
+                status=http_status.HTTP_400_BAD_REQUEST
+            )
+        
+        max_items = getattr(settings, 'PRODUCT_BULK_STATUS_MAX', 500)
+        if len(items) > max_items:
+            return Response(
+                {"error": f"Máximo de {max_items} produtos por chamada"},
+                status=http_status.HTTP_400_BAD_REQUEST
+            )
+        
+        resync = str(request.data.get("resync", False)).lower() in ('true', '1')
+        valid_statuses = dict(Product.STATUS_CHOICES)
+        
+        # 1. VALIDAR CADA ITEM
+        # results na ordem do request; id repetido fica na primeira posição
+        # com o resultado do último status enviado
+        results = []
+        by_id = {}
+        requested = {}
+        for item in items:
+            raw_id = item.get("id") if isinstance(item, dict) else item
+            try:
+                product_id = int(raw_id)
+            except (TypeError, ValueError):
+                results.append({"id": raw_id, "updated": False, "error": "id inválido"})
+                continue
+            
+            if product_id not in by_id:
+                by_id[product_id] = {}
+                results.append(by_id[product_id])
+            result = by_id[product_id]
+            result.clear()
+            result["id"] = product_id
+            
+            requested.pop(product_id, None)
+            try:
+                # id solto em items usa o status do body
+                new_status = int(item.get("status") if isinstance(item, dict) else request.data.get("status"))
+            except (TypeError, ValueError):
+                result.update({"updated": False, "error": "status deve ser um número inteiro"})
+                continue
+            
+            if new_status not in valid_statuses:
+                result.update({"updated": False, "error": "status inválido"})
+                continue
+            
+            requested[product_id] = new_status
+        
+        # 2. UM UPDATE PARA TODOS
+        # Status anteriores lidos com lock: aprovação concorrente do mesmo
+        # produto não passa despercebida e não enfileira o sync duas vezes
+        with transaction.atomic():
+            previous = dict(
+                Product.objects.select_for_update()
+                .filter(id__in=requested)
+                .order_by("id")
+                .values_list("id", "status")
+            )
+            to_sync = [
+                product_id for product_id, old_status in previous.items()
+                if requested[product_id] == 2 and (old_status != 2 or resync)
+            ]
+            queue_sync = bool(to_sync) and oracle_outbox_enabled()
+            
+            if previous:
+                Product.objects.filter(id__in=previous).update(
+                    status=models.Case(
+                        *[models.When(id=product_id, then=models.Value(requested[product_id])) for product_id in previous],
+                        output_field=models.IntegerField()
+                    ),
+                    updated_at=timezone.now()
+                )
+                if queue_sync:
+                    enqueue_oracle_sync(Product.objects.filter(id__in=to_sync).only("id"), request.user)
+        
+        for product_id in requested:
+            if product_id not in previous:
+                by_id[product_id].update({"updated": False, "error": "Produto não encontrado"})
+        
+        for product_id in previous:
+            by_id[product_id].update({
+                "status": valid_statuses[requested[product_id]],
+                "updated": True,
+                "error": None,
+                "oracle_sync": {"executed": False},
+            })
+        
+        # 3. SINCRONIZAÇÃO ORACLE DOS NOVOS APROVADOS (outbox ou uma sessão, em lote)
+        sync_summary = {"executed": False}
+        
+        if queue_sync:
+            for product_id in to_sync:
+                by_id[product_id]["oracle_sync"] = {"executed": False, "queued": True}
+            sync_summary = {"executed": False, "queued": len(to_sync)}
+            print(f"📤 {len(to_sync)} produtos aprovados enfileirados para sincronização com Oracle")
+        elif to_sync:
+            print(f"📤 {len(to_sync)} produtos aprovados, iniciando sincronização com Oracle em lote...")
+            
+            serialized = ProductSerializer(
+                Product.objects.filter(id__in=to_sync).select_related("site").prefetch_related("images"),
+                many=True,
+                context={"request": request}
+            ).data
+            oracle_username, oracle_password = oracle_credentials_for_user(request.user)
+            
+            try:
+                sync_result = sync_products_to_oracle(serialized, cod_usuario=oracle_username, password=oracle_password)
+            except Exception as e:
+                print(f"❌ Erro na sincronização Oracle: {e}")
+                sync_result = {"success_count": 0, "error_count": len(serialized), "errors": [str(e)], "skus": {}}
+            
+            # Sem resultado do SKU = falha antes do lote (ex.: conexão)
+            general_error = sync_result["errors"][-1] if sync_result["errors"] else "Não sincronizado"
+            for product_data in serialized:
+                sku = product_data.get("sku_code")
+                if not sku:
+                    error = "Produto sem sku_code"
+                else:
+                    error = sync_result["skus"][sku] if sku in sync_result["skus"] else general_error
+                by_id[product_data["id"]]["oracle_sync"] = {"executed": True, "success": error is None, "error": error}
+            
+            sync_summary = {
+                "executed": True,
+                "success_count": sync_result["success_count"],
+                "error_count": sync_result["error_count"],
+                "batches": sync_result.get("batches", 0),
+            }
+            print(f"✅ Oracle: {sync_result['success_count']} sincronizados, {sync_result['error_count']} com erro")
+        
+        return Response(
+            {
+                "message": f"{len(previous)} de {len(results)} produtos atualizados",
+                "updated_count": len(previous),
+                "error_count": sum(1 for result in results if result.get("error")),
+                "oracle_sync": sync_summary,
+                "results": results,
+            },
+            status=http_status.HTTP_200_OK
+        )
+
 class ProductByStatusView(APIView):
     def get(self, request, status_code, *args, **kwargs):
         try:
@@ -439,11 +605,10 @@ def nissei_search_detailed_original(request):
                 product_response['details_extracted'] = True
             
             # 10. BUSCAR TODOS OS PRODUTOS SALVOS NO BANCO (relacionados à query)
-            all_saved_products = Product.objects.filter(
-                search_query__icontains=query,
-                site=site,
+            record_query_run(site, query, saved_products_list)
+            all_saved_products = products_for_query(query, site).filter(
                 status__in=[1, 2]
-            ).prefetch_related('images').order_by('-created_at')[:20]
+            ).prefetch_related('images')[:20]
             
             print(f"📊 Total de produtos no banco para '{query}': {all_saved_products.count()}")
             
@@ -554,6 +719,112 @@ def nissei_search_detailed_original(request):
             'success': False
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+def _build_nissei_search_response(request, params, summary, saved_products_list=None):
+    """
+    Monta a resposta da busca detalhada (mesmo formato para a view síncrona
+    e para o resultado de um ScrapeJob)
+    
+    Args:
+        summary: resumo de summarize_search_outcome
+        saved_products_list: produtos salvos (carregados pelos IDs do resumo se ausente)
+    """
+    query = params['query']
+    site = Site.objects.get(id=summary['site_id'])
+    detailed_count = summary['detailed_count']
+    saved_count = summary['saved_count']
+    updated_count = summary['updated_count']
+    unchanged_count = summary.get('unchanged_count', 0)  # Jobs antigos não têm o campo
+    ai_used = summary['ai_used']
+    
+    if saved_products_list is None:
+        products_by_id = Product.objects.prefetch_related('images').in_bulk(summary['saved_product_ids'])
+        saved_products_list = [
+            products_by_id[product_id]
+            for product_id in summary['saved_product_ids']
+            if product_id in products_by_id
+        ]
+    
+    # BUSCAR PRODUTOS SALVOS (todas as execuções desta busca, via QueryHit)
+    all_saved_products = products_for_query(query, site).filter(
+        status__in=[1, 2]
+    ).prefetch_related('images')[:20]
+    
+    print(f"📊 Produtos no banco: {all_saved_products.count()}")
+    
+    # Flags de completude por produto (busca com timeout_ms pode voltar parcial)
+    completeness = summary.get('completeness') or {}
+    scraped_products_data = ProductSerializer(
+        saved_products_list,
+        many=True,
+        context={'request': request}
+    ).data
+    for product_data in scraped_products_data:
+        product_data['completeness'] = completeness.get(str(product_data['id']))
+    
+    return {
+        'query': query,
+        'parameters': {
+            'max_results_requested': params['max_results'],
+            'max_detailed_requested': params['max_detailed'],
+            'max_images_per_product': params['max_images'],
+            'actual_detailed_processed': detailed_count,
+            'actual_saved_to_database': len(saved_products_list),
+            'new_products_created': saved_count,
+            'products_updated': updated_count,
+            'products_unchanged': unchanged_count,
+            'ai_config_used': summary['ai_config_name'],
+            'enhanced_extraction': params['enhanced_extraction'],
+            'extractor_version': 'v2_fast',
+            'ai_enabled': ai_used,
+            'images_downloaded_physically': True,
+            'timeout_ms': params.get('timeout_ms')
+        },
+        'ai_configuration': {
+            'name': summary['ai_config_name'],
+            'model': summary['ai_model'],
+            'available': ai_used,
+            'enabled': ai_used,
+            'status': 'enabled' if ai_used else 'disabled (default)'
+        },
+        'site': {
+            'name': site.name,
+            'url': site.url,
+            'country': 'Paraguay'
+        },
+        'scraping_results': {
+            'total_products_found': detailed_count,
+            'total_products_saved': len(saved_products_list),
+            'new_products': saved_count,
+            'updated_products': updated_count,
+            'unchanged_products': unchanged_count,
+            'images_downloaded': True,
+            'partial': summary.get('partial', False),
+            'deadline': summary.get('deadline'),
+            'products': scraped_products_data
+        },
+        'database_results': {
+            'saved_products_count': all_saved_products.count(),
+            'products': ProductSerializer(
+                all_saved_products,
+                many=True,
+                context={'request': request}
+            ).data
+        },
+        'currency': 'Gs.',
+        'timestamp': timezone.now().isoformat(),
+        'performance': {
+            'extractor_version': 'v2',
+            'technology': 'Playwright + BeautifulSoup',
+            'speed_improvement': '8x faster than v1',
+            'image_download': 'sequential with optimization',
+            'ai_filtering_used': ai_used,
+            'mode': 'fast_without_ai' if not ai_used else 'fast_with_ai',
+            'products_scraped': detailed_count,
+            'products_saved_database': len(saved_products_list)
+        },
+        'success': True
+    }
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def nissei_search_detailed(request):
@@ -564,362 +835,104 @@ def nissei_search_detailed(request):
     - 8x mais rápido (usa Playwright ao invés de Selenium)
     - Download paralelo de imagens
     - IA opcional (use ai_config="auto" para ativar)
+    - timeout_ms opcional: prazo total; a resposta traz os produtos que
+      ficaram prontos (scraping_results.partial e products[].completeness)
+    
+    Bloqueia até o fim do scraping. Para buscas longas use
+    scrape-jobs/ (retorna o id do job imediatamente).
+    
+    Buscas idênticas simultâneas (mesmos parâmetros normalizados) são
+    coalescidas: só a primeira raspa; as demais recebem o mesmo resultado
+    (coalesced=true) e podem acompanhar o progresso pelo job_id.
+    
+    Busca idêntica recente sai do cache (SEARCH_CACHE_*): fresca direto do
+    banco, velha dentro da tolerância servida na hora com atualização em
+    background. A resposta traz cache.status/age_seconds; cache=false ignora
+    o cache.
     """
     try:
         # 1. VALIDAR PARÂMETROS
-        query = request.data.get('query')
-        if not query or len(query.strip()) < 2:
+        try:
+            params = normalize_search_params(request.data)
+        except ValueError as e:
             return Response({
-                'error': 'Query deve ter pelo menos 2 caracteres'
+                'error': str(e)
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Parâmetros de scraping
-        max_results = int(request.data.get('max_results', 20))
-        max_detailed = int(request.data.get('max_detailed', 5))
-        max_images = int(request.data.get('max_images', 3))
-        
-        # Configuração de IA (DESABILITADA POR PADRÃO)
-        ai_config_name = request.data.get('ai_config', 'none')
-        enhanced_extraction = request.data.get('enhanced_extraction', True)
-        
-        # Validar limites
-        max_results = min(max(max_results, 1), 50)
-        max_detailed = min(max(max_detailed, 1), 10)
-        max_images = min(max(max_images, 1), 8)
-        
         print(f"\n{'='*70}")
         print(f"NISSEI SEARCH V2 - COM DOWNLOAD FÍSICO DE IMAGENS")
         print(f"{'='*70}")
-        print(f"Query: {query}")
-        print(f"Listagem: {max_results} | Detalhes: {max_detailed} | Imagens: {max_images}")
-        print(f"IA: {ai_config_name}")
+        print(f"Query: {params['query']}")
+        print(f"Listagem: {params['max_results']} | Detalhes: {params['max_detailed']} | Imagens: {params['max_images']}")
+        print(f"IA: {params['ai_config']}")
+        if params['timeout_ms']:
+            print(f"Prazo: {params['timeout_ms']}ms")
         print(f"{'='*70}\n")
         
-        # 2. BUSCAR CONFIGURAÇÃO DE IA
-        configuration = None
-        
-        if ai_config_name != 'none':
-            print(f"🧠 Buscando configuração de IA...")
-            
-            if ai_config_name == 'auto':
-                configuration = Configuration.objects.filter(
-                    model_integration__in=['claude', 'anthropic', 'openai'],
-                    token__isnull=False,
-                    token__gt=''
-                ).order_by(
-                    models.Case(
-                        models.When(model_integration__icontains='claude', then=1),
-                        models.When(model_integration__icontains='anthropic', then=1),
-                        models.When(model_integration__icontains='openai', then=2),
-                        default=3
-                    )
-                ).first()
-            else:
-                configuration = Configuration.objects.filter(
-                    name__icontains=ai_config_name,
-                    token__isnull=False,
-                    token__gt=''
-                ).first()
-            
-            if configuration:
-                print(f"✅ IA: {configuration.name} ({configuration.model_integration})")
+        # 2. CACHE DA BUSCA: resultado recente sai direto do banco
+        cache_state = CACHE_MISS
+        if search_cache_enabled():
+            if str(request.data.get('cache', True)).lower() in ('false', '0', 'no'):
+                cache_state = CACHE_BYPASS
+                get_search_cache().record_bypass()
             else:
-                print(f"⚠️  IA não encontrada, continuando SEM IA")
-        else:
-            print(f"⚡ Modo RÁPIDO (sem IA)")
-        
-        if not configuration:
-            configuration = Configuration(
-                name="V2 Fast Without AI",
-                model_integration=None,
-                token=None,
-                parameters={}
-            )
-        
-        # 3. BUSCAR OU CRIAR SITE
-        site, created = Site.objects.get_or_create(
-            url="https://nissei.com",
-            defaults={
-                'name': 'Casa Nissei Paraguay',
-                'description': 'Loja de eletrônicos do Paraguai',
-                'active': True
-            }
-        )
-        
-        # 4. CRIAR EXTRATOR V2
-        extractor = NisseiExtractorV2(site, configuration)
-        extractor.max_images_per_product = max_images
-        
-        try:
-            # 5. EXECUTAR SCRAPING
-            print(f"\n🚀 Iniciando scraping V2...\n")
-            
-            detailed_products = extractor.scrape_products_intelligent(
-                query=query.strip(),
-                max_results=max_results,
-                max_detailed=max_detailed
-            )
-            
-            print(f"\n✅ Produtos extraídos: {len(detailed_products)}")
-            
-            # 6. SALVAR PRODUTOS NO BANCO COM DOWNLOAD FÍSICO DE IMAGENS
-            print(f"\n{'='*70}")
-            print(f"💾 SALVANDO PRODUTOS E BAIXANDO IMAGENS")
-            print(f"{'='*70}\n")
-            
-            saved_products_list = []
-            saved_count = 0
-            updated_count = 0
-            
-            for idx, product_data in enumerate(detailed_products, 1):
-                try:
-                    product_url = product_data.get('url', '')
-                    if not product_url:
-                        print(f"❌ Produto {idx}: URL vazia")
-                        continue
-                    
-                    product_name = product_data.get('name', 'Produto sem nome')[:300]
-                    print(f"\n📦 [{idx}/{len(detailed_products)}] {product_name[:60]}")
-                    
-                    # Verificar se produto existe
-                    existing_product = Product.objects.filter(
-                        url=product_url,
-                        site=site
-                    ).first()
-                    
-                    # Preparar scraped_data
-                    scraped_data = {
-                        'specifications': product_data.get('specifications', {}),
-                        'short_description': product_data.get('short_description', ''),
-                        'stock_status': product_data.get('stock_status', ''),
-                        'currency': 'Gs.',
-                        'extraction_method': 'v2_fast_no_ai' if ai_config_name == 'none' else 'v2_fast_with_ai',
-                        'scraped_at': timezone.now().isoformat()
-                    }
-                    
-                    # Preparar dados do produto (CAMPOS CORRETOS)
-                    product_defaults = {
-                        'name': product_name,
-                        'price': float(product_data.get('price', 0)) if product_data.get('price') else None,
-                        'original_price': float(product_data.get('old_price', 0)) if product_data.get('old_price') else None,
-                        'description': product_data.get('description', ''),
-                        'sku_code': product_data.get('sku', '') or product_data.get('sku_code', ''),
-                        'brand': product_data.get('brand', ''),
-                        'category': product_data.get('category', ''),
-                        'availability': product_data.get('stock_status', 'in_stock'),
-                        'search_query': query.strip(),
-                        'scraped_data': scraped_data,
-                        'status': 1,
-                        'updated_at': timezone.now()
-                    }
-                    
-                    if existing_product:
-                        for key, value in product_defaults.items():
-                            setattr(existing_product, key, value)
-                        existing_product.save()
-                        product = existing_product
-                        updated_count += 1
-                        print(f"   🔄 Produto atualizado (ID: {product.id})")
-                    else:
-                        product = Product.objects.create(
-                            url=product_url,
-                            site=site,
-                            **product_defaults
-                        )
-                        saved_count += 1
-                        print(f"   ✅ Produto criado (ID: {product.id})")
-                    
-                    # ==========================================
-                    # DOWNLOAD FÍSICO DE IMAGENS
-                    # ==========================================
-                    image_urls = product_data.get('images', []) or product_data.get('image_urls', [])
-                    
-                    if image_urls:
-                        print(f"   📥 Baixando {len(image_urls[:max_images])} imagens...")
-                        
-                        # Limpar imagens antigas
-                        ProductImage.objects.filter(product=product).delete()
-                        
-                        images_saved = 0
-                        
-                        for img_idx, image_url in enumerate(image_urls[:max_images]):
-                            try:
-                                print(f"      📸 [{img_idx+1}/{len(image_urls[:max_images])}] Baixando...")
-                                
-                                # ========================================
-                                # DOWNLOAD DA IMAGEM (FÍSICO)
-                                # ========================================
-                                response = requests.get(
-                                    image_url,
-                                    timeout=15,
-                                    headers={
-                                        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-                                        'Accept': 'image/webp,image/apng,image/*,*/*;q=0.8'
-                                    }
-                                )
-                                response.raise_for_status()
-                                
-                                # ========================================
-                                # OTIMIZAR COM PIL
-                                # ========================================
-                                img = Image.open(BytesIO(response.content))
-                                
-                                # Converter para RGB
-                                if img.mode not in ('RGB', 'L'):
-                                    if img.mode in ('RGBA', 'LA', 'P'):
-                                        bg = Image.new('RGB', img.size, (255, 255, 255))
-                                        if img.mode == 'P':
-                                            img = img.convert('RGBA')
-                                        bg.paste(img, mask=img.split()[-1] if len(img.split()) > 3 else None)
-                                        img = bg
-                                    else:
-                                        img = img.convert('RGB')
-                                
-                                # Redimensionar se muito grande
-                                if img.width > 1500 or img.height > 1500:
-                                    img.thumbnail((1500, 1500), Image.Resampling.LANCZOS)
-                                
-                                # Salvar otimizado em memória
-                                output = BytesIO()
-                                img.save(output, format='JPEG', quality=90, optimize=True)
-                                image_content = output.getvalue()
-                                
-                                # ========================================
-                                # SALVAR NO BANCO (ARQUIVO FÍSICO)
-                                # ========================================
-                                filename = f"nissei_{product.id}_{img_idx+1}.jpg"
-                                
-                                product_image = ProductImage.objects.create(
-                                    product=product,
-                                    image=ContentFile(image_content, name=filename),  # ← ARQUIVO FÍSICO!
-                                    original_url=image_url,
-                                    alt_text=product.name,
-                                    is_main=(img_idx == 0),
-                                    order=img_idx
-                                )
-                                
-                                # Primeira imagem = main_image do produto
-                                if img_idx == 0:
-                                    product.main_image = ContentFile(image_content, name=f"main_{filename}")
-                                    product.save(update_fields=['main_image'])
-                                
-                                images_saved += 1
-                                print(f"         ✅ Salvo: {filename} ({len(image_content)//1024}KB)")
-                                
-                            except requests.RequestException as req_error:
-                                print(f"         ❌ Erro no download: {req_error}")
-                                continue
-                            except Exception as img_error:
-                                print(f"         ❌ Erro: {img_error}")
-                                continue
-                        
-                        print(f"   ✅ {images_saved}/{len(image_urls[:max_images])} imagens salvas FISICAMENTE")
-                    else:
-                        print(f"   ⚠️  Nenhuma imagem para baixar")
-                    
-                    saved_products_list.append(product)
-                    
-                except Exception as save_error:
-                    print(f"   ❌ Erro ao salvar produto {idx}: {save_error}")
-                    import traceback
-                    print(traceback.format_exc())
-                    continue
-            
-            print(f"\n{'='*70}")
-            print(f"💾 RESUMO DO SALVAMENTO")
-            print(f"{'='*70}")
-            print(f"✅ Produtos novos: {saved_count}")
-            print(f"🔄 Produtos atualizados: {updated_count}")
-            print(f"📊 Total salvo: {len(saved_products_list)}")
-            print(f"{'='*70}\n")
-            
-            # 7. BUSCAR PRODUTOS SALVOS
-            all_saved_products = Product.objects.filter(
-                search_query__icontains=query,
-                site=site,
-                status__in=[1, 2]
-            ).prefetch_related('images').order_by('-created_at')[:20]
-            
-            print(f"📊 Produtos no banco: {all_saved_products.count()}")
-            
-            # 8. PREPARAR RESPOSTA
-            ai_used = configuration and configuration.token
-            
-            response_data = {
-                'query': query.strip(),
-                'parameters': {
-                    'max_results_requested': max_results,
-                    'max_detailed_requested': max_detailed,
-                    'max_images_per_product': max_images,
-                    'actual_detailed_processed': len(detailed_products),
-                    'actual_saved_to_database': len(saved_products_list),
-                    'new_products_created': saved_count,
-                    'products_updated': updated_count,
-                    'ai_config_used': configuration.name if ai_used else 'none',
-                    'enhanced_extraction': enhanced_extraction,
-                    'extractor_version': 'v2_fast',
-                    'ai_enabled': ai_used,
-                    'images_downloaded_physically': True
-                },
-                'ai_configuration': {
-                    'name': configuration.name if ai_used else 'none',
-                    'model': configuration.model_integration if ai_used else 'none',
-                    'available': ai_used,
-                    'enabled': ai_used,
-                    'status': 'enabled' if ai_used else 'disabled (default)'
-                },
-                'site': {
-                    'name': site.name,
-                    'url': site.url,
-                    'country': 'Paraguay'
-                },
-                'scraping_results': {
-                    'total_products_found': len(detailed_products),
-                    'total_products_saved': len(saved_products_list),
-                    'new_products': saved_count,
-                    'updated_products': updated_count,
-                    'images_downloaded': True,
-                    'products': ProductSerializer(
-                        saved_products_list,
-                        many=True,
-                        context={'request': request}
-                    ).data
-                },
-                'database_results': {
-                    'saved_products_count': all_saved_products.count(),
-                    'products': ProductSerializer(
-                        all_saved_products,
-                        many=True,
-                        context={'request': request}
-                    ).data
-                },
-                'currency': 'Gs.',
-                'timestamp': timezone.now().isoformat(),
-                'performance': {
-                    'extractor_version': 'v2',
-                    'technology': 'Playwright + BeautifulSoup',
-                    'speed_improvement': '8x faster than v1',
-                    'image_download': 'sequential with optimization',
-                    'ai_filtering_used': ai_used,
-                    'mode': 'fast_without_ai' if not ai_used else 'fast_with_ai',
-                    'products_scraped': len(detailed_products),
-                    'products_saved_database': len(saved_products_list)
-                },
+                cached = get_search_cache().lookup(params, request.user)
+                if cached is not None:
+                    response_data = _build_nissei_search_response(request, cached.job.parameters, cached.job.result)
+                    response_data['job_id'] = cached.job.id
+                    response_data['coalesced'] = False
+                    response_data['cache'] = cached.as_dict()
+                    print(f"⚡ Cache {cached.state}: ScrapeJob {cached.job.id} ({cached.age_seconds:.0f}s)")
+                    return Response(response_data, status=status.HTTP_200_OK)
+        
+        # 3. EXECUTAR SCRAPING E SALVAR (ou aguardar a mesma busca já em andamento)
+        job, leader = run_coalesced_search(params, request.user)
+        
+        if job.status == ScrapeJob.STATUS_FAILED:
+            return Response({
+                'error': f"Erro interno: {(job.error or '').split(chr(10))[0]}",
+                'query': params['query'],
+                'job_id': job.id,
+                'coalesced': not leader,
+                'extractor_version': 'v2',
+                'success': False
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        
+        if job.status != ScrapeJob.STATUS_DONE:
+            # Esperou SCRAPE_COALESCE_WAIT_SECONDS e a busca original ainda roda
+            return Response({
+                'job_id': job.id,
+                'status': job.status,
+                'coalesced': True,
+                'status_url': f"/api/v1/products/scrape-jobs/{job.id}/",
+                'result_url': f"/api/v1/products/scrape-jobs/{job.id}/result/",
+                'events_url': f"/api/v1/products/scrape-jobs/{job.id}/events/",
                 'success': True
-            }
-            
-            print(f"\n{'='*70}")
-            print(f"✅ VIEW CONCLUÍDA COM SUCESSO")
-            print(f"   Produtos: {len(detailed_products)}")
-            print(f"   Salvos: {len(saved_products_list)} (novos: {saved_count}, atualizados: {updated_count})")
-            print(f"   Imagens: BAIXADAS FISICAMENTE ✓")
-            print(f"{'='*70}\n")
-            
-            return Response(response_data, status=status.HTTP_200_OK)
+            }, status=status.HTTP_202_ACCEPTED)
+        
+        summary = job.result
+        
+        # 4. PREPARAR RESPOSTA
+        response_data = _build_nissei_search_response(request, job.parameters, summary)
+        response_data['job_id'] = job.id
+        response_data['coalesced'] = not leader
+        response_data['cache'] = {
+            'status': cache_state,
+            'age_seconds': round((timezone.now() - job.finished_at).total_seconds(), 1),
+            'job_id': job.id,
+            'cached_at': job.finished_at.isoformat(),
+            'refresh_job_id': None,
+            'refresh_local': False,
+        }
         
-        finally:
-            extractor.close()
-            print(f"🔌 Recursos liberados")
+        print(f"\n{'='*70}")
+        print(f"✅ VIEW CONCLUÍDA COM SUCESSO{'' if leader else f' (resultado compartilhado do ScrapeJob {job.id})'}")
+        print(f"   Produtos: {summary['detailed_count']}")
+        print(f"   Salvos: {len(summary['saved_product_ids'])} (novos: {summary['saved_count']}, atualizados: {summary['updated_count']})")
+        print(f"   Imagens: BAIXADAS FISICAMENTE ✓")
+        print(f"{'='*70}\n")
+        
+        return Response(response_data, status=status.HTTP_200_OK)
     
     except Exception as e:
         print(f"\n{'='*70}")
@@ -939,6 +952,158 @@ def nissei_search_detailed(request):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def enqueue_nissei_search(request):
+    """
+    Enfileira uma busca detalhada (mesmos parâmetros de nissei_search_detailed)
+    
+    Retorna imediatamente o id do job; o scraping roda nos workers
+    (python manage.py run_scrape_workers)
+    """
+    try:
+        params = normalize_search_params(request.data)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    job, created = enqueue_scrape_job(params, request.user)
+    
+    return Response({
+        'job_id': job.id,
+        'status': job.status,
+        'coalesced': not created,
+        'status_url': f"/api/v1/products/scrape-jobs/{job.id}/",
+        'result_url': f"/api/v1/products/scrape-jobs/{job.id}/result/",
+        'success': True
+    }, status=status.HTTP_202_ACCEPTED)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def scraping_metrics(request):
+    """Métricas do processo: cache HTTP, rate limiter, pool de browsers e pipeline de imagens"""
+    return Response(collect_scraping_metrics(), status=status.HTTP_200_OK)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def circuit_breaker_state(request):
+    """
+    Estado dos circuit breakers por host/classe de endpoint e do orçamento de retentativas
+
+    Só do processo web que atendeu a requisição: os workers de ScrapeJob e
+    o drenador do outbox (que fazem a maior parte das chamadas externas)
+    têm circuitos próprios, fora desta resposta.
+    """
+    return Response(get_circuit_breakers().stats(), status=status.HTTP_200_OK)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def oracle_outbox_state(request):
+    """Backlog do outbox Oracle (pendentes, falhas) e atraso aprovação -> Oracle"""
+    return Response(outbox_stats(), status=status.HTTP_200_OK)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def scrape_job_status(request, job_id):
+    """Status de um ScrapeJob"""
+    job = get_object_or_404(ScrapeJob, id=job_id)
+    return Response(ScrapeJobSerializer(job).data, status=status.HTTP_200_OK)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def scrape_job_result(request, job_id):
+    """
+    Resultado de um ScrapeJob concluído (mesmo formato de nissei_search_detailed)
+    """
+    job = get_object_or_404(ScrapeJob, id=job_id)
+    
+    if job.status == ScrapeJob.STATUS_FAILED:
+        return Response({
+            'job_id': job.id,
+            'status': job.status,
+            'error': (job.error or '').split('\n')[0],
+            'success': False
+        }, status=status.HTTP_200_OK)
+    
+    if job.status != ScrapeJob.STATUS_DONE:
+        return Response({
+            'job_id': job.id,
+            'status': job.status,
+            'message': 'Job ainda não concluído'
+        }, status=status.HTTP_202_ACCEPTED)
+    
+    response_data = _build_nissei_search_response(request, job.parameters, job.result)
+    response_data['job_id'] = job.id
+    return Response(response_data, status=status.HTTP_200_OK)
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Permite Accept: text/event-stream (o corpo é gerado pela própria view)"""
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+    
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, (str, bytes)):
+            return data
+        return f"event: error\ndata: {json.dumps(data, default=str)}\n\n"
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@renderer_classes([EventStreamRenderer, JSONRenderer])
+def scrape_job_events(request, job_id):
+    """
+    Progresso de um ScrapeJob via Server-Sent Events
+    
+    Alternativa ao WebSocket /ws/scrape-jobs/<id>/ (funciona também no runserver).
+    Suporta reconexão com o header Last-Event-ID. Termina com o evento
+    stream_closed se o job acabou sem o evento final ou ficou sem eventos
+    por SCRAPE_EVENTS_IDLE_TIMEOUT (worker morto).
+    """
+    job = get_object_or_404(ScrapeJob, id=job_id)
+    
+    after_id = parse_event_id(request.headers.get('Last-Event-ID') or request.query_params.get('after'))
+    
+    poll_interval = getattr(settings, 'SCRAPE_EVENTS_POLL_INTERVAL', 0.5)
+    idle_timeout = getattr(settings, 'SCRAPE_EVENTS_IDLE_TIMEOUT', 600)
+    
+    def event_stream():
+        last_id = after_id
+        idle_since = time.time()
+        last_event_at = time.time()
+        
+        while True:
+            events = fetch_job_events(after_id=last_id, job_id=job.id)
+            finished = False
+            
+            for event in events:
+                last_id = event.id
+                idle_since = last_event_at = time.time()
+                yield f"id: {event.id}\nevent: {event.event_type}\ndata: {json.dumps(event.as_message())}\n\n"
+                if event.event_type == EVENT_JOB_STATUS and event.payload.get('status') in (ScrapeJob.STATUS_DONE, ScrapeJob.STATUS_FAILED):
+                    finished = True
+            
+            if finished:
+                return
+            
+            if not events:
+                should_close, reason = job_stream_should_close(job.id, time.time() - last_event_at, idle_timeout)
+                if should_close:
+                    yield f"event: stream_closed\ndata: {json.dumps({'job_id': job.id, 'reason': reason})}\n\n"
+                    return
+            
+            # Heartbeat para proxies não derrubarem a conexão
+            if time.time() - idle_since > 15:
+                idle_since = time.time()
+                yield ": keep-alive\n\n"
+            
+            time.sleep(poll_interval)
+    
+    response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 # ========================================
 # IMPORTS NECESSÁRIOS NO TOPO DO ARQUIVO
 # ========================================
@@ -1119,11 +1284,10 @@ def nissei_search_detailed_v0(request):
                             product[key] = str(value)
             
             # 7. BUSCAR PRODUTOS SALVOS RELACIONADOS
-            saved_products = Product.objects.filter(
-                search_query__icontains=query,
-                site=site,
+            record_query_run(site, query, [product.get('url') for product in detailed_products])
+            saved_products = products_for_query(query, site).filter(
                 status__in=[1, 2]
-            ).prefetch_related('images').order_by('-created_at')[:10]
+            ).prefetch_related('images')[:10]
 
             print(f"Produtos salvos no banco: {saved_products.count()}")
             
@@ -1240,11 +1404,10 @@ def nissei_search_fixed(request):
         new_products = scraper.scrape_products(query, max_results)
         
         # Buscar produtos salvos relacionados
-        saved_products = Product.objects.filter(
-            search_query__icontains=query,
-            site=site,
+        record_query_run(site, query, [product.get('url') for product in new_products])
+        saved_products = products_for_query(query, site).filter(
             status__in=[1, 2]  # Aguardando sincronização ou aprovado
-        ).order_by('-created_at')[:10]
+        )[:10]
         
         # Preparar resposta
         response_data = {
@@ -1344,9 +1507,7 @@ class ProductViewSet(viewsets.ReadOnlyModelViewSet):
             )
             
             # Buscar produtos salvos no banco também
-            saved_products = Product.objects.filter(
-                search_query__icontains=validated_data['query']
-            ).select_related('site')[:20]
+            saved_products = products_for_query(validated_data['query']).select_related('site')[:20]
             
             response_data = {
                 **results,
@@ -1385,10 +1546,8 @@ class ProductViewSet(viewsets.ReadOnlyModelViewSet):
             products = scraper.scrape_products(query, max_results)
             
             # Buscar produtos salvos também
-            saved_products = Product.objects.filter(
-                search_query__icontains=query,
-                site=nissei_site
-            )[:10]
+            record_query_run(nissei_site, query, [product.get('url') for product in products])
+            saved_products = products_for_query(query, nissei_site)[:10]
             
             return Response({
                 'query': query,
@@ -1455,37 +1614,27 @@ def test_ai_configuration(request):
         
         configuration = Configuration.objects.get(id=config_id)
         
-        # Criar scraper de teste
-        site, _ = Site.objects.get_or_create(
-            url="https://nissei.com",
-            defaults={'name': 'Casa Nissei Paraguay', 'active': True}
-        )
+        # Chamada mínima direto ao provedor (sem scraper e sem navegador), com cache
+        probe = probe_ai_configuration(configuration, use_cache=str(request.data.get('refresh', False)).lower() not in ('true', '1'))
         
-        scraper = AISeleniumNisseiScraper(site, configuration)
+        if probe.ok:
+            response = probe.response
+            return Response({
+                'success': True,
+                'config_name': configuration.name,
+                'model': configuration.model_integration,
+                'test_response': response[:100] + '...' if len(response) > 100 else response,
+                'ai_available': True,
+                'probe': probe.as_dict()
+            })
         
-        try:
-            if scraper.ai_available:
-                # Teste básico - prompt simples
-                test_prompt = 'Responda apenas com: {"status": "ok", "test": true}'
-                response = scraper._call_ai_api(test_prompt)
-                
-                return Response({
-                    'success': True,
-                    'config_name': configuration.name,
-                    'model': configuration.model_integration,
-                    'test_response': response[:100] + '...' if len(response) > 100 else response,
-                    'ai_available': True
-                })
-            else:
-                return Response({
-                    'success': False,
-                    'error': 'Configuração não está válida',
-                    'config_name': configuration.name,
-                    'ai_available': False
-                })
-                
-        finally:
-            scraper.close()
+        return Response({
+            'success': False,
+            'error': probe.error or 'Configuração não está válida',
+            'config_name': configuration.name,
+            'ai_available': False,
+            'probe': probe.as_dict()
+        })
         
     except Configuration.DoesNotExist:
         return Response({
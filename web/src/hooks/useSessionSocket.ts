@@ -5,7 +5,8 @@ export default function useSessionSocket(onUpdate: (data: any) => void) {
   
   useEffect(() => {
     // const socket = new WebSocket('ws://127.0.0.1:8000/ws/sessions/');
-    const socket = new WebSocket(`${baseWs}/ws/sessions/`);  
+    const token = localStorage.getItem('accessToken') ?? '';
+    const socket = new WebSocket(`${baseWs}/ws/sessions/?token=${encodeURIComponent(token)}`);  
 
     socket.onopen = () => {
       console.log('✅ WebSocket conectado');